@@ -97,6 +97,15 @@ class HaikuRAGApp:
             except Exception as e:
                 self.console.print(f"[red]Error rebuilding database: {e}[/red]")
 
+    async def prune_cache(self, max_entries: int | None = None):
+        async with HaikuRAG(db_path=self.db_path) as client:
+            evicted = await client.prune_embedding_cache(max_entries)
+            remaining = await client.chunk_repository.embedding_cache.count()
+            self.console.print(
+                f"[b]Evicted [cyan]{evicted}[/cyan] cached embeddings, "
+                f"[cyan]{remaining}[/cyan] remaining.[/b]"
+            )
+
     def show_settings(self):
         """Display current configuration settings."""
         self.console.print("[bold]haiku.rag configuration[/bold]")
@@ -159,7 +168,7 @@ class HaikuRAGApp:
         async with HaikuRAG(self.db_path) as client:
             monitor = FileWatcher(paths=Config.MONITOR_DIRECTORIES, client=client)
             monitor_task = asyncio.create_task(monitor.observe())
-            server = create_mcp_server(self.db_path)
+            server = create_mcp_server(self.db_path, client=client)
 
             try:
                 if transport == "stdio":
@@ -149,6 +149,23 @@ def rebuild(
     event_loop.run_until_complete(app.rebuild())
 
 
+@cli.command("prune-cache", help="Evict least recently used cached embeddings")
+def prune_cache(
+    max_entries: int | None = typer.Option(
+        None,
+        "--max-entries",
+        help="Number of cached embeddings to keep (default: EMBEDDINGS_CACHE_MAX_ENTRIES, 0 clears the cache)",
+    ),
+    db: Path = typer.Option(
+        get_default_data_dir() / "haiku.rag.sqlite",
+        "--db",
+        help="Path to the SQLite database file",
+    ),
+):
+    app = HaikuRAGApp(db_path=db)
+    event_loop.run_until_complete(app.prune_cache(max_entries=max_entries))
+
+
 @cli.command(
     "serve", help="Start the haiku.rag MCP server (by default in streamable HTTP mode)"
 )
@@ -1,20 +1,28 @@
+import asyncio
 import hashlib
 import mimetypes
 import tempfile
-from collections.abc import AsyncGenerator
+import time
+from collections.abc import AsyncGenerator, Callable, Iterable, Mapping, Sequence
 from pathlib import Path
-from typing import Literal
+from typing import Any, Literal
 from urllib.parse import urlparse
 
 import httpx
 
 from haiku.rag.config import Config
-from haiku.rag.reader import FileReader
+from haiku.rag.embeddings.base import EmbedderBase
+from haiku.rag.ingest import IngestPipeline, IngestResult, Source
+from haiku.rag.reader import FileReader, parser_pool
 from haiku.rag.store.engine import Store
-from haiku.rag.store.models.chunk import Chunk
+from haiku.rag.store.filters import SearchFilters, filter_key, parse_filters
+from haiku.rag.store.models.chunk import SearchResults
 from haiku.rag.store.models.document import Document
 from haiku.rag.store.repositories.chunk import ChunkRepository
 from haiku.rag.store.repositories.document import DocumentRepository
+from haiku.rag.store.repositories.file_manifest import FileManifestRepository
+from haiku.rag.store.search_cache import SearchCache
+from haiku.rag.utils import md5_file
 
 
 class HaikuRAG:
@@ -24,14 +32,22 @@ class HaikuRAG:
         self,
         db_path: Path | Literal[":memory:"] = Config.DEFAULT_DATA_DIR
         / "haiku.rag.sqlite",
+        embedder: EmbedderBase | None = None,
     ):
-        """Initialize the RAG client with a database path."""
+        """Initialize the RAG client with a database path.
+
+        An optional pre-configured embedder can be provided, e.g. one wrapping an
+        injected provider client. By default one is created from the configuration.
+        """
         if isinstance(db_path, Path):
             if not db_path.parent.exists():
                 Path.mkdir(db_path.parent, parents=True)
         self.store = Store(db_path)
-        self.document_repository = DocumentRepository(self.store)
-        self.chunk_repository = ChunkRepository(self.store)
+        self.chunk_repository = ChunkRepository(self.store, embedder=embedder)
+        self.document_repository = DocumentRepository(self.store, self.chunk_repository)
+        self.file_manifest_repository = FileManifestRepository(self.store)
+        self.search_cache = SearchCache() if Config.SEARCH_CACHE_MAX_SIZE > 0 else None
+        self._qa_agent = None
 
     async def __aenter__(self):
         """Async context manager entry."""
@@ -39,7 +55,7 @@ class HaikuRAG:
 
     async def __aexit__(self, exc_type, exc_val, exc_tb):  # noqa: ARG002
         """Async context manager exit."""
-        self.close()
+        await self.close()
         return False
 
     async def create_document(
@@ -74,12 +90,67 @@ class HaikuRAG:
             ValueError: If the file/URL cannot be parsed or doesn't exist
             httpx.RequestError: If URL request fails
         """
+        document, changed = await self.load_source(source, metadata)
+        if not changed:
+            return document
+        if document.id is not None:
+            return await self.update_document(document)
+        return await self.document_repository.create(document)
+
+    async def ingest_many(
+        self,
+        sources: Iterable[Source],
+        metadata: dict | None = None,
+        load_concurrency: int = Config.INGEST_LOAD_CONCURRENCY,
+        embed_concurrency: int = Config.INGEST_EMBED_CONCURRENCY,
+        queue_size: int = Config.INGEST_QUEUE_SIZE,
+        on_document: Callable[[Document], Any] | None = None,
+        content_hashes: Mapping[Path, str] | None = None,
+    ) -> IngestResult:
+        """Create or update documents from many file paths, URLs or documents.
+
+        Loading, embedding and writing run concurrently, see `IngestPipeline`.
+        `on_document` is called with every document once it is stored or found
+        unchanged. `content_hashes` holds the MD5 of file sources that were
+        already hashed, by path, so that they are not read again.
+
+        Returns:
+            IngestResult with counts, per-source errors and per-stage statistics
+        """
+        pipeline = IngestPipeline(
+            self,
+            load_concurrency=load_concurrency,
+            embed_concurrency=embed_concurrency,
+            queue_size=queue_size,
+            on_document=on_document,
+            content_hashes=content_hashes,
+        )
+        return await pipeline.run(sources, metadata)
+
+    async def load_source(
+        self,
+        source: str | Path,
+        metadata: dict | None = None,
+        content_hash: str | None = None,
+    ) -> tuple[Document, bool]:
+        """Load and parse a file path or URL without storing it.
+
+        Returns the document to store and whether it needs to be written. An
+        existing document is returned with its ID set: unchanged if its MD5
+        matches the source, and with the new content and metadata otherwise.
+        `content_hash` is the MD5 of a file when the caller already computed it.
+
+        Raises:
+            ValueError: If the file/URL cannot be parsed or doesn't exist
+            httpx.RequestError: If URL request fails
+        """
+        metadata = dict(metadata or {})
 
         # Check if it's a URL
         source_str = str(source)
         parsed_url = urlparse(source_str)
         if parsed_url.scheme in ("http", "https"):
-            return await self._create_or_update_document_from_url(source_str, metadata)
+            return await self._load_url(source_str, metadata)
 
         # Handle as file path
         source_path = Path(source) if isinstance(source, str) else source
@@ -90,15 +161,15 @@ class HaikuRAG:
             raise ValueError(f"File does not exist: {source_path}")
 
         uri = source_path.as_uri()
-        md5_hash = hashlib.md5(source_path.read_bytes()).hexdigest()
+        md5_hash = content_hash or await asyncio.to_thread(md5_file, source_path)
 
         # Check if document already exists
         existing_doc = await self.get_document_by_uri(uri)
         if existing_doc and existing_doc.metadata.get("md5") == md5_hash:
             # MD5 unchanged, return existing document
-            return existing_doc
+            return existing_doc, False
 
-        content = FileReader.parse_file(source_path)
+        content = await parser_pool.parse_file(source_path, md5_hash)
 
         # Get content type from file extension
         content_type, _ = mimetypes.guess_type(str(source_path))
@@ -112,29 +183,23 @@ class HaikuRAG:
             # Update existing document
             existing_doc.content = content
             existing_doc.metadata = metadata
-            return await self.update_document(existing_doc)
-        else:
-            # Create new document
-            return await self.create_document(
-                content=content, uri=uri, metadata=metadata
-            )
+            return existing_doc, True
+        return Document(content=content, uri=uri, metadata=metadata), True
 
-    async def _create_or_update_document_from_url(
-        self, url: str, metadata: dict = {}
-    ) -> Document:
-        """Create or update a document from a URL by downloading and parsing the content.
+    async def _load_url(self, url: str, metadata: dict) -> tuple[Document, bool]:
+        """Download and parse the content of a URL.
 
         Checks if a document with the same URI already exists:
         - If MD5 is unchanged, returns existing document
-        - If MD5 changed, updates the document
-        - If no document exists, creates a new one
+        - If MD5 changed, returns it with the new content
+        - If no document exists, returns a new one
 
         Args:
             url: URL to download and parse
-            metadata: Optional metadata dictionary
+            metadata: Metadata dictionary
 
         Returns:
-            Document instance (created, updated, or existing)
+            The document and whether it needs to be written
 
         Raises:
             ValueError: If the content cannot be parsed
@@ -150,7 +215,7 @@ class HaikuRAG:
             existing_doc = await self.get_document_by_uri(url)
             if existing_doc and existing_doc.metadata.get("md5") == md5_hash:
                 # MD5 unchanged, return existing document
-                return existing_doc
+                return existing_doc, False
 
             # Get content type to determine file extension
             content_type = response.headers.get("content-type", "").lower()
@@ -172,7 +237,7 @@ class HaikuRAG:
 
             try:
                 # Parse the content using FileReader
-                content = FileReader.parse_file(temp_path)
+                content = await parser_pool.parse_file(temp_path, md5_hash)
 
                 # Merge metadata with contentType and md5
                 metadata.update({"contentType": content_type, "md5": md5_hash})
@@ -180,11 +245,8 @@ class HaikuRAG:
                 if existing_doc:
                     existing_doc.content = content
                     existing_doc.metadata = metadata
-                    return await self.update_document(existing_doc)
-                else:
-                    return await self.create_document(
-                        content=content, uri=url, metadata=metadata
-                    )
+                    return existing_doc, True
+                return Document(content=content, uri=url, metadata=metadata), True
             finally:
                 # Clean up temporary file
                 temp_path.unlink(missing_ok=True)
@@ -236,6 +298,13 @@ class HaikuRAG:
         """Delete a document by its ID."""
         return await self.document_repository.delete(document_id)
 
+    async def delete_documents(self, document_ids: Sequence[int]) -> int:
+        """Delete several documents by their IDs.
+
+        Returns the number of deleted documents.
+        """
+        return await self.document_repository.delete_many(document_ids)
+
     async def list_documents(
         self, limit: int | None = None, offset: int | None = None
     ) -> list[Document]:
@@ -243,19 +312,65 @@ class HaikuRAG:
         return await self.document_repository.list_all(limit=limit, offset=offset)
 
     async def search(
-        self, query: str, limit: int = 5, k: int = 60
-    ) -> list[tuple[Chunk, float]]:
+        self,
+        query: str,
+        limit: int = 5,
+        k: int = 60,
+        nprobe: int | None = None,
+        fusion: str | None = None,
+        filters: SearchFilters | None = None,
+    ) -> SearchResults:
         """Search for relevant chunks using hybrid search (vector similarity + full-text search).
 
+        The full-text search runs while the query is embedded. Results are
+        cached until the database is written, by this client or another
+        process, and cached results only report the "cache" and "total"
+        timings.
+
         Args:
             query: The search query string
             limit: Maximum number of results to return
             k: Parameter for Reciprocal Rank Fusion (default: 60)
+            nprobe: Number of lists scanned by the ivf vector engine, higher
+                values improve recall at the cost of latency (default: IVF_NPROBE)
+            fusion: How the vector and full-text results are fused, "rrf",
+                "minmax" or "zscore" (default: HYBRID_FUSION)
+            filters: Conditions on the uri, created_at or metadata of the
+                documents to search, e.g. {"uri": {"prefix": "file:///docs/"},
+                "metadata.topic": ["python", "rust"]}, see `parse_filters`
 
         Returns:
-            List of (chunk, score) tuples ordered by relevance
+            List of (chunk, score) tuples ordered by relevance, with the
+            milliseconds spent in each step of the search in `timings`
         """
-        return await self.chunk_repository.search_chunks_hybrid(query, limit, k)
+        start = time.perf_counter()
+        conditions = parse_filters(filters)
+        if self.search_cache is None:
+            return await self.chunk_repository.search_chunks_hybrid(
+                query, limit, k, nprobe, fusion, conditions
+            )
+
+        key = (
+            query,
+            limit,
+            k,
+            nprobe,
+            fusion or Config.HYBRID_FUSION,
+            filter_key(conditions),
+        )
+        # Captured before searching, so results of a search overlapping a
+        # write are not cached for the data written
+        version = await self.store.version()
+        cached = self.search_cache.get(key, version)
+        if cached is not None:
+            elapsed = (time.perf_counter() - start) * 1000
+            return SearchResults(cached, {"cache": elapsed, "total": elapsed})
+
+        results = await self.chunk_repository.search_chunks_hybrid(
+            query, limit, k, nprobe, fusion, conditions
+        )
+        self.search_cache.put(key, version, results)
+        return results
 
     async def ask(self, question: str) -> str:
         """Ask a question using the configured QA agent.
@@ -268,15 +383,20 @@ class HaikuRAG:
         """
         from haiku.rag.qa import get_qa_agent
 
-        qa_agent = get_qa_agent(self)
-        return await qa_agent.answer(question)
+        if self._qa_agent is None:
+            self._qa_agent = get_qa_agent(self)
+        return await self._qa_agent.answer(question)
 
     async def rebuild_database(self) -> AsyncGenerator[int, None]:
         """Rebuild the database by deleting all chunks and re-indexing all documents.
 
+        Embeddings stored with another quantization or prefix than the configured
+        ones are migrated to them.
+
         Yields:
             int: The ID of the document currently being processed
         """
+        await self.store.write(self.store.migrate_embeddings)
         documents = await self.list_documents()
 
         if not documents:
@@ -291,9 +411,24 @@ class HaikuRAG:
                 )
                 yield doc.id
 
-        if self.store._connection:
-            self.store._connection.commit()
+        await self.store.commit()
+
+    async def prune_embedding_cache(self, max_entries: int | None = None) -> int:
+        """Evict least recently used entries from the embedding cache.
 
-    def close(self):
-        """Close the underlying store connection."""
+        Args:
+            max_entries: Number of entries to keep (default: the configured maximum)
+
+        Returns:
+            The number of evicted entries
+        """
+        return await self.chunk_repository.embedding_cache.prune(max_entries)
+
+    async def close(self):
+        """Close the provider clients and the underlying store connection."""
+        if self._qa_agent is not None:
+            await self._qa_agent.close()
+            self._qa_agent = None
+        await self.chunk_repository.query_cache.close()
+        await self.chunk_repository.embedder.close()
         self.store.close()
@@ -13,11 +13,63 @@ class AppConfig(BaseModel):
     ENV: str = "development"
 
     DEFAULT_DATA_DIR: Path = get_default_data_dir()
+    # SQLite connection profile, see haiku.rag.store.engine.CONNECTION_PROFILES
+    DB_CONNECTION_PROFILE: str = "default"
+    # Connections used for concurrent searches and lookups
+    DB_READER_CONNECTIONS: int = 4
+    # Document metadata keys indexed for search filters, comma separated
+    DB_INDEXED_METADATA: list[str] = []
+    # Vector search engine: "vec0" (sqlite-vec), "numpy" (in-process index) or
+    # "ivf" (approximate in-process index)
+    VECTOR_ENGINE: str = "vec0"
+    # Number of IVF lists (0 picks the square root of the number of chunks)
+    IVF_NLIST: int = 0
+    # Number of IVF lists scanned per search
+    IVF_NPROBE: int = 16
     MONITOR_DIRECTORIES: list[Path] = []
+    # Threads hashing files whose stat data changed since they were ingested
+    MONITOR_HASH_WORKERS: int = 8
+    # File events are applied once a path saw no event for MONITOR_DEBOUNCE
+    # seconds, in batches, with at most MONITOR_MAX_BACKLOG paths pending
+    MONITOR_DEBOUNCE: float = 0.5
+    MONITOR_BATCH_SIZE: int = 256
+    MONITOR_MAX_BACKLOG: int = 10_000
+    # Seconds a deletion waits for a file with the same content, to detect moves
+    MONITOR_MOVE_WINDOW: float = 2.0
 
     EMBEDDINGS_PROVIDER: str = "ollama"
     EMBEDDINGS_MODEL: str = "mxbai-embed-large"
     EMBEDDINGS_VECTOR_DIM: int = 1024
+    EMBEDDINGS_BATCH_SIZE: int = 128
+    EMBEDDINGS_BATCH_MAX_TOKENS: int = 100_000
+    EMBEDDINGS_CACHE: bool = True
+    EMBEDDINGS_CACHE_MAX_ENTRIES: int = 100_000
+    # In-process cache of search query embeddings (0 entries disables it),
+    # with entries expiring after EMBEDDINGS_QUERY_CACHE_TTL seconds (0 never
+    # expires). With EMBEDDINGS_QUERY_CACHE_PERSIST, query embeddings are also
+    # kept in the database embedding cache
+    EMBEDDINGS_QUERY_CACHE_MAX_ENTRIES: int = 10_000
+    EMBEDDINGS_QUERY_CACHE_TTL: float = 3600.0
+    EMBEDDINGS_QUERY_CACHE_PERSIST: bool = False
+    # Storage of the embeddings searched by sqlite-vec: "float", "int8" or "bit"
+    EMBEDDINGS_QUANTIZATION: str = "float"
+    # Quantized or prefix searches score this many times the requested number
+    # of chunks again with their full float embeddings
+    EMBEDDINGS_RESCORE_FACTOR: int = 8
+    # Dimensions of the embedding prefix searched by sqlite-vec, for
+    # Matryoshka models (0 searches the full embeddings)
+    EMBEDDINGS_PREFIX_DIM: int = 0
+
+    # Hybrid search fusion: "rrf" (Reciprocal Rank Fusion), "minmax" or
+    # "zscore" (weighted sums of normalized scores)
+    HYBRID_FUSION: str = "rrf"
+    HYBRID_VECTOR_WEIGHT: float = 1.0
+    HYBRID_FTS_WEIGHT: float = 1.0
+    # Vector and full-text searches each retrieve this many times the
+    # requested number of chunks before fusion
+    HYBRID_CANDIDATE_FACTOR: int = 3
+    # Memory used by cached search results, in bytes (0 disables the cache)
+    SEARCH_CACHE_MAX_SIZE: int = 64 * 1024 * 1024
 
     QA_PROVIDER: str = "ollama"
     QA_MODEL: str = "qwen3"
@@ -25,13 +77,47 @@ class AppConfig(BaseModel):
     CHUNK_SIZE: int = 256
     CHUNK_OVERLAP: int = 32
 
+    # Document parsing processes (0 parses in a thread of the main process),
+    # with per-file limits in seconds and bytes
+    PARSER_WORKERS: int = os.cpu_count() or 1
+    PARSER_TIMEOUT: float = 120.0
+    PARSER_MAX_FILE_SIZE: int = 100 * 1024 * 1024
+    PARSER_MAX_MEMORY: int = 2 * 1024 * 1024 * 1024
+    PARSER_MAX_TASKS_PER_WORKER: int = 100
+    # Converted markdown cached by content hash, bounded in bytes. The cache
+    # directory defaults to "parse_cache" in DEFAULT_DATA_DIR
+    PARSE_CACHE: bool = True
+    PARSE_CACHE_DIR: Path | None = None
+    PARSE_CACHE_MAX_SIZE: int = 1024 * 1024 * 1024
+
+    # Ingestion pipeline workers per stage, and size of the queues between them
+    INGEST_LOAD_CONCURRENCY: int = 4
+    INGEST_EMBED_CONCURRENCY: int = 4
+    INGEST_QUEUE_SIZE: int = 64
+
     OLLAMA_BASE_URL: str = "http://localhost:11434"
 
+    # Maximum number of MCP tool calls served at once
+    MCP_MAX_CONCURRENCY: int = 16
+
+    # HTTP connection pooling for provider clients
+    HTTP_MAX_CONNECTIONS: int = 100
+    HTTP_MAX_KEEPALIVE_CONNECTIONS: int = 20
+    HTTP_KEEPALIVE_EXPIRY: float = 30.0
+    HTTP2: bool = True
+
     # Provider keys
     VOYAGE_API_KEY: str = ""
     OPENAI_API_KEY: str = ""
     ANTHROPIC_API_KEY: str = ""
 
+    @field_validator("DB_INDEXED_METADATA", mode="before")
+    @classmethod
+    def parse_indexed_metadata(cls, v):
+        if isinstance(v, str):
+            return [key.strip() for key in v.split(",") if key.strip()]
+        return v
+
     @field_validator("MONITOR_DIRECTORIES", mode="before")
     @classmethod
     def parse_monitor_directories(cls, v):
@@ -1,15 +1,22 @@
+from typing import Any
+
 from haiku.rag.config import Config
 from haiku.rag.embeddings.base import EmbedderBase
 from haiku.rag.embeddings.ollama import Embedder as OllamaEmbedder
 
 
-def get_embedder() -> EmbedderBase:
+def get_embedder(client: Any | None = None) -> EmbedderBase:
     """
     Factory function to get the appropriate embedder based on the configuration.
+
+    An optional pre-built provider client can be injected, for example to point
+    at a local stand-in server in tests.
     """
 
     if Config.EMBEDDINGS_PROVIDER == "ollama":
-        return OllamaEmbedder(Config.EMBEDDINGS_MODEL, Config.EMBEDDINGS_VECTOR_DIM)
+        return OllamaEmbedder(
+            Config.EMBEDDINGS_MODEL, Config.EMBEDDINGS_VECTOR_DIM, client=client
+        )
 
     if Config.EMBEDDINGS_PROVIDER == "voyageai":
         try:
@@ -20,7 +27,9 @@ def get_embedder() -> EmbedderBase:
                 "Please install haiku.rag with the 'voyageai' extra:"
                 "uv pip install haiku.rag --extra voyageai"
             )
-        return VoyageAIEmbedder(Config.EMBEDDINGS_MODEL, Config.EMBEDDINGS_VECTOR_DIM)
+        return VoyageAIEmbedder(
+            Config.EMBEDDINGS_MODEL, Config.EMBEDDINGS_VECTOR_DIM, client=client
+        )
 
     if Config.EMBEDDINGS_PROVIDER == "openai":
         try:
@@ -31,6 +40,8 @@ def get_embedder() -> EmbedderBase:
                 "Please install haiku.rag with the 'openai' extra:"
                 "uv pip install haiku.rag --extra openai"
             )
-        return OpenAIEmbedder(Config.EMBEDDINGS_MODEL, Config.EMBEDDINGS_VECTOR_DIM)
+        return OpenAIEmbedder(
+            Config.EMBEDDINGS_MODEL, Config.EMBEDDINGS_VECTOR_DIM, client=client
+        )
 
     raise ValueError(f"Unsupported embedding provider: {Config.EMBEDDINGS_PROVIDER}")
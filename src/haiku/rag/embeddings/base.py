@@ -1,12 +1,95 @@
+from collections.abc import Iterator
+from typing import Any
+
+from haiku.rag.config import Config
+from haiku.rag.http_client import close_client
+
+
 class EmbedderBase:
     _model: str = ""
     _vector_dim: int = 0
 
-    def __init__(self, model: str, vector_dim: int):
+    def __init__(
+        self,
+        model: str,
+        vector_dim: int,
+        max_batch_size: int = Config.EMBEDDINGS_BATCH_SIZE,
+        max_batch_tokens: int = Config.EMBEDDINGS_BATCH_MAX_TOKENS,
+        client: Any | None = None,
+    ):
         self._model = model
         self._vector_dim = vector_dim
+        self._max_batch_size = max_batch_size
+        self._max_batch_tokens = max_batch_tokens
+        # An injected client is owned by the caller and is never closed here.
+        self._client = client
+        self._owns_client = client is None
+
+    @property
+    def client(self) -> Any:
+        """The provider client, created on first use and reused afterwards."""
+        if self._client is None:
+            self._client = self._create_client()
+        return self._client
+
+    def _create_client(self) -> Any:
+        raise NotImplementedError(
+            "Embedder is an abstract class. Please implement the _create_client method in a subclass."
+        )
+
+    async def close(self) -> None:
+        """Close the provider client if it was created by the embedder."""
+        if self._client is not None and self._owns_client:
+            await close_client(self._client)
+            self._client = None
 
     async def embed(self, text: str) -> list[float]:
         raise NotImplementedError(
             "Embedder is an abstract class. Please implement the embed method in a subclass."
         )
+
+    async def embed_batch(self, texts: list[str]) -> list[list[float]]:
+        """Embed several texts, issuing as few provider requests as the limits allow.
+
+        Texts are split into requests of at most `max_batch_size` inputs and
+        `max_batch_tokens` tokens. Embeddings are returned in input order.
+        """
+        embeddings: list[list[float]] = []
+        for batch in self._batches(texts):
+            embeddings.extend(await self._embed_batch(batch))
+        return embeddings
+
+    async def _embed_batch(self, texts: list[str]) -> list[list[float]]:
+        """Embed a single request worth of texts.
+
+        Providers with a native bulk endpoint override this; the default falls
+        back to one `embed` call per text.
+        """
+        return [await self.embed(text) for text in texts]
+
+    def _batches(self, texts: list[str]) -> Iterator[list[str]]:
+        """Split texts into batches honouring the batch size and token budget."""
+        from haiku.rag.chunker import Chunker
+
+        batch: list[str] = []
+        batch_tokens = 0
+        for text in texts:
+            tokens = (
+                len(Chunker.encoder.encode(text, disallowed_special=()))
+                if self._max_batch_tokens > 0
+                else 0
+            )
+            if batch and (
+                len(batch) >= self._max_batch_size
+                or (
+                    self._max_batch_tokens > 0
+                    and batch_tokens + tokens > self._max_batch_tokens
+                )
+            ):
+                yield batch
+                batch = []
+                batch_tokens = 0
+            batch.append(text)
+            batch_tokens += tokens
+        if batch:
+            yield batch
@@ -2,13 +2,20 @@ from ollama import AsyncClient
 
 from haiku.rag.config import Config
 from haiku.rag.embeddings.base import EmbedderBase
+from haiku.rag.http_client import get_http_client_kwargs
 
 
 class Embedder(EmbedderBase):
     _model: str = Config.EMBEDDINGS_MODEL
     _vector_dim: int = 1024
 
+    def _create_client(self) -> AsyncClient:
+        return AsyncClient(host=Config.OLLAMA_BASE_URL, **get_http_client_kwargs())
+
     async def embed(self, text: str) -> list[float]:
-        client = AsyncClient(host=Config.OLLAMA_BASE_URL)
-        res = await client.embeddings(model=self._model, prompt=text)
-        return list(res["embedding"])
+        res = await self._embed_batch([text])
+        return res[0]
+
+    async def _embed_batch(self, texts: list[str]) -> list[list[float]]:
+        res = await self.client.embed(model=self._model, input=texts)
+        return [list(embedding) for embedding in res["embeddings"]]
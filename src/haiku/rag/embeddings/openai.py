@@ -1,20 +1,34 @@
 try:
-    from openai import AsyncOpenAI
+    from openai import AsyncOpenAI, DefaultAsyncHttpxClient
 
     from haiku.rag.config import Config
     from haiku.rag.embeddings.base import EmbedderBase
+    from haiku.rag.http_client import get_http_client_kwargs
 
     class Embedder(EmbedderBase):
         _model: str = Config.EMBEDDINGS_MODEL
         _vector_dim: int = 1536
 
+        def _create_client(self) -> AsyncOpenAI:
+            return AsyncOpenAI(
+                http_client=DefaultAsyncHttpxClient(**get_http_client_kwargs())
+            )
+
         async def embed(self, text: str) -> list[float]:
-            client = AsyncOpenAI()
-            response = await client.embeddings.create(
+            response = await self.client.embeddings.create(
                 model=self._model,
                 input=text,
             )
             return response.data[0].embedding
 
+        async def _embed_batch(self, texts: list[str]) -> list[list[float]]:
+            response = await self.client.embeddings.create(
+                model=self._model,
+                input=texts,
+            )
+            return [
+                item.embedding for item in sorted(response.data, key=lambda d: d.index)
+            ]
+
 except ImportError:
     pass
@@ -8,10 +8,16 @@ try:
         _model: str = Config.EMBEDDINGS_MODEL
         _vector_dim: int = 1024
 
+        def _create_client(self) -> Client:
+            return Client()
+
         async def embed(self, text: str) -> list[float]:
-            client = Client()
-            res = client.embed([text], model=self._model, output_dtype="float")
+            res = self.client.embed([text], model=self._model, output_dtype="float")
             return res.embeddings[0]  # type: ignore[return-value]
 
+        async def _embed_batch(self, texts: list[str]) -> list[list[float]]:
+            res = self.client.embed(texts, model=self._model, output_dtype="float")
+            return res.embeddings  # type: ignore[return-value]
+
 except ImportError:
     pass
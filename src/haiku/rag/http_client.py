@@ -0,0 +1,39 @@
+import importlib.util
+import inspect
+from typing import Any
+
+import httpx
+
+from haiku.rag.config import Config
+
+
+def http2_available() -> bool:
+    """Whether HTTP/2 support (the `h2` package) is installed."""
+    return importlib.util.find_spec("h2") is not None
+
+
+def get_http_client_kwargs() -> dict[str, Any]:
+    """
+    Keyword arguments for the long-lived httpx clients used by providers.
+
+    Connections are kept alive and pooled according to the configured limits,
+    and HTTP/2 is negotiated when enabled and available.
+    """
+    return {
+        "limits": httpx.Limits(
+            max_connections=Config.HTTP_MAX_CONNECTIONS,
+            max_keepalive_connections=Config.HTTP_MAX_KEEPALIVE_CONNECTIONS,
+            keepalive_expiry=Config.HTTP_KEEPALIVE_EXPIRY,
+        ),
+        "http2": Config.HTTP2 and http2_available(),
+    }
+
+
+async def close_client(client: Any) -> None:
+    """Close a provider client, whether its `close` is sync or async."""
+    close = getattr(client, "close", None)
+    if close is None:
+        return
+    result = close()
+    if inspect.isawaitable(result):
+        await result
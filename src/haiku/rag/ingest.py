@@ -0,0 +1,242 @@
+import asyncio
+import time
+from collections.abc import Awaitable, Callable, Iterable, Mapping
+from pathlib import Path
+from typing import TYPE_CHECKING, Any
+
+from pydantic import BaseModel
+
+from haiku.rag.config import Config
+from haiku.rag.store.models.document import Document
+
+if TYPE_CHECKING:
+    from haiku.rag.client import HaikuRAG
+
+Source = str | Path | Document
+
+# Sentinel telling a stage worker that its input is exhausted
+_DONE = object()
+
+
+class StageStats(BaseModel):
+    """Counters and timings of one ingestion stage."""
+
+    name: str
+    workers: int
+    processed: int = 0
+    failed: int = 0
+    # Time spent processing items, summed over the stage's workers
+    busy_seconds: float = 0.0
+    # Wall time from the first item entering the stage to the last one leaving it
+    elapsed_seconds: float = 0.0
+
+    @property
+    def throughput(self) -> float:
+        """Items processed per second of wall time."""
+        if not self.elapsed_seconds:
+            return 0.0
+        return self.processed / self.elapsed_seconds
+
+
+class IngestResult(BaseModel):
+    """Outcome of an ingestion run."""
+
+    created: int = 0
+    updated: int = 0
+    unchanged: int = 0
+    document_ids: list[int] = []
+    # Error message by source, for sources that could not be ingested
+    errors: dict[str, str] = {}
+    stages: dict[str, StageStats] = {}
+    elapsed_seconds: float = 0.0
+
+
+class _Stage:
+    def __init__(self, name: str, workers: int):
+        self.stats = StageStats(name=name, workers=workers)
+        self._started: float | None = None
+
+    async def measure(self, awaitable: Awaitable[Any]) -> Any:
+        start = time.perf_counter()
+        if self._started is None:
+            self._started = start
+        try:
+            return await awaitable
+        finally:
+            end = time.perf_counter()
+            self.stats.busy_seconds += end - start
+            self.stats.elapsed_seconds = end - self._started
+
+
+class IngestPipeline:
+    """Ingest many sources with overlapping load, embed and write stages.
+
+    Sources are read and parsed by `load_concurrency` workers, then chunked and
+    embedded by `embed_concurrency` workers, and finally written by a single
+    writer. Stages are connected by queues of at most `queue_size` items, so
+    memory use does not grow with the number of sources.
+
+    Sources are file paths, URLs, or `Document`s whose content is already
+    known. File paths found in `content_hashes` are not hashed again, their
+    MD5 is taken from there. Unchanged sources are skipped like in
+    `HaikuRAG.create_document_from_source`. A source that fails is recorded in
+    the result's errors and does not stop the run. Cancelling `run` stops all
+    stages; every document is written in its own transaction, so a cancelled
+    run leaves only fully ingested documents behind.
+    """
+
+    def __init__(
+        self,
+        client: "HaikuRAG",
+        load_concurrency: int = Config.INGEST_LOAD_CONCURRENCY,
+        embed_concurrency: int = Config.INGEST_EMBED_CONCURRENCY,
+        queue_size: int = Config.INGEST_QUEUE_SIZE,
+        on_document: Callable[[Document], Any] | None = None,
+        content_hashes: Mapping[Path, str] | None = None,
+    ):
+        if load_concurrency < 1 or embed_concurrency < 1:
+            raise ValueError("Each ingestion stage needs at least one worker")
+        self.client = client
+        self.load_concurrency = load_concurrency
+        self.embed_concurrency = embed_concurrency
+        self.queue_size = queue_size
+        self.on_document = on_document
+        self.content_hashes = content_hashes or {}
+
+    async def run(
+        self, sources: Iterable[Source], metadata: dict | None = None
+    ) -> IngestResult:
+        """Ingest all sources, applying `metadata` to those loaded from files or URLs."""
+        result = IngestResult()
+        load = _Stage("load", self.load_concurrency)
+        embed = _Stage("embed", self.embed_concurrency)
+        write = _Stage("write", 1)
+        result.stages = {
+            stage.stats.name: stage.stats for stage in (load, embed, write)
+        }
+
+        to_load: asyncio.Queue = asyncio.Queue(self.queue_size)
+        to_embed: asyncio.Queue = asyncio.Queue(self.queue_size)
+        to_write: asyncio.Queue = asyncio.Queue(self.queue_size)
+
+        def completed(document: Document) -> None:
+            if document.id is not None:
+                result.document_ids.append(document.id)
+            if self.on_document is not None:
+                self.on_document(document)
+
+        async def feed() -> None:
+            seen: set[str] = set()
+            for index, source in enumerate(sources):
+                key = self._source_key(source, index)
+                if key in seen:
+                    continue
+                seen.add(key)
+                await to_load.put((key, source))
+            for _ in range(self.load_concurrency):
+                await to_load.put(_DONE)
+
+        async def load_source(source: Source) -> Document | None:
+            document, changed = await self._load(source, metadata)
+            if not changed:
+                result.unchanged += 1
+                completed(document)
+                return None
+            return document
+
+        async def embed_document(document: Document):
+            chunk_texts, embeddings = await self.client.chunk_repository.prepare_chunks(
+                document.content, document.id
+            )
+            return document, chunk_texts, embeddings
+
+        async def write_document(prepared) -> None:
+            document, chunk_texts, embeddings = prepared
+            is_new = document.id is None
+            document = await self.client.document_repository.save(
+                document, chunk_texts, embeddings
+            )
+            if is_new:
+                result.created += 1
+            else:
+                result.updated += 1
+            completed(document)
+
+        async def work(
+            stage: _Stage,
+            inbox: asyncio.Queue,
+            outbox: asyncio.Queue | None,
+            fn: Callable[[Any], Awaitable[Any]],
+        ) -> None:
+            while (item := await inbox.get()) is not _DONE:
+                key, value = item
+                try:
+                    output = await stage.measure(fn(value))
+                except Exception as e:
+                    stage.stats.failed += 1
+                    result.errors[key] = str(e) or type(e).__name__
+                    continue
+                stage.stats.processed += 1
+                if outbox is not None and output is not None:
+                    await outbox.put((key, output))
+
+        async def run_stage(
+            stage: _Stage,
+            inbox: asyncio.Queue,
+            outbox: asyncio.Queue | None,
+            fn: Callable[[Any], Awaitable[Any]],
+            downstream_workers: int,
+        ) -> None:
+            await asyncio.gather(
+                *(work(stage, inbox, outbox, fn) for _ in range(stage.stats.workers))
+            )
+            if outbox is not None:
+                for _ in range(downstream_workers):
+                    await outbox.put(_DONE)
+
+        start = time.perf_counter()
+        tasks = [
+            asyncio.create_task(feed()),
+            asyncio.create_task(
+                run_stage(load, to_load, to_embed, load_source, self.embed_concurrency)
+            ),
+            asyncio.create_task(
+                run_stage(embed, to_embed, to_write, embed_document, 1)
+            ),
+            asyncio.create_task(run_stage(write, to_write, None, write_document, 0)),
+        ]
+        try:
+            await asyncio.gather(*tasks)
+        except BaseException:
+            for task in tasks:
+                task.cancel()
+            await asyncio.gather(*tasks, return_exceptions=True)
+            raise
+        finally:
+            result.elapsed_seconds = time.perf_counter() - start
+
+        return result
+
+    async def _load(
+        self, source: Source, metadata: dict | None
+    ) -> tuple[Document, bool]:
+        if not isinstance(source, Document):
+            return await self.client.load_source(
+                source, metadata, self.content_hashes.get(Path(source))
+            )
+
+        if source.id is None and source.uri is not None:
+            existing_doc = await self.client.get_document_by_uri(source.uri)
+            if existing_doc is not None:
+                if existing_doc.content == source.content:
+                    return existing_doc, False
+                existing_doc.content = source.content
+                existing_doc.metadata = source.metadata
+                return existing_doc, True
+        return source, True
+
+    @staticmethod
+    def _source_key(source: Source, index: int) -> str:
+        if isinstance(source, Document):
+            return source.uri or f"document #{index}"
+        return str(source)
@@ -1,3 +1,6 @@
+import asyncio
+from collections.abc import AsyncIterator
+from contextlib import asynccontextmanager
 from pathlib import Path
 from typing import Any, Literal
 
@@ -5,6 +8,7 @@ from fastmcp import FastMCP
 from pydantic import BaseModel
 
 from haiku.rag.client import HaikuRAG
+from haiku.rag.config import Config
 
 
 class SearchResult(BaseModel):
@@ -22,9 +26,48 @@ class DocumentResult(BaseModel):
     updated_at: str
 
 
-def create_mcp_server(db_path: Path | Literal[":memory:"]) -> FastMCP:
-    """Create an MCP server with the specified database path."""
-    mcp = FastMCP("haiku-rag")
+def create_mcp_server(
+    db_path: Path | Literal[":memory:"],
+    client: HaikuRAG | None = None,
+    max_concurrency: int = Config.MCP_MAX_CONCURRENCY,
+) -> FastMCP:
+    """Create an MCP server with the specified database path.
+
+    All tools share a single HaikuRAG client. If `client` is given it is used as
+    is and left open, otherwise the server opens one on first use and closes it
+    when it shuts down. At most `max_concurrency` tool calls run at once, and
+    writes are serialized.
+    """
+    shared_client = client
+    lifespans = 0
+    calls = asyncio.Semaphore(max_concurrency)
+    writes = asyncio.Lock()
+
+    @asynccontextmanager
+    async def lifespan(server: FastMCP) -> AsyncIterator[dict[str, Any]]:  # noqa: ARG001
+        nonlocal shared_client, lifespans
+        lifespans += 1
+        try:
+            yield {}
+        finally:
+            lifespans -= 1
+            if client is None and lifespans == 0 and shared_client is not None:
+                await shared_client.close()
+                shared_client = None
+
+    @asynccontextmanager
+    async def use_client(write: bool = False) -> AsyncIterator[HaikuRAG]:
+        nonlocal shared_client
+        async with calls:
+            if shared_client is None:
+                shared_client = HaikuRAG(db_path)
+            if write:
+                async with writes:
+                    yield shared_client
+            else:
+                yield shared_client
+
+    mcp = FastMCP("haiku-rag", lifespan=lifespan)
 
     @mcp.tool()
     async def add_document_from_file(
@@ -32,7 +75,7 @@ def create_mcp_server(db_path: Path | Literal[":memory:"]) -> FastMCP:
     ) -> int | None:
         """Add a document to the RAG system from a file path."""
         try:
-            async with HaikuRAG(db_path) as rag:
+            async with use_client(write=True) as rag:
                 document = await rag.create_document_from_source(
                     Path(file_path), metadata or {}
                 )
@@ -46,7 +89,7 @@ def create_mcp_server(db_path: Path | Literal[":memory:"]) -> FastMCP:
     ) -> int | None:
         """Add a document to the RAG system from a URL."""
         try:
-            async with HaikuRAG(db_path) as rag:
+            async with use_client(write=True) as rag:
                 document = await rag.create_document_from_source(url, metadata or {})
                 return document.id
         except Exception:
@@ -58,18 +101,27 @@ def create_mcp_server(db_path: Path | Literal[":memory:"]) -> FastMCP:
     ) -> int | None:
         """Add a document to the RAG system from text content."""
         try:
-            async with HaikuRAG(db_path) as rag:
+            async with use_client(write=True) as rag:
                 document = await rag.create_document(content, uri, metadata or {})
                 return document.id
         except Exception:
             return None
 
     @mcp.tool()
-    async def search_documents(query: str, limit: int = 5) -> list[SearchResult]:
-        """Search the RAG system for documents using hybrid search (vector similarity + full-text search)."""
+    async def search_documents(
+        query: str, limit: int = 5, filters: dict[str, Any] | None = None
+    ) -> list[SearchResult]:
+        """Search the RAG system for documents using hybrid search (vector similarity + full-text search).
+
+        `filters` restricts the search to documents matching all its conditions,
+        keyed by "uri", "created_at" or "metadata.<key>". A value matches by
+        equality, a list of values matches any of them, and an object applies
+        operators among "eq", "in", "prefix", "gt", "gte", "lt" and "lte", e.g.
+        {"uri": {"prefix": "file:///docs/"}, "created_at": {"gte": "2024-01-01"}}.
+        """
         try:
-            async with HaikuRAG(db_path) as rag:
-                results = await rag.search(query, limit)
+            async with use_client() as rag:
+                results = await rag.search(query, limit, filters=filters)
 
                 search_results = []
                 for chunk, score in results:
@@ -89,7 +141,7 @@ def create_mcp_server(db_path: Path | Literal[":memory:"]) -> FastMCP:
     async def get_document(document_id: int) -> DocumentResult | None:
         """Get a document by its ID."""
         try:
-            async with HaikuRAG(db_path) as rag:
+            async with use_client() as rag:
                 document = await rag.get_document_by_id(document_id)
 
                 if document is None:
@@ -112,7 +164,7 @@ def create_mcp_server(db_path: Path | Literal[":memory:"]) -> FastMCP:
     ) -> list[DocumentResult]:
         """List all documents with optional pagination."""
         try:
-            async with HaikuRAG(db_path) as rag:
+            async with use_client() as rag:
                 documents = await rag.list_documents(limit, offset)
 
                 return [
@@ -133,7 +185,7 @@ def create_mcp_server(db_path: Path | Literal[":memory:"]) -> FastMCP:
     async def delete_document(document_id: int) -> bool:
         """Delete a document by its ID."""
         try:
-            async with HaikuRAG(db_path) as rag:
+            async with use_client(write=True) as rag:
                 return await rag.delete_document(document_id)
         except Exception:
             return False
@@ -1,15 +1,31 @@
+import asyncio
+import time
+from collections.abc import Iterable, Iterator
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass
 from pathlib import Path
+from urllib.parse import urlparse
+from urllib.request import url2pathname
 
+from pydantic import BaseModel
 from watchfiles import Change, DefaultFilter, awatch
 
 from haiku.rag.client import HaikuRAG
+from haiku.rag.config import Config
+from haiku.rag.ingest import IngestResult
 from haiku.rag.logging import get_logger
 from haiku.rag.reader import FileReader
 from haiku.rag.store.models.document import Document
+from haiku.rag.store.models.file_manifest import FileManifestEntry
+from haiku.rag.utils import md5_file
 
 logger = get_logger()
 
 
+def _uri_to_path(uri: str) -> Path:
+    return Path(url2pathname(urlparse(uri).path))
+
+
 class FileFilter(DefaultFilter):
     def __init__(self, *, ignore_paths: list[Path] | None = None) -> None:
         self.extensions = tuple(FileReader.extensions)
@@ -19,55 +35,434 @@ class FileFilter(DefaultFilter):
         return path.endswith(self.extensions) and super().__call__(change, path)
 
 
+class MonitorStats(BaseModel):
+    """Counters of the file changes handled by a FileWatcher."""
+
+    events: int = 0
+    # Batches of changes applied
+    batches: int = 0
+    # Events merged into a change of the same path that was still pending
+    coalesced: int = 0
+    upserted: int = 0
+    # Files whose document was moved to a new file with the same content
+    moved: int = 0
+    deleted: int = 0
+    failed: int = 0
+    queue_depth: int = 0
+    max_queue_depth: int = 0
+    # Seconds between the first event of a change and its dispatch
+    last_lag_seconds: float = 0.0
+    max_lag_seconds: float = 0.0
+
+
+@dataclass
+class _PendingChange:
+    change: Change
+    first_seen: float
+    last_seen: float
+    # Whether the path did not exist before its first pending event
+    added: bool
+
+
+class ChangeQueue:
+    """Coalesce file changes per path until they settle.
+
+    A path is due once no event arrived for it during `debounce` seconds, or
+    `max_delay` seconds after its first pending event. Only the last change
+    of a path is kept, and a path that was added then deleted is dropped
+    altogether. Deletions are due `move_window` seconds after their event at
+    the earliest, so that the file a path was moved to is handled first. At
+    most `max_backlog` paths are pending: further events wait until batches
+    are taken.
+    """
+
+    def __init__(
+        self,
+        debounce: float = Config.MONITOR_DEBOUNCE,
+        batch_size: int = Config.MONITOR_BATCH_SIZE,
+        max_backlog: int = Config.MONITOR_MAX_BACKLOG,
+        max_delay: float | None = None,
+        move_window: float = Config.MONITOR_MOVE_WINDOW,
+    ):
+        self.debounce = debounce
+        self.batch_size = batch_size
+        self.max_backlog = max_backlog
+        self.max_delay = debounce * 10 if max_delay is None else max_delay
+        self.move_window = move_window
+        self.stats = MonitorStats()
+        self._pending: dict[Path, _PendingChange] = {}
+        self._changed = asyncio.Condition()
+
+    def __len__(self) -> int:
+        return len(self._pending)
+
+    async def put(self, change: Change, path: Path) -> None:
+        """Record a change, waiting while the backlog is full."""
+        async with self._changed:
+            await self._changed.wait_for(
+                lambda: (
+                    path in self._pending
+                    or len(self._pending) < max(self.max_backlog, 1)
+                )
+            )
+            now = time.monotonic()
+            self.stats.events += 1
+            pending = self._pending.get(path)
+            if pending is None:
+                self._pending[path] = _PendingChange(
+                    change, now, now, added=change == Change.added
+                )
+            elif pending.added and change == Change.deleted:
+                del self._pending[path]
+                self.stats.coalesced += 2
+            else:
+                pending.change = change
+                pending.last_seen = now
+                self.stats.coalesced += 1
+            self._update_depth()
+            self._changed.notify_all()
+
+    async def get_batch(self) -> list[tuple[Change, Path]]:
+        """Wait for due changes and return at most `batch_size` of them, oldest first."""
+        async with self._changed:
+            while True:
+                now = time.monotonic()
+                batch = [
+                    (path, pending)
+                    for path, pending in self._pending.items()
+                    if self._due_at(pending) <= now
+                ][: max(self.batch_size, 1)]
+                if batch:
+                    break
+                timeout = min(
+                    (self._due_at(pending) for pending in self._pending.values()),
+                    default=None,
+                )
+                try:
+                    await asyncio.wait_for(
+                        self._changed.wait(),
+                        None if timeout is None else timeout - now,
+                    )
+                except asyncio.TimeoutError:
+                    pass
+
+            for path, pending in batch:
+                del self._pending[path]
+                lag = now - pending.first_seen
+                self.stats.last_lag_seconds = lag
+                self.stats.max_lag_seconds = max(self.stats.max_lag_seconds, lag)
+            self._update_depth()
+            self._changed.notify_all()
+            return [(pending.change, path) for path, pending in batch]
+
+    def _due_at(self, pending: _PendingChange) -> float:
+        due_at = min(
+            pending.last_seen + self.debounce, pending.first_seen + self.max_delay
+        )
+        if pending.change == Change.deleted:
+            due_at = max(due_at, pending.last_seen + self.move_window)
+        return due_at
+
+    def _update_depth(self) -> None:
+        self.stats.queue_depth = len(self._pending)
+        self.stats.max_queue_depth = max(
+            self.stats.max_queue_depth, self.stats.queue_depth
+        )
+
+
 class FileWatcher:
-    def __init__(self, paths: list[Path], client: HaikuRAG):
+    """Keep the documents of monitored directories in sync with their files.
+
+    File events are coalesced in a `ChangeQueue` and applied in batches:
+    added and modified files go through the ingestion pipeline, and the
+    documents of deleted files are removed together. A new file with the
+    size, extension and MD5 of a file that is gone takes over its document,
+    so moved files are not parsed and embedded again.
+    """
+
+    def __init__(
+        self,
+        paths: list[Path],
+        client: HaikuRAG,
+        hash_workers: int = Config.MONITOR_HASH_WORKERS,
+        queue: ChangeQueue | None = None,
+    ):
         self.paths = paths
         self.client = client
+        self.hash_workers = hash_workers
+        self.queue = queue or ChangeQueue()
+
+    @property
+    def stats(self) -> MonitorStats:
+        return self.queue.stats
 
     async def observe(self):
         logger.info(f"Watching files in {self.paths}")
         filter = FileFilter()
         await self.refresh()
 
-        async for changes in awatch(*self.paths, watch_filter=filter):
-            await self.handler(changes)
+        dispatcher = asyncio.create_task(self.dispatch())
+        try:
+            async for changes in awatch(*self.paths, watch_filter=filter):
+                await self.handler(changes)
+        finally:
+            dispatcher.cancel()
+            await asyncio.gather(dispatcher, return_exceptions=True)
 
     async def handler(self, changes: set[tuple[Change, str]]):
         for change, path in changes:
-            if change == Change.added or change == Change.modified:
-                await self._upsert_document(Path(path))
-            elif change == Change.deleted:
-                await self._delete_document(Path(path))
+            await self.queue.put(change, Path(path))
+
+    async def dispatch(self):
+        """Apply batches of settled changes until cancelled."""
+        while True:
+            batch = await self.queue.get_batch()
+            try:
+                await self.apply(batch)
+            except Exception as e:
+                self.stats.failed += len(batch)
+                logger.error(f"Failed to apply {len(batch)} file changes: {e}")
+            self.stats.batches += 1
+
+    async def apply(self, changes: list[tuple[Change, Path]]):
+        """Upsert the documents of added or modified files and delete the others."""
+        upserts = [path for change, path in changes if change != Change.deleted]
+        deletes = [path for change, path in changes if change == Change.deleted]
+
+        # Files deleted since their event are left to their deletion event
+        entries = await asyncio.to_thread(self._stat, upserts)
+        existing = await self.client.document_repository.get_ids_by_uri(
+            [entry.uri for _, entry in entries]
+        )
+        new = [(file, entry) for file, entry in entries if entry.uri not in existing]
+        moved = await self._move(new, await self._gone({e.size for _, e in new}))
+
+        result = await self._ingest(
+            [(file, entry) for file, entry in entries if entry.uri not in moved]
+        )
+        deleted = await self._delete([path.as_uri() for path in deletes])
+
+        self.stats.upserted += result.created + result.updated + result.unchanged
+        self.stats.moved += len(moved)
+        self.stats.deleted += deleted
+        self.stats.failed += len(result.errors)
+        logger.info(
+            f"Applied {len(changes)} file changes: {result.created} created, "
+            f"{result.updated} updated, {len(moved)} moved, {deleted} deleted, "
+            f"{len(result.errors)} failed, {len(self.queue)} pending"
+        )
 
     async def refresh(self):
+        """Bring the documents of the monitored directories up to date.
+
+        Files whose size and modification time match the file manifest are
+        skipped without being read. The others are hashed in a thread pool
+        and only ingested if their MD5 differs from their document's.
+        New files with the content of a missing file take over its document,
+        and the documents of the other missing files are removed in bulk.
+        """
+        files = await asyncio.to_thread(self._scan)
+        manifest = await self.client.file_manifest_repository.list_all()
+        documents = await self.client.document_repository.get_uri_index("file:")
+
+        to_hash: list[tuple[Path, FileManifestEntry]] = []
+        for uri, (file, entry) in files.items():
+            known = manifest.get(uri)
+            document = documents.get(uri)
+            if (
+                known is None
+                or document is None
+                or (known.size, known.mtime_ns) != (entry.size, entry.mtime_ns)
+                or known.md5 != document[1]
+            ):
+                to_hash.append((file, entry))
+        failed = await self._hash(to_hash)
+
+        # Files that were only touched just get their manifest entry updated
+        touched: list[FileManifestEntry] = []
+        to_ingest: list[tuple[Path, FileManifestEntry]] = []
+        for file, entry in to_hash:
+            if file in failed:
+                continue
+            document = documents.get(entry.uri)
+            if document is not None and document[1] == entry.md5:
+                touched.append(entry)
+            else:
+                to_ingest.append((file, entry))
+
+        # Only directories that exist are cleaned up, so that an unmounted
+        # volume does not delete its documents
+        roots = tuple(
+            Path(path).absolute().as_uri().rstrip("/") + "/"
+            for path in self.paths
+            if Path(path).is_dir()
+        )
+        gone = [
+            entry
+            for uri, entry in manifest.items()
+            if uri.startswith(roots) and uri not in files and uri in documents
+        ]
+        moved = await self._move(
+            [(file, entry) for file, entry in to_ingest if entry.uri not in documents],
+            gone,
+        )
+
+        result = await self._ingest(
+            [(file, entry) for file, entry in to_ingest if entry.uri not in moved]
+        )
+        await self.client.file_manifest_repository.upsert_many(touched)
+
+        deleted = await self._delete(
+            [
+                uri
+                for uri in {*documents, *manifest}
+                if uri.startswith(roots) and uri not in files
+            ]
+        )
+
+        unchanged = len(files) - len(to_hash) + len(touched) + result.unchanged
+        logger.info(
+            f"Refreshed {self.paths}: {result.created} created, "
+            f"{result.updated} updated, {unchanged} unchanged, {len(moved)} moved, "
+            f"{deleted} deleted, {len(result.errors) + len(failed)} failed"
+        )
+
+    def _files(self) -> Iterator[Path]:
         for path in self.paths:
-            for f in Path(path).rglob("**/*"):
+            for f in Path(path).absolute().rglob("**/*"):
                 if f.is_file() and f.suffix in FileReader.extensions:
-                    await self._upsert_document(f)
+                    yield f
 
-    async def _upsert_document(self, file: Path) -> Document | None:
-        try:
-            uri = file.as_uri()
-            existing_doc = await self.client.get_document_by_uri(uri)
-            if existing_doc:
-                doc = await self.client.create_document_from_source(str(file))
-                logger.info(f"Updated document {existing_doc.id} from {file}")
-                return doc
+    def _scan(self) -> dict[str, tuple[Path, FileManifestEntry]]:
+        return {entry.uri: (file, entry) for file, entry in self._stat(self._files())}
+
+    async def _hash(self, files: list[tuple[Path, FileManifestEntry]]) -> set[Path]:
+        """Set the MD5 of manifest entries, reading files in a thread pool.
+
+        Returns the files that could not be read.
+        """
+        loop = asyncio.get_running_loop()
+        failed: set[Path] = set()
+        with ThreadPoolExecutor(max(self.hash_workers, 1)) as executor:
+            hashes = await asyncio.gather(
+                *(loop.run_in_executor(executor, md5_file, file) for file, _ in files),
+                return_exceptions=True,
+            )
+        for (file, entry), md5 in zip(files, hashes):
+            if isinstance(md5, BaseException):
+                logger.error(f"Failed to read {file}: {md5}")
+                failed.add(file)
             else:
-                doc = await self.client.create_document_from_source(str(file))
-                logger.info(f"Created new document {doc.id} from {file}")
-                return doc
-        except Exception as e:
-            logger.error(f"Failed to upsert document from {file}: {e}")
-            return None
-
-    async def _delete_document(self, file: Path):
-        try:
-            uri = file.as_uri()
-            existing_doc = await self.client.get_document_by_uri(uri)
-
-            if existing_doc and existing_doc.id:
-                await self.client.delete_document(existing_doc.id)
-                logger.info(f"Deleted document {existing_doc.id} for {file}")
-        except Exception as e:
-            logger.error(f"Failed to delete document for {file}: {e}")
+                entry.md5 = md5
+        return failed
+
+    @staticmethod
+    def _stat(files: Iterable[Path]) -> list[tuple[Path, FileManifestEntry]]:
+        entries = []
+        for file in files:
+            try:
+                stat = file.stat()
+            except OSError:
+                continue
+            entries.append(
+                (
+                    file,
+                    FileManifestEntry(
+                        uri=file.as_uri(), size=stat.st_size, mtime_ns=stat.st_mtime_ns
+                    ),
+                )
+            )
+        return entries
+
+    async def _ingest(
+        self, entries: list[tuple[Path, FileManifestEntry]]
+    ) -> IngestResult:
+        """Ingest files and record them in the file manifest."""
+        by_uri = {entry.uri: entry for _, entry in entries}
+        ingested: list[FileManifestEntry] = []
+
+        def record(document: Document) -> None:
+            if document.uri in by_uri and document.metadata.get("md5"):
+                ingested.append(
+                    by_uri[document.uri].model_copy(
+                        update={"md5": document.metadata["md5"]}
+                    )
+                )
+
+        # Files hashed to detect changes and moves are not read again
+        result = await self.client.ingest_many(
+            [file for file, _ in entries],
+            on_document=record,
+            content_hashes={file: entry.md5 for file, entry in entries if entry.md5},
+        )
+        await self.client.file_manifest_repository.upsert_many(ingested)
+        for source, error in result.errors.items():
+            logger.error(f"Failed to upsert document from {source}: {error}")
+        return result
+
+    async def _gone(self, sizes: set[int]) -> list[FileManifestEntry]:
+        """Manifest entries of files with one of the given sizes that no longer exist."""
+        if not sizes:
+            return []
+        entries = await self.client.file_manifest_repository.get_by_size(list(sizes))
+        return await asyncio.to_thread(
+            lambda: [entry for entry in entries if not _uri_to_path(entry.uri).exists()]
+        )
+
+    async def _move(
+        self,
+        entries: list[tuple[Path, FileManifestEntry]],
+        gone: list[FileManifestEntry],
+    ) -> set[str]:
+        """Move the documents of gone files to new files with the same content.
+
+        Only new files with the size and extension of a gone file are hashed.
+        Returns the URIs of the new files that took over a document.
+        """
+        candidates: dict[tuple[int, str], list[FileManifestEntry]] = {}
+        for entry in gone:
+            key = (entry.size, _uri_to_path(entry.uri).suffix.lower())
+            candidates.setdefault(key, []).append(entry)
+        entries = [
+            (file, entry)
+            for file, entry in entries
+            if (entry.size, file.suffix.lower()) in candidates
+        ]
+        failed = await self._hash(
+            [(file, entry) for file, entry in entries if not entry.md5]
+        )
+
+        moves: dict[str, FileManifestEntry] = {}
+        for file, entry in entries:
+            if file in failed:
+                continue
+            matches = candidates[(entry.size, file.suffix.lower())]
+            for i, previous in enumerate(matches):
+                if previous.md5 == entry.md5:
+                    moves[previous.uri] = entry
+                    del matches[i]
+                    break
+        if not moves:
+            return set()
+
+        moved = await self.client.document_repository.move_many(
+            [(old_uri, entry.uri) for old_uri, entry in moves.items()]
+        )
+        await self.client.file_manifest_repository.delete_many(
+            [old_uri for old_uri, _ in moved]
+        )
+        await self.client.file_manifest_repository.upsert_many(
+            [moves[old_uri] for old_uri, _ in moved]
+        )
+        for old_uri, new_uri in moved:
+            logger.info(f"Moved document from {old_uri} to {new_uri}")
+        return {new_uri for _, new_uri in moved}
+
+    async def _delete(self, uris: list[str]) -> int:
+        """Delete the documents and manifest entries of removed files."""
+        if not uris:
+            return 0
+        document_ids = await self.client.document_repository.get_ids_by_uri(uris)
+        deleted = await self.client.delete_documents(list(document_ids.values()))
+        await self.client.file_manifest_repository.delete_many(uris)
+        return deleted
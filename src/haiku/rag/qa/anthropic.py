@@ -1,15 +1,21 @@
 from collections.abc import Sequence
 
 try:
-    from anthropic import AsyncAnthropic
+    from anthropic import AsyncAnthropic, DefaultAsyncHttpxClient
     from anthropic.types import MessageParam, TextBlock, ToolParam, ToolUseBlock
 
     from haiku.rag.client import HaikuRAG
+    from haiku.rag.http_client import get_http_client_kwargs
     from haiku.rag.qa.base import QuestionAnswerAgentBase
 
     class QuestionAnswerAnthropicAgent(QuestionAnswerAgentBase):
-        def __init__(self, client: HaikuRAG, model: str = "claude-3-5-haiku-20241022"):
-            super().__init__(client, model or self._model)
+        def __init__(
+            self,
+            client: HaikuRAG,
+            model: str = "claude-3-5-haiku-20241022",
+            llm_client: AsyncAnthropic | None = None,
+        ):
+            super().__init__(client, model or self._model, llm_client)
             self.tools: Sequence[ToolParam] = [
                 ToolParam(
                     name="search_documents",
@@ -32,8 +38,13 @@ try:
                 )
             ]
 
+        def _create_llm_client(self) -> AsyncAnthropic:
+            return AsyncAnthropic(
+                http_client=DefaultAsyncHttpxClient(**get_http_client_kwargs())
+            )
+
         async def answer(self, question: str) -> str:
-            anthropic_client = AsyncAnthropic()
+            anthropic_client = self.llm_client
 
             messages: list[MessageParam] = [{"role": "user", "content": question}]
 
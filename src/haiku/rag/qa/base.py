@@ -1,4 +1,7 @@
+from typing import Any
+
 from haiku.rag.client import HaikuRAG
+from haiku.rag.http_client import close_client
 from haiku.rag.qa.prompts import SYSTEM_PROMPT
 
 
@@ -6,15 +9,38 @@ class QuestionAnswerAgentBase:
     _model: str = ""
     _system_prompt: str = SYSTEM_PROMPT
 
-    def __init__(self, client: HaikuRAG, model: str = ""):
+    def __init__(
+        self, client: HaikuRAG, model: str = "", llm_client: Any | None = None
+    ):
         self._model = model
         self._client = client
+        # An injected LLM client is owned by the caller and is never closed here.
+        self._llm_client = llm_client
+        self._owns_llm_client = llm_client is None
+
+    @property
+    def llm_client(self) -> Any:
+        """The LLM provider client, created on first use and reused afterwards."""
+        if self._llm_client is None:
+            self._llm_client = self._create_llm_client()
+        return self._llm_client
+
+    def _create_llm_client(self) -> Any:
+        raise NotImplementedError(
+            "QABase is an abstract class. Please implement the _create_llm_client method in a subclass."
+        )
 
     async def answer(self, question: str) -> str:
         raise NotImplementedError(
             "QABase is an abstract class. Please implement the answer method in a subclass."
         )
 
+    async def close(self) -> None:
+        """Close the LLM provider client if it was created by the agent."""
+        if self._llm_client is not None and self._owns_llm_client:
+            await close_client(self._llm_client)
+            self._llm_client = None
+
     tools = [
         {
             "type": "function",
@@ -2,17 +2,26 @@ from ollama import AsyncClient
 
 from haiku.rag.client import HaikuRAG
 from haiku.rag.config import Config
+from haiku.rag.http_client import get_http_client_kwargs
 from haiku.rag.qa.base import QuestionAnswerAgentBase
 
 OLLAMA_OPTIONS = {"temperature": 0.0, "seed": 42, "num_ctx": 64000}
 
 
 class QuestionAnswerOllamaAgent(QuestionAnswerAgentBase):
-    def __init__(self, client: HaikuRAG, model: str = Config.QA_MODEL):
-        super().__init__(client, model or self._model)
+    def __init__(
+        self,
+        client: HaikuRAG,
+        model: str = Config.QA_MODEL,
+        llm_client: AsyncClient | None = None,
+    ):
+        super().__init__(client, model or self._model, llm_client)
+
+    def _create_llm_client(self) -> AsyncClient:
+        return AsyncClient(host=Config.OLLAMA_BASE_URL, **get_http_client_kwargs())
 
     async def answer(self, question: str) -> str:
-        ollama_client = AsyncClient(host=Config.OLLAMA_BASE_URL)
+        ollama_client = self.llm_client
 
         messages = [
             {"role": "system", "content": self._system_prompt},
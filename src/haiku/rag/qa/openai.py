@@ -1,7 +1,7 @@
 from collections.abc import Sequence
 
 try:
-    from openai import AsyncOpenAI
+    from openai import AsyncOpenAI, DefaultAsyncHttpxClient
     from openai.types.chat import (
         ChatCompletionAssistantMessageParam,
         ChatCompletionMessageParam,
@@ -12,17 +12,28 @@ try:
     from openai.types.chat.chat_completion_tool_param import ChatCompletionToolParam
 
     from haiku.rag.client import HaikuRAG
+    from haiku.rag.http_client import get_http_client_kwargs
     from haiku.rag.qa.base import QuestionAnswerAgentBase
 
     class QuestionAnswerOpenAIAgent(QuestionAnswerAgentBase):
-        def __init__(self, client: HaikuRAG, model: str = "gpt-4o-mini"):
-            super().__init__(client, model or self._model)
+        def __init__(
+            self,
+            client: HaikuRAG,
+            model: str = "gpt-4o-mini",
+            llm_client: AsyncOpenAI | None = None,
+        ):
+            super().__init__(client, model or self._model, llm_client)
             self.tools: Sequence[ChatCompletionToolParam] = [
                 ChatCompletionToolParam(tool) for tool in self.tools
             ]
 
+        def _create_llm_client(self) -> AsyncOpenAI:
+            return AsyncOpenAI(
+                http_client=DefaultAsyncHttpxClient(**get_http_client_kwargs())
+            )
+
         async def answer(self, question: str) -> str:
-            openai_client = AsyncOpenAI()
+            openai_client = self.llm_client
 
             messages: list[ChatCompletionMessageParam] = [
                 ChatCompletionSystemMessageParam(
@@ -1,8 +1,26 @@
+import asyncio
+import atexit
+import multiprocessing
+import os
+import tempfile
+import threading
+import weakref
+import zlib
+from concurrent.futures import Future, ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from importlib.metadata import version
 from pathlib import Path
 from typing import ClassVar
 
 from markitdown import MarkItDown
 
+from haiku.rag.config import Config
+
+try:
+    import resource
+except ImportError:  # pragma: no cover - not available on Windows
+    resource = None
+
 
 class FileReader:
     extensions: ClassVar[list[str]] = [
@@ -50,3 +68,260 @@ class FileReader:
             return reader.convert(path).text_content
         except Exception:
             raise ValueError(f"Failed to parse file: {path}")
+
+
+class ParseCache:
+    """On-disk cache of converted markdown, keyed by the MD5 of the source bytes.
+
+    Entries are zlib compressed and stored under a directory named after the
+    reader version, so upgrading the converter invalidates them. When the
+    cache grows beyond `max_size` bytes, the least recently used entries are
+    evicted.
+    """
+
+    version: ClassVar[str] = f"markitdown-{version('markitdown')}"
+
+    def __init__(
+        self,
+        directory: Path | None = None,
+        max_size: int = Config.PARSE_CACHE_MAX_SIZE,
+    ):
+        if directory is None:
+            directory = (
+                Config.PARSE_CACHE_DIR or Config.DEFAULT_DATA_DIR / "parse_cache"
+            )
+        self.directory = directory
+        self.max_size = max_size
+        # Total size of the entries, computed on the first write
+        self._size: int | None = None
+        self._lock = threading.Lock()
+
+    def _path(self, content_hash: str, suffix: str) -> Path:
+        return (
+            self.directory
+            / self.version
+            / content_hash[:2]
+            / f"{content_hash}{suffix.lower()}.zz"
+        )
+
+    def get(self, content_hash: str, suffix: str) -> str | None:
+        """Return the cached markdown of a source, or None."""
+        path = self._path(content_hash, suffix)
+        try:
+            content = zlib.decompress(path.read_bytes()).decode()
+            # The modification time orders entries for eviction
+            os.utime(path)
+        except (OSError, zlib.error, UnicodeDecodeError):
+            return None
+        return content
+
+    def put(self, content_hash: str, suffix: str, content: str) -> None:
+        """Store the markdown of a source, evicting old entries if needed."""
+        path = self._path(content_hash, suffix)
+        data = zlib.compress(content.encode())
+        if self.max_size > 0 and len(data) > self.max_size:
+            return
+        try:
+            path.parent.mkdir(parents=True, exist_ok=True)
+            previous = path.stat().st_size if path.exists() else 0
+            # Write to a temporary file first so readers never see partial entries
+            fd, temp_name = tempfile.mkstemp(dir=path.parent, suffix=".tmp")
+            with os.fdopen(fd, "wb") as temp_file:
+                temp_file.write(data)
+            os.replace(temp_name, path)
+        except OSError:
+            return
+
+        with self._lock:
+            if self._size is None:
+                self._size = sum(size for _, size, _ in self._entries())
+            else:
+                self._size += len(data) - previous
+            if self.max_size > 0 and self._size > self.max_size:
+                self._evict()
+
+    def _entries(self) -> list[tuple[float, int, Path]]:
+        entries = []
+        for path in self.directory.glob("*/*/*.zz"):
+            try:
+                stat = path.stat()
+            except OSError:
+                continue
+            entries.append((stat.st_mtime, stat.st_size, path))
+        return entries
+
+    def _evict(self) -> None:
+        entries = sorted(self._entries())
+        size = sum(size for _, size, _ in entries)
+        # Evict down to 90% of the limit so that eviction does not run on
+        # every write once the cache is full
+        target = self.max_size * 0.9
+        for _, entry_size, path in entries:
+            if size <= target:
+                break
+            path.unlink(missing_ok=True)
+            size -= entry_size
+        self._size = size
+
+    def clear(self) -> None:
+        """Remove all entries."""
+        with self._lock:
+            for _, _, path in self._entries():
+                path.unlink(missing_ok=True)
+            self._size = 0
+
+
+# MarkItDown instance kept warm in each parser process
+_worker_reader: MarkItDown | None = None
+
+
+def _init_worker(max_memory: int) -> None:
+    global _worker_reader
+    if max_memory > 0 and resource is not None:
+        resource.setrlimit(resource.RLIMIT_AS, (max_memory, max_memory))
+    _worker_reader = MarkItDown()
+
+
+def _parse_in_worker(path: Path) -> str:
+    assert _worker_reader is not None
+    try:
+        return _worker_reader.convert(path).text_content
+    except MemoryError:
+        raise ValueError(f"Out of memory parsing file: {path}")
+    except Exception:
+        raise ValueError(f"Failed to parse file: {path}")
+
+
+class ParserPool:
+    """Parse files in a pool of worker processes with warm MarkItDown instances.
+
+    Conversion is CPU heavy, so it runs outside the event loop and on every
+    core. At most `workers` files are submitted at once, so that files do not
+    queue in the pool. Files larger than `max_file_size` bytes are rejected, a
+    parse taking longer than `timeout` seconds kills the pool, and each worker
+    process is limited to `max_memory` bytes of address space. Workers are
+    replaced after `max_tasks_per_worker` files on average, to bound the memory
+    leaked by converters. With `workers=0`, files are parsed in a thread
+    instead.
+
+    When a `cache` is given, files whose content hash is passed to
+    `parse_file` are only converted once.
+
+    Processes are started on first use.
+    """
+
+    def __init__(
+        self,
+        workers: int = Config.PARSER_WORKERS,
+        timeout: float = Config.PARSER_TIMEOUT,
+        max_file_size: int = Config.PARSER_MAX_FILE_SIZE,
+        max_memory: int = Config.PARSER_MAX_MEMORY,
+        max_tasks_per_worker: int = Config.PARSER_MAX_TASKS_PER_WORKER,
+        cache: ParseCache | None = None,
+    ):
+        self.workers = workers
+        self.timeout = timeout
+        self.max_file_size = max_file_size
+        self.max_memory = max_memory
+        self.max_tasks_per_worker = max_tasks_per_worker
+        self.cache = cache
+        self._executor: ProcessPoolExecutor | None = None
+        self._tasks = 0
+        self._lock = threading.Lock()
+        # Semaphores are bound to the event loop they are used on, and the
+        # module-level pool may be shared by several loops
+        self._slots: weakref.WeakKeyDictionary[
+            asyncio.AbstractEventLoop, asyncio.Semaphore
+        ] = weakref.WeakKeyDictionary()
+
+    async def parse_file(self, path: Path, content_hash: str | None = None) -> str:
+        """Convert a file to markdown.
+
+        `content_hash` is the MD5 of the file's bytes, used as the cache key.
+        """
+        if self.max_file_size > 0 and path.stat().st_size > self.max_file_size:
+            raise ValueError(f"File is larger than {self.max_file_size} bytes: {path}")
+        if self.cache is None or content_hash is None:
+            return await self._parse(path)
+
+        content = await asyncio.to_thread(self.cache.get, content_hash, path.suffix)
+        if content is None:
+            content = await self._parse(path)
+            await asyncio.to_thread(self.cache.put, content_hash, path.suffix, content)
+        return content
+
+    async def _parse(self, path: Path) -> str:
+        if self.workers <= 0:
+            return await asyncio.to_thread(FileReader.parse_file, path)
+
+        # The timeout only covers the parse itself, not the time spent waiting
+        # for a free worker
+        async with self._get_slots():
+            # A crashed worker breaks every task of its pool, including those
+            # of files that were not at fault, so those are retried once
+            for attempt in range(2):
+                executor, future = self._submit(path)
+                try:
+                    return await asyncio.wait_for(
+                        asyncio.wrap_future(future), self.timeout or None
+                    )
+                except asyncio.TimeoutError:
+                    self._discard(executor, kill=True)
+                    raise ValueError(f"Timed out parsing file: {path}")
+                except BrokenProcessPool:
+                    self._discard(executor, kill=True)
+                    if attempt:
+                        raise ValueError(f"Parser process crashed on file: {path}")
+        raise AssertionError("unreachable")
+
+    def _get_slots(self) -> asyncio.Semaphore:
+        loop = asyncio.get_running_loop()
+        slots = self._slots.get(loop)
+        if slots is None:
+            slots = self._slots[loop] = asyncio.Semaphore(self.workers)
+        return slots
+
+    def _submit(self, path: Path) -> tuple[ProcessPoolExecutor, Future[str]]:
+        with self._lock:
+            if (
+                self._executor is not None
+                and self.max_tasks_per_worker > 0
+                and self._tasks >= self.max_tasks_per_worker * self.workers
+            ):
+                # Recycle the workers; running parses finish in the old pool
+                self._executor.shutdown(wait=False)
+                self._executor = None
+            if self._executor is None:
+                self._executor = ProcessPoolExecutor(
+                    max_workers=self.workers,
+                    # Forking a process that runs the store threads is unsafe
+                    mp_context=multiprocessing.get_context("spawn"),
+                    initializer=_init_worker,
+                    initargs=(self.max_memory,),
+                )
+                self._tasks = 0
+            self._tasks += 1
+            return self._executor, self._executor.submit(_parse_in_worker, path)
+
+    def _discard(self, executor: ProcessPoolExecutor, kill: bool = False) -> None:
+        with self._lock:
+            if self._executor is executor:
+                self._executor = None
+        if kill:
+            # A worker stuck in a conversion cannot be interrupted otherwise.
+            # `_processes` is a CPython implementation detail of
+            # ProcessPoolExecutor, hence the getattr.
+            for process in list(getattr(executor, "_processes", {}).values()):
+                process.terminate()
+        executor.shutdown(wait=False, cancel_futures=True)
+
+    def close(self) -> None:
+        """Stop the worker processes."""
+        with self._lock:
+            executor, self._executor = self._executor, None
+        if executor is not None:
+            executor.shutdown(wait=True, cancel_futures=True)
+
+
+parser_pool = ParserPool(cache=ParseCache() if Config.PARSE_CACHE else None)
+atexit.register(parser_pool.close)
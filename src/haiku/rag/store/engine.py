@@ -1,24 +1,179 @@
+import asyncio
+import queue
 import sqlite3
 import struct
+import threading
+from collections.abc import Callable, Sequence
+from concurrent.futures import ThreadPoolExecutor
 from pathlib import Path
-from typing import Literal
+from typing import Any, Literal, TypeVar
 
 import sqlite_vec
+from pydantic import BaseModel
 
+from haiku.rag.config import Config
 from haiku.rag.embeddings import get_embedder
+from haiku.rag.store.filters import get_metadata_index_sql
+from haiku.rag.store.quantization import (
+    get_embedding_column,
+    get_stored_embedding_column,
+)
+from haiku.rag.store.vector_index import VectorIndex, get_vector_index
+
+T = TypeVar("T")
+
+
+class ConnectionProfile(BaseModel):
+    """SQLite settings applied to every connection opened by a Store."""
+
+    journal_mode: Literal["WAL", "DELETE", "TRUNCATE", "PERSIST", "MEMORY"] = "WAL"
+    synchronous: Literal["OFF", "NORMAL", "FULL", "EXTRA"] = "NORMAL"
+    # Negative values are in KiB, positive ones in pages
+    cache_size: int = -64_000
+    mmap_size: int = 256 * 1024 * 1024
+    temp_store: Literal["DEFAULT", "FILE", "MEMORY"] = "MEMORY"
+    # Milliseconds to wait on a locked database before failing
+    busy_timeout: int = 5_000
+    read_only: bool = False
+
+
+CONNECTION_PROFILES: dict[str, ConnectionProfile] = {
+    # WAL lets readers proceed while a writer is active, and NORMAL
+    # synchronous is durable against application crashes in WAL mode
+    "default": ConnectionProfile(),
+    # For processes that only search an existing database, e.g. while another
+    # process ingests into it
+    "read_only": ConnectionProfile(read_only=True),
+}
+
+
+def get_connection_profile(profile: ConnectionProfile | str) -> ConnectionProfile:
+    """Resolve a connection profile by name."""
+    if isinstance(profile, ConnectionProfile):
+        return profile
+    try:
+        return CONNECTION_PROFILES[profile]
+    except KeyError:
+        raise ValueError(f"Unsupported connection profile: {profile}") from None
 
 
 class Store:
-    def __init__(self, db_path: Path | Literal[":memory:"]):
+    def __init__(
+        self,
+        db_path: Path | Literal[":memory:"],
+        profile: ConnectionProfile | str = Config.DB_CONNECTION_PROFILE,
+        readers: int = Config.DB_READER_CONNECTIONS,
+        vector_engine: str = Config.VECTOR_ENGINE,
+        quantization: str = Config.EMBEDDINGS_QUANTIZATION,
+        prefix_dim: int = Config.EMBEDDINGS_PREFIX_DIM,
+    ):
         self.db_path: Path | Literal[":memory:"] = db_path
+        self.profile = get_connection_profile(profile)
+        if not 0 <= prefix_dim < Config.EMBEDDINGS_VECTOR_DIM:
+            raise ValueError(
+                "The embeddings prefix must be shorter than the embeddings"
+            )
+        get_embedding_column(quantization, prefix_dim or Config.EMBEDDINGS_VECTOR_DIM)
+        # The storage new databases are created with. Existing ones keep
+        # theirs until `migrate_embeddings`, see `self.quantization` and
+        # `self.prefix_dim`.
+        self.target_quantization = quantization
+        self.target_prefix_dim = prefix_dim
+        self.quantization = quantization
+        self.prefix_dim = prefix_dim
+        # Vector searches use sqlite-vec unless an in-process index is
+        # configured, which is kept in sync by the chunk writes. Indexes that
+        # are expensive to build are saved next to the database file, and
+        # only loaded from there by read-only stores.
+        index_path = None
+        if db_path != ":memory:":
+            index_path = Path(f"{db_path}.{vector_engine}")
+        self.vector_index: VectorIndex | None = get_vector_index(
+            vector_engine,
+            Config.EMBEDDINGS_VECTOR_DIM,
+            index_path,
+            read_only=self.profile.read_only,
+        )
+        # Bumped whenever a transaction changing documents or chunks ends, so
+        # that results computed for an older generation can be discarded
+        self.generation = 0
+        self._changed = False
+        # All database work runs off the event loop. Writes go through a single
+        # connection on a dedicated thread, which serializes them.
+        self._executor = ThreadPoolExecutor(
+            max_workers=1, thread_name_prefix="haiku.rag.store"
+        )
         self._connection = self.create_db()
+        if self.vector_index is not None:
+            self.vector_index.load(self._connection, self.float_embeddings_table)
 
-    def create_db(self) -> sqlite3.Connection:
-        """Create the database and tables with sqlite-vec support for embeddings."""
-        db = sqlite3.connect(self.db_path)
+        # Reads check out one of several connections so that they run
+        # concurrently with each other and, under WAL, with the writer. An
+        # in-memory database is private to its connection, so it is only read
+        # through the writer.
+        self._readers: queue.SimpleQueue[sqlite3.Connection] = queue.SimpleQueue()
+        self._reader_connections: list[sqlite3.Connection] = []
+        self._reader_executor: ThreadPoolExecutor | None = None
+        if db_path != ":memory:" and readers > 0:
+            self._reader_executor = ThreadPoolExecutor(
+                max_workers=readers, thread_name_prefix="haiku.rag.store.reader"
+            )
+            for _ in range(readers):
+                reader = self.connect(reader=True)
+                self._reader_connections.append(reader)
+                self._readers.put(reader)
+
+        # The data version of a connection changes whenever another connection,
+        # including those of other processes, commits to the database, so a
+        # connection of its own tells when anything else wrote
+        self._version_connection: sqlite3.Connection | None = None
+        self._version_lock = threading.Lock()
+        if db_path != ":memory:":
+            self._version_connection = self.connect(reader=True)
+
+    def connect(self, reader: bool = False) -> sqlite3.Connection:
+        """Open a connection with sqlite-vec loaded and the profile applied.
+
+        Reader connections are not allowed to modify the database.
+        """
+        if self.profile.read_only:
+            if self.db_path == ":memory:":
+                raise ValueError("A read-only store requires a database file")
+            db = sqlite3.connect(
+                f"{Path(self.db_path).absolute().as_uri()}?mode=ro",
+                uri=True,
+                check_same_thread=False,
+            )
+        else:
+            db = sqlite3.connect(self.db_path, check_same_thread=False)
         db.enable_load_extension(True)
         sqlite_vec.load(db)
 
+        profile = self.profile
+        db.execute(f"PRAGMA busy_timeout = {profile.busy_timeout}")
+        if profile.read_only or reader:
+            db.execute("PRAGMA query_only = ON")
+        else:
+            # The journal mode is stored in the database file, so only
+            # connections that may write can change it
+            db.execute(f"PRAGMA journal_mode = {profile.journal_mode}")
+        db.execute(f"PRAGMA synchronous = {profile.synchronous}")
+        db.execute(f"PRAGMA cache_size = {profile.cache_size}")
+        db.execute(f"PRAGMA mmap_size = {profile.mmap_size}")
+        db.execute(f"PRAGMA temp_store = {profile.temp_store}")
+        return db
+
+    def create_db(self) -> sqlite3.Connection:
+        """Create the database and tables with sqlite-vec support for embeddings."""
+        db = self.connect()
+        self.quantization = self.target_quantization
+        self.prefix_dim = self.target_prefix_dim
+        if stored := get_stored_embedding_column(db):
+            self.quantization, dim = stored
+            self.prefix_dim = dim if dim < Config.EMBEDDINGS_VECTOR_DIM else 0
+        if self.profile.read_only:
+            return db
+
         # Create documents table
         db.execute("""
             CREATE TABLE IF NOT EXISTS documents (
@@ -42,14 +197,7 @@ class Store:
             )
         """)
 
-        # Create vector table for chunk embeddings
-        embedder = get_embedder()
-        db.execute(f"""
-            CREATE VIRTUAL TABLE IF NOT EXISTS chunk_embeddings USING vec0(
-                chunk_id INTEGER PRIMARY KEY,
-                embedding FLOAT[{embedder._vector_dim}]
-            )
-        """)
+        self._create_embedding_tables(db)
 
         # Create FTS5 table for full-text search
         db.execute("""
@@ -60,21 +208,230 @@ class Store:
             )
         """)
 
+        # Create content-addressed cache of embeddings
+        db.execute("""
+            CREATE TABLE IF NOT EXISTS embedding_cache (
+                model TEXT NOT NULL,
+                dim INTEGER NOT NULL,
+                text_hash TEXT NOT NULL,
+                embedding BLOB NOT NULL,
+                last_used_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+                UNIQUE (model, dim, text_hash)
+            )
+        """)
+
+        # Create manifest of monitored files, see FileManifestRepository
+        db.execute("""
+            CREATE TABLE IF NOT EXISTS file_manifest (
+                uri TEXT PRIMARY KEY,
+                size INTEGER NOT NULL,
+                mtime_ns INTEGER NOT NULL,
+                md5 TEXT NOT NULL
+            )
+        """)
+
         # Create indexes for better performance
+        db.execute("CREATE INDEX IF NOT EXISTS idx_documents_uri ON documents(uri)")
+        db.execute(
+            "CREATE INDEX IF NOT EXISTS idx_documents_created_at ON documents(created_at)"
+        )
+        for key in Config.DB_INDEXED_METADATA:
+            db.execute(get_metadata_index_sql(key))
+        db.execute(
+            "CREATE INDEX IF NOT EXISTS idx_file_manifest_size ON file_manifest(size)"
+        )
         db.execute(
             "CREATE INDEX IF NOT EXISTS idx_chunks_document_id ON chunks(document_id)"
         )
+        db.execute(
+            "CREATE INDEX IF NOT EXISTS idx_embedding_cache_last_used_at ON embedding_cache(last_used_at)"
+        )
 
         db.commit()
         return db
 
+    @property
+    def rescored(self) -> bool:
+        """Whether sqlite-vec searches quantized or truncated embeddings, whose
+        candidates are scored again with the full float32 embeddings."""
+        return self.quantization != "float" or self.prefix_dim > 0
+
+    @property
+    def float_embeddings_table(self) -> str:
+        """The table holding the full float32 embeddings of the chunks."""
+        return "chunk_vectors" if self.rescored else "chunk_embeddings"
+
+    def _create_embedding_tables(self, db: sqlite3.Connection) -> None:
+        # Create vector table for chunk embeddings
+        embedder = get_embedder()
+        column = get_embedding_column(
+            self.quantization, self.prefix_dim or embedder._vector_dim
+        )
+        db.execute(f"""
+            CREATE VIRTUAL TABLE IF NOT EXISTS chunk_embeddings USING vec0(
+                chunk_id INTEGER PRIMARY KEY,
+                embedding {column}
+            )
+        """)
+
+        # Quantized or truncated embeddings are searched first, and the
+        # candidates are scored again with their full float32 embedding
+        if self.rescored:
+            db.execute("""
+                CREATE TABLE IF NOT EXISTS chunk_vectors (
+                    chunk_id INTEGER PRIMARY KEY,
+                    embedding BLOB NOT NULL
+                )
+            """)
+
+    def migrate_embeddings(self, connection: sqlite3.Connection) -> bool:
+        """Recreate the embedding tables with the target quantization and prefix.
+
+        The stored embeddings are dropped, so the chunks must be embedded
+        again, as `HaikuRAG.rebuild_database` does. Returns False if the
+        database already uses the target storage.
+        """
+        if (self.quantization, self.prefix_dim) == (
+            self.target_quantization,
+            self.target_prefix_dim,
+        ):
+            return False
+        self.mark_changed()
+        connection.execute("DROP TABLE IF EXISTS chunk_embeddings")
+        connection.execute("DROP TABLE IF EXISTS chunk_vectors")
+        self.quantization = self.target_quantization
+        self.prefix_dim = self.target_prefix_dim
+        self._create_embedding_tables(connection)
+        connection.commit()
+        if self.vector_index is not None:
+            self.vector_index.clear()
+        return True
+
+    async def write(self, fn: Callable[..., T], *args: Any) -> T:
+        """Run blocking database work on the writer thread and await its result.
+
+        `fn` is called with the writer connection followed by `args`.
+        """
+        if self._connection is None:
+            raise ValueError("Store connection is not available")
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self._executor, self._write, fn, *args)
+
+    def _write(self, fn: Callable[..., T], *args: Any) -> T:
+        connection = self._connection
+        assert connection is not None
+        try:
+            result = fn(connection, *args)
+        except BaseException:
+            if not connection.in_transaction:
+                # Index changes of a rolled back transaction are dropped
+                if self.vector_index is not None:
+                    self.vector_index.rollback()
+                self._end_generation()
+            raise
+        if not connection.in_transaction:
+            if self.vector_index is not None:
+                self.vector_index.commit()
+            self._end_generation()
+        return result
+
+    def mark_changed(self) -> None:
+        """Record that the current write changes documents or chunks.
+
+        Called on the writer thread. The generation is bumped once the
+        transaction ends.
+        """
+        self._changed = True
+
+    def _end_generation(self) -> None:
+        if self._changed:
+            self._changed = False
+            self.generation += 1
+
+    async def version(self) -> int:
+        """A number that increases whenever the database may have changed.
+
+        Writes of this store bump its generation, and commits of other
+        connections, e.g. of other processes, bump SQLite's data version.
+        Both only increase, so their sum changes whenever either does.
+        """
+        generation = self.generation
+        if self._version_connection is None:
+            return generation
+        # Reading the data version waits for locks outside WAL mode
+        return generation + await asyncio.to_thread(self._data_version)
+
+    def _data_version(self) -> int:
+        assert self._version_connection is not None
+        with self._version_lock:
+            (data_version,) = self._version_connection.execute(
+                "PRAGMA data_version"
+            ).fetchone()
+        return data_version
+
+    async def read(self, fn: Callable[..., T], *args: Any) -> T:
+        """Run read-only database work on a reader connection and await its result.
+
+        `fn` is called with a reader connection followed by `args`. It only sees
+        committed data.
+        """
+        if self._connection is None:
+            raise ValueError("Store connection is not available")
+        if self._reader_executor is None:
+            return await self.write(fn, *args)
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(
+            self._reader_executor, self._with_reader, fn, *args
+        )
+
+    def _with_reader(self, fn: Callable[..., T], *args: Any) -> T:
+        reader = self._readers.get()
+        try:
+            return fn(reader, *args)
+        finally:
+            # Do not hold a read snapshot across checkouts
+            if reader.in_transaction:
+                reader.rollback()
+            self._readers.put(reader)
+
+    async def commit(self) -> None:
+        """Commit the current transaction."""
+        await self.write(lambda connection: connection.commit())
+
     @staticmethod
     def serialize_embedding(embedding: list[float]) -> bytes:
         """Serialize a list of floats to bytes for sqlite-vec storage."""
         return struct.pack(f"{len(embedding)}f", *embedding)
 
+    @staticmethod
+    def serialize_embeddings(embeddings: Sequence[list[float]]) -> list[bytes]:
+        """Serialize embeddings of the same dimension with a single compiled packer."""
+        if not embeddings:
+            return []
+        dim = len(embeddings[0])
+        if any(len(embedding) != dim for embedding in embeddings):
+            raise ValueError("Embeddings must all have the same dimension")
+        packer = struct.Struct(f"{dim}f")
+        return [packer.pack(*embedding) for embedding in embeddings]
+
+    @staticmethod
+    def deserialize_embedding(blob: bytes) -> list[float]:
+        """Deserialize bytes from sqlite-vec storage to a list of floats."""
+        return list(struct.unpack(f"{len(blob) // 4}f", blob))
+
     def close(self):
-        """Close the database connection if it's an in-memory database."""
+        """Wait for pending database work and close the connection."""
+        self._executor.shutdown(wait=True)
+        if self.vector_index is not None and self._connection is not None:
+            self.vector_index.save()
+        if self._reader_executor is not None:
+            self._reader_executor.shutdown(wait=True)
+        for reader in self._reader_connections:
+            reader.close()
+        self._reader_connections = []
+        if self._version_connection is not None:
+            self._version_connection.close()
+            self._version_connection = None
         if self._connection is not None:
             self._connection.close()
             self._connection = None
@@ -0,0 +1,157 @@
+import json
+import re
+from collections.abc import Mapping, Sequence
+from datetime import date, datetime
+from typing import Any, Literal
+
+from pydantic import BaseModel, field_validator
+
+FILTER_OPERATORS = ("eq", "in", "prefix", "gt", "gte", "lt", "lte")
+# Metadata keys are part of the SQL expressions, so that they match the
+# expression indexes of DB_INDEXED_METADATA
+METADATA_KEY = re.compile(r"[A-Za-z_][A-Za-z0-9_]*(\.[A-Za-z_][A-Za-z0-9_]*)*")
+
+RANGE_OPERATORS = {"gt": ">", "gte": ">=", "lt": "<", "lte": "<="}
+
+
+class Filter(BaseModel):
+    """A condition on the document of searched chunks.
+
+    `field` is "uri", "created_at" or "metadata.<key>", where nested keys are
+    separated by dots. `value` is a list for "in", a string for "prefix", and
+    a datetime, date or ISO 8601 string for "created_at".
+    """
+
+    field: str
+    op: Literal["eq", "in", "prefix", "gt", "gte", "lt", "lte"] = "eq"
+    value: Any
+
+    @field_validator("field")
+    @classmethod
+    def validate_field(cls, v: str) -> str:
+        if v in ("uri", "created_at"):
+            return v
+        if v.startswith("metadata.") and METADATA_KEY.fullmatch(
+            v.removeprefix("metadata.")
+        ):
+            return v
+        raise ValueError(f"Unsupported filter field: {v}")
+
+
+SearchFilters = Mapping[str, Any] | Sequence[Filter]
+
+
+def parse_filters(filters: SearchFilters | None) -> list[Filter]:
+    """Return the conditions of search filters, which must all hold.
+
+    Filters are either `Filter`s or a mapping of fields to a value, a list of
+    values, or a mapping of operators to values, e.g.
+    `{"uri": {"prefix": "file:///docs/"}, "metadata.topic": ["a", "b"],
+    "created_at": {"gte": "2024-01-01"}}`.
+    """
+    if not filters:
+        return []
+    if not isinstance(filters, Mapping):
+        return list(filters)
+    conditions = []
+    for field, value in filters.items():
+        if isinstance(value, Mapping):
+            for op, operand in value.items():
+                if op not in FILTER_OPERATORS:
+                    raise ValueError(f"Unsupported filter operator: {op}")
+                conditions.append(Filter(field=field, op=op, value=operand))
+        elif isinstance(value, list | tuple):
+            conditions.append(Filter(field=field, op="in", value=list(value)))
+        else:
+            conditions.append(Filter(field=field, value=value))
+    return conditions
+
+
+def filter_key(filters: Sequence[Filter]) -> str:
+    """A canonical representation of filters, e.g. to key cached results."""
+    # Values of different types are not comparable, their JSON is
+    return json.dumps(
+        sorted(
+            json.dumps([f.field, f.op, _operand(f.field, f.value)], default=str)
+            for f in filters
+        )
+    )
+
+
+def get_filtered_chunks_sql(filters: Sequence[Filter]) -> tuple[str, dict[str, Any]]:
+    """Return a query of the ids of the chunks whose document matches all the
+    filters, and its named parameters.
+
+    The query is used as `chunk_id IN (...)` constraint of the vector and
+    full-text searches, so that they only consider eligible chunks. URI and
+    creation date conditions, and metadata conditions on keys listed in
+    DB_INDEXED_METADATA, use indexes.
+    """
+    conditions = []
+    parameters: dict[str, Any] = {}
+    for i, f in enumerate(filters):
+        column = _column(f.field)
+        name = f"filter_{i}"
+        value = _operand(f.field, f.value)
+        if f.op == "eq":
+            conditions.append(f"{column} = :{name}")
+            parameters[name] = value
+        elif f.op == "in":
+            if not isinstance(value, list):
+                raise ValueError("The 'in' filter operator needs a list of values")
+            conditions.append(f"{column} IN (SELECT value FROM json_each(:{name}))")
+            parameters[name] = json.dumps(value)
+        elif f.op == "prefix":
+            if not isinstance(value, str):
+                raise ValueError("The 'prefix' filter operator needs a string")
+            # A range on the prefix can use an index, unlike LIKE or GLOB
+            conditions.append(f"{column} >= :{name}")
+            parameters[name] = value
+            if value:
+                conditions.append(f"{column} < :{name}_end")
+                parameters[f"{name}_end"] = value[:-1] + chr(ord(value[-1]) + 1)
+        else:
+            conditions.append(f"{column} {RANGE_OPERATORS[f.op]} :{name}")
+            parameters[name] = value
+    sql = """
+        SELECT c.id FROM chunks c
+        JOIN documents d ON d.id = c.document_id
+    """
+    if conditions:
+        sql += " WHERE " + " AND ".join(conditions)
+    return sql, parameters
+
+
+def get_metadata_index_sql(key: str) -> str:
+    """Return the statement creating an index on a document metadata key."""
+    if not METADATA_KEY.fullmatch(key):
+        raise ValueError(f"Unsupported metadata key: {key}")
+    return (
+        f"CREATE INDEX IF NOT EXISTS idx_documents_metadata_{key.replace('.', '_')} "
+        f"ON documents(json_extract(metadata, '$.{key}'))"
+    )
+
+
+def _column(field: str) -> str:
+    if field in ("uri", "created_at"):
+        return f"d.{field}"
+    return f"json_extract(d.metadata, '$.{field.removeprefix('metadata.')}')"
+
+
+def _operand(field: str, value: Any) -> Any:
+    """Convert filter values to the representation stored in the database."""
+    if field == "created_at":
+        if isinstance(value, list):
+            return [_operand(field, v) for v in value]
+        if isinstance(value, str):
+            value = datetime.fromisoformat(value)
+        if isinstance(value, datetime):
+            # Documents store their local creation time as in str(datetime)
+            if value.tzinfo is not None:
+                value = value.astimezone().replace(tzinfo=None)
+            return str(value)
+        if isinstance(value, date):
+            return str(datetime.combine(value, datetime.min.time()))
+    if isinstance(value, tuple):
+        return list(value)
+    return value
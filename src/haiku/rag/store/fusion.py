@@ -0,0 +1,55 @@
+import statistics
+from collections.abc import Sequence
+
+FUSIONS = ("rrf", "minmax", "zscore")
+
+
+def fuse(
+    rankings: Sequence[Sequence[tuple[int, float]]],
+    limit: int,
+    fusion: str = "rrf",
+    k: int = 60,
+    weights: Sequence[float] | None = None,
+) -> list[tuple[int, float]]:
+    """Fuse rankings of (id, score) pairs, best first, into the top `limit` ids.
+
+    Scores must increase with relevance. "rrf" sums the reciprocal ranks
+    1 / (k + rank) of each id and ignores the scores. "minmax" and "zscore"
+    sum the weighted scores of each ranking normalized to [0, 1] or to their
+    standard score. An id missing from a ranking gets the lowest normalized
+    score of that ranking, as it ranked below all the ids retrieved.
+    """
+    if fusion not in FUSIONS:
+        raise ValueError(f"Unsupported fusion: {fusion}")
+    weights = weights or [1.0] * len(rankings)
+    if len(weights) != len(rankings):
+        raise ValueError("Fusion needs one weight per ranking")
+
+    # Ids in the order they were first retrieved, which breaks ties
+    fused = dict.fromkeys((id for ranking in rankings for id, _ in ranking), 0.0)
+    for ranking, weight in zip(rankings, weights):
+        if not ranking:
+            continue
+        if fusion == "rrf":
+            scores = [1.0 / (k + rank) for rank in range(1, len(ranking) + 1)]
+            floor = 0.0
+        else:
+            scores = _normalize([score for _, score in ranking], fusion)
+            floor = min(scores)
+        normalized = {id: score for (id, _), score in zip(ranking, scores)}
+        for id in fused:
+            fused[id] += weight * normalized.get(id, floor)
+    return sorted(fused.items(), key=lambda item: item[1], reverse=True)[:limit]
+
+
+def _normalize(scores: list[float], fusion: str) -> list[float]:
+    if fusion == "minmax":
+        low, high = min(scores), max(scores)
+        if high == low:
+            return [1.0] * len(scores)
+        return [(score - low) / (high - low) for score in scores]
+    mean = statistics.fmean(scores)
+    deviation = statistics.pstdev(scores, mean)
+    if not deviation:
+        return [0.0] * len(scores)
+    return [(score - mean) / deviation for score in scores]
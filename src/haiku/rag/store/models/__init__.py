@@ -1,4 +1,5 @@
-from .chunk import Chunk
+from .chunk import Chunk, SearchResults
 from .document import Document
+from .file_manifest import FileManifestEntry
 
-__all__ = ["Chunk", "Document"]
\ No newline at end of file
+__all__ = ["Chunk", "Document", "FileManifestEntry", "SearchResults"]
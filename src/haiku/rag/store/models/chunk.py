@@ -1,3 +1,5 @@
+from collections.abc import Iterable
+
 from pydantic import BaseModel
 
 
@@ -12,3 +14,18 @@ class Chunk(BaseModel):
     metadata: dict = {}
     document_uri: str | None = None
     document_meta: dict = {}
+
+
+class SearchResults(list[tuple[Chunk, float]]):
+    """
+    (chunk, score) search results, best first, with the milliseconds spent in
+    each step of the search.
+    """
+
+    def __init__(
+        self,
+        results: Iterable[tuple[Chunk, float]] = (),
+        timings: dict[str, float] | None = None,
+    ):
+        super().__init__(results)
+        self.timings = timings or {}
@@ -0,0 +1,12 @@
+from pydantic import BaseModel
+
+
+class FileManifestEntry(BaseModel):
+    """
+    Stat data and content hash of a monitored file when it was last ingested.
+    """
+
+    uri: str
+    size: int
+    mtime_ns: int
+    md5: str = ""
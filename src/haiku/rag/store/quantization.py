@@ -0,0 +1,93 @@
+import re
+import sqlite3
+from collections.abc import Sequence
+
+QUANTIZATIONS = ("float", "int8", "bit")
+# sqlite-vec functions reading vectors of each quantization from a blob
+VECTOR_FUNCTIONS = {"float": "vec_f32", "int8": "vec_int8", "bit": "vec_bit"}
+
+
+def get_embedding_column(quantization: str, dim: int) -> str:
+    """Return the vec0 column definition of the embeddings of a quantization.
+
+    int8 vectors are compared by L1 distance, which sqlite-vec computes
+    several times faster than the L2 or cosine distance of int8 or float
+    vectors. Bit vectors are compared by Hamming distance.
+    """
+    if quantization == "float":
+        return f"FLOAT[{dim}]"
+    if quantization == "int8":
+        return f"INT8[{dim}] distance_metric=l1"
+    if quantization == "bit":
+        if dim % 8:
+            raise ValueError("Bit quantized embeddings need a multiple of 8 dimensions")
+        return f"BIT[{dim}]"
+    raise ValueError(f"Unsupported embeddings quantization: {quantization}")
+
+
+def get_stored_embedding_column(
+    connection: sqlite3.Connection,
+) -> tuple[str, int] | None:
+    """Return the quantization and dimension of the existing `chunk_embeddings`
+    table, if any."""
+    row = connection.execute(
+        "SELECT sql FROM sqlite_master WHERE name = 'chunk_embeddings'"
+    ).fetchone()
+    if row is None:
+        return None
+    match = re.search(r"embedding\s+(\w+)\s*\[(\d+)\]", row[0], re.IGNORECASE)
+    if match is None or match.group(1).lower() not in QUANTIZATIONS:
+        raise ValueError(f"Unsupported embeddings table: {row[0]}")
+    return match.group(1).lower(), int(match.group(2))
+
+
+def quantize(
+    serialized_embeddings: Sequence[bytes],
+    quantization: str,
+    prefix_dim: int = 0,
+) -> list[bytes]:
+    """Quantize serialized float32 embeddings of the same dimension in bulk.
+
+    With a `prefix_dim`, the embeddings are first truncated to their leading
+    dimensions, as supported by Matryoshka embedding models, and normalized
+    again. int8 quantization applies to the direction of the embeddings,
+    which are normalized first. Bit quantization keeps the sign of each
+    dimension.
+    """
+    if quantization == "float" and not prefix_dim:
+        return list(serialized_embeddings)
+    if not serialized_embeddings:
+        return []
+    try:
+        import numpy as np
+    except ImportError:
+        raise ImportError(
+            "Quantized or truncated embeddings require the 'numpy' "
+            "package. Please install haiku.rag with the 'numpy' extra:"
+            "uv pip install haiku.rag --extra numpy"
+        )
+
+    vectors = np.frombuffer(b"".join(serialized_embeddings), dtype=np.float32)
+    vectors = vectors.reshape(len(serialized_embeddings), -1)
+    if prefix_dim:
+        vectors = vectors[:, :prefix_dim]
+        norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+        norms[norms == 0] = 1
+        vectors = vectors / norms
+
+    if quantization == "float":
+        quantized = vectors.astype(np.float32)
+    elif quantization == "int8":
+        # Components of unit vectors have a standard deviation of about
+        # 1/sqrt(dim), so values up to 4 standard deviations are kept
+        norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+        norms[norms == 0] = 1
+        scale = 127 / 4 * np.sqrt(vectors.shape[1])
+        quantized = np.clip(np.rint(vectors / norms * scale), -127, 127)
+        quantized = quantized.astype(np.int8)
+    elif quantization == "bit":
+        # The first dimension is the least significant bit, as in sqlite-vec
+        quantized = np.packbits(vectors > 0, axis=1, bitorder="little")
+    else:
+        raise ValueError(f"Unsupported embeddings quantization: {quantization}")
+    return [row.tobytes() for row in quantized]
@@ -1,5 +1,13 @@
 from haiku.rag.store.repositories.base import BaseRepository
 from haiku.rag.store.repositories.chunk import ChunkRepository
 from haiku.rag.store.repositories.document import DocumentRepository
+from haiku.rag.store.repositories.embedding_cache import EmbeddingCacheRepository
+from haiku.rag.store.repositories.file_manifest import FileManifestRepository
 
-__all__ = ["BaseRepository", "DocumentRepository", "ChunkRepository"]
\ No newline at end of file
+__all__ = [
+    "BaseRepository",
+    "DocumentRepository",
+    "ChunkRepository",
+    "EmbeddingCacheRepository",
+    "FileManifestRepository",
+]
\ No newline at end of file
@@ -5,6 +5,9 @@ from haiku.rag.store.engine import Store
 
 T = TypeVar("T")
 
+# Keep well below SQLITE_MAX_VARIABLE_NUMBER on older SQLite builds
+MAX_QUERY_PARAMS = 500
+
 
 class BaseRepository(ABC, Generic[T]):
     """Base repository interface for database operations."""
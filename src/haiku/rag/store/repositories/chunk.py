@@ -1,25 +1,80 @@
+import asyncio
 import json
 import re
+import sqlite3
+import time
+from collections import Counter
+from collections.abc import Awaitable, Sequence
+from typing import TypeVar, cast
 
 from haiku.rag.chunker import chunker
+from haiku.rag.config import Config
 from haiku.rag.embeddings import get_embedder
-from haiku.rag.store.models.chunk import Chunk
-from haiku.rag.store.repositories.base import BaseRepository
+from haiku.rag.embeddings.base import EmbedderBase
+from haiku.rag.store.filters import (
+    Filter,
+    SearchFilters,
+    get_filtered_chunks_sql,
+    parse_filters,
+)
+from haiku.rag.store.fusion import fuse
+from haiku.rag.store.models.chunk import Chunk, SearchResults
+from haiku.rag.store.quantization import VECTOR_FUNCTIONS, quantize
+from haiku.rag.store.repositories.base import MAX_QUERY_PARAMS, BaseRepository
+from haiku.rag.store.repositories.embedding_cache import (
+    EmbeddingCacheRepository,
+    QueryEmbeddingCache,
+)
+
+T = TypeVar("T")
+
+
+class ChunksChangedError(Exception):
+    """A document's chunks changed after an update was prepared against them."""
 
 
 class ChunkRepository(BaseRepository[Chunk]):
-    """Repository for Chunk database operations."""
+    """Repository for Chunk database operations.
 
-    def __init__(self, store):
-        super().__init__(store)
-        self.embedder = get_embedder()
+    Embeddings are computed on the event loop, while the SQLite work runs off
+    it: writes on the writer thread through `Store.write`, and searches and
+    lookups on the reader pool through `Store.read`. The synchronous `_`
+    helpers take the connection as first argument so that other repositories
+    can compose them into a single transaction.
+    """
 
-    async def create(self, entity: Chunk, commit: bool = True) -> Chunk:
-        """Create a chunk in the database."""
-        if self.store._connection is None:
-            raise ValueError("Store connection is not available")
+    def __init__(self, store, embedder: EmbedderBase | None = None):
+        super().__init__(store)
+        self.embedder = embedder or get_embedder()
+        self.embedding_cache = EmbeddingCacheRepository(store, self.embedder)
+        self.query_cache = QueryEmbeddingCache(
+            self.embedder,
+            self.embedding_cache if Config.EMBEDDINGS_QUERY_CACHE_PERSIST else None,
+        )
 
-        cursor = self.store._connection.cursor()
+    async def create(
+        self,
+        entity: Chunk,
+        commit: bool = True,
+        embedding: list[float] | None = None,
+    ) -> Chunk:
+        """Create a chunk in the database.
+
+        If `embedding` is not given it is looked up in the embedding cache, or
+        generated from the chunk content.
+        """
+        if embedding is None:
+            [embedding] = await self.embedding_cache.embed([entity.content])
+        return await self.store.write(self._create, entity, embedding, commit)
+
+    def _create(
+        self,
+        connection: sqlite3.Connection,
+        entity: Chunk,
+        embedding: list[float],
+        commit: bool = True,
+    ) -> Chunk:
+        cursor = connection.cursor()
         cursor.execute(
             """
             INSERT INTO chunks (document_id, content, metadata)
@@ -34,15 +89,10 @@ class ChunkRepository(BaseRepository[Chunk]):
 
         entity.id = cursor.lastrowid
 
-        # Generate and store embedding
-        embedding = await self.embedder.embed(entity.content)
-        serialized_embedding = self.store.serialize_embedding(embedding)
-        cursor.execute(
-            """
-            INSERT INTO chunk_embeddings (chunk_id, embedding)
-            VALUES (:chunk_id, :embedding)
-            """,
-            {"chunk_id": entity.id, "embedding": serialized_embedding},
+        # Store embedding
+        assert entity.id is not None
+        self._insert_embeddings(
+            cursor, [entity.id], [self.store.serialize_embedding(embedding)]
         )
 
         # Insert into FTS5 table for full-text search
@@ -55,15 +105,132 @@ class ChunkRepository(BaseRepository[Chunk]):
         )
 
         if commit:
-            self.store._connection.commit()
+            connection.commit()
         return entity
 
+    async def create_many(
+        self,
+        entities: list[Chunk],
+        embeddings: list[list[float]] | None = None,
+        commit: bool = True,
+    ) -> list[Chunk]:
+        """Create several chunks at once.
+
+        If `embeddings` is not given they are looked up in the embedding cache,
+        or generated from the chunk contents.
+        """
+        if embeddings is None:
+            embeddings = await self.embedding_cache.embed(
+                [entity.content for entity in entities]
+            )
+        return await self.store.write(self._create_many, entities, embeddings, commit)
+
+    def _create_many(
+        self,
+        connection: sqlite3.Connection,
+        entities: list[Chunk],
+        embeddings: list[list[float]],
+        commit: bool = True,
+    ) -> list[Chunk]:
+        if len(entities) != len(embeddings):
+            raise ValueError("Expected one embedding per chunk")
+        if not entities:
+            return entities
+
+        serialized_embeddings = self.store.serialize_embeddings(embeddings)
+        cursor = connection.cursor()
+
+        # Inserting the first chunk takes the write lock and allocates its id.
+        # Chunk ids are AUTOINCREMENT, so while the lock is held the following
+        # ids are free and the remaining rows can be inserted with explicit ids.
+        first, *rest = entities
+        self._create(connection, first, embeddings[0], commit=False)
+        assert first.id is not None
+        for chunk_id, entity in enumerate(rest, start=first.id + 1):
+            entity.id = chunk_id
+
+        cursor.executemany(
+            """
+            INSERT INTO chunks (id, document_id, content, metadata)
+            VALUES (?, ?, ?, ?)
+            """,
+            [
+                (
+                    entity.id,
+                    entity.document_id,
+                    entity.content,
+                    json.dumps(entity.metadata),
+                )
+                for entity in rest
+            ],
+        )
+        self._insert_embeddings(
+            cursor,
+            [cast(int, entity.id) for entity in rest],
+            serialized_embeddings[1:],
+        )
+        cursor.executemany(
+            """
+            INSERT INTO chunks_fts(rowid, content)
+            VALUES (?, ?)
+            """,
+            [(entity.id, entity.content) for entity in rest],
+        )
+
+        if commit:
+            connection.commit()
+        return entities
+
+    def _insert_embeddings(
+        self, cursor: sqlite3.Cursor, chunk_ids: list[int], embeddings: list[bytes]
+    ) -> None:
+        """Store serialized float32 embeddings, quantized or truncated if the
+        store searches them so."""
+        self.store.mark_changed()
+        if not self.store.rescored:
+            cursor.executemany(
+                "INSERT INTO chunk_embeddings (chunk_id, embedding) VALUES (?, ?)",
+                zip(chunk_ids, embeddings),
+            )
+        else:
+            quantization = self.store.quantization
+            cursor.executemany(
+                f"""
+                INSERT INTO chunk_embeddings (chunk_id, embedding)
+                VALUES (?, {VECTOR_FUNCTIONS[quantization]}(?))
+                """,
+                zip(
+                    chunk_ids,
+                    quantize(embeddings, quantization, self.store.prefix_dim),
+                ),
+            )
+            cursor.executemany(
+                "INSERT INTO chunk_vectors (chunk_id, embedding) VALUES (?, ?)",
+                zip(chunk_ids, embeddings),
+            )
+        if self.store.vector_index is not None:
+            self.store.vector_index.add(chunk_ids, embeddings)
+
+    def _delete_embeddings(
+        self, cursor: sqlite3.Cursor, chunk_ids: Sequence[tuple[int]]
+    ) -> None:
+        self.store.mark_changed()
+        cursor.executemany("DELETE FROM chunk_embeddings WHERE chunk_id = ?", chunk_ids)
+        if self.store.rescored:
+            cursor.executemany(
+                "DELETE FROM chunk_vectors WHERE chunk_id = ?", chunk_ids
+            )
+        if self.store.vector_index is not None:
+            self.store.vector_index.remove([chunk_id for (chunk_id,) in chunk_ids])
+
     async def get_by_id(self, entity_id: int) -> Chunk | None:
         """Get a chunk by its ID."""
-        if self.store._connection is None:
-            raise ValueError("Store connection is not available")
+        return await self.store.read(self._get_by_id, entity_id)
 
-        cursor = self.store._connection.cursor()
+    def _get_by_id(
+        self, connection: sqlite3.Connection, entity_id: int
+    ) -> Chunk | None:
+        cursor = connection.cursor()
         cursor.execute(
             """
             SELECT id, document_id, content, metadata
@@ -85,12 +252,17 @@ class ChunkRepository(BaseRepository[Chunk]):
 
     async def update(self, entity: Chunk) -> Chunk:
         """Update an existing chunk."""
-        if self.store._connection is None:
-            raise ValueError("Store connection is not available")
         if entity.id is None:
             raise ValueError("Chunk ID is required for update")
 
-        cursor = self.store._connection.cursor()
+        # Regenerate embedding
+        [embedding] = await self.embedding_cache.embed([entity.content])
+        return await self.store.write(self._update, entity, embedding)
+
+    def _update(
+        self, connection: sqlite3.Connection, entity: Chunk, embedding: list[float]
+    ) -> Chunk:
+        cursor = connection.cursor()
         cursor.execute(
             """
             UPDATE chunks
@@ -105,16 +277,11 @@ class ChunkRepository(BaseRepository[Chunk]):
             },
         )
 
-        # Regenerate and update embedding
-        embedding = await self.embedder.embed(entity.content)
-        serialized_embedding = self.store.serialize_embedding(embedding)
-        cursor.execute(
-            """
-            UPDATE chunk_embeddings
-            SET embedding = :embedding
-            WHERE chunk_id = :chunk_id
-            """,
-            {"embedding": serialized_embedding, "chunk_id": entity.id},
+        # Replace embedding
+        assert entity.id is not None
+        self._delete_embeddings(cursor, [(entity.id,)])
+        self._insert_embeddings(
+            cursor, [entity.id], [self.store.serialize_embedding(embedding)]
         )
 
         # Update FTS5 table
@@ -127,15 +294,17 @@ class ChunkRepository(BaseRepository[Chunk]):
             {"content": entity.content, "rowid": entity.id},
         )
 
-        self.store._connection.commit()
+        connection.commit()
         return entity
 
     async def delete(self, entity_id: int, commit: bool = True) -> bool:
         """Delete a chunk by its ID."""
-        if self.store._connection is None:
-            raise ValueError("Store connection is not available")
+        return await self.store.write(self._delete, entity_id, commit)
 
-        cursor = self.store._connection.cursor()
+    def _delete(
+        self, connection: sqlite3.Connection, entity_id: int, commit: bool = True
+    ) -> bool:
+        cursor = connection.cursor()
 
         # Delete from FTS5 table first
         cursor.execute(
@@ -143,27 +312,29 @@ class ChunkRepository(BaseRepository[Chunk]):
         )
 
         # Delete the embedding
-        cursor.execute(
-            "DELETE FROM chunk_embeddings WHERE chunk_id = :chunk_id",
-            {"chunk_id": entity_id},
-        )
+        self._delete_embeddings(cursor, [(entity_id,)])
 
         # Delete the chunk
         cursor.execute("DELETE FROM chunks WHERE id = :id", {"id": entity_id})
 
         deleted = cursor.rowcount > 0
         if commit:
-            self.store._connection.commit()
+            connection.commit()
         return deleted
 
     async def list_all(
         self, limit: int | None = None, offset: int | None = None
     ) -> list[Chunk]:
         """List all chunks with optional pagination."""
-        if self.store._connection is None:
-            raise ValueError("Store connection is not available")
+        return await self.store.read(self._list_all, limit, offset)
 
-        cursor = self.store._connection.cursor()
+    def _list_all(
+        self,
+        connection: sqlite3.Connection,
+        limit: int | None = None,
+        offset: int | None = None,
+    ) -> list[Chunk]:
+        cursor = connection.cursor()
         query = "SELECT id, document_id, content, metadata FROM chunks ORDER BY document_id, id"
         params = {}
 
@@ -188,251 +359,554 @@ class ChunkRepository(BaseRepository[Chunk]):
             for chunk_id, document_id, content, metadata_json in rows
         ]
 
+    async def prepare_chunks(
+        self, content: str, document_id: int | None = None
+    ) -> tuple[list[str], list[list[float] | None]]:
+        """Chunk a document's content and embed the chunks.
+
+        Returns the chunk texts and their embeddings, ready to be written with
+        `_create_chunks`, or with `_replace_chunks` when a `document_id` is
+        given. In that case, chunks the document already has are not embedded
+        again and get None as embedding.
+        """
+        chunk_texts = await chunker.chunk(content)
+        missing = list(range(len(chunk_texts)))
+        if document_id is not None:
+            existing = Counter(await self.store.read(self._get_contents, document_id))
+            missing = []
+            for order, chunk_text in enumerate(chunk_texts):
+                if existing[chunk_text]:
+                    existing[chunk_text] -= 1
+                else:
+                    missing.append(order)
+
+        # Embed the whole document in as few provider requests as possible,
+        # skipping chunks whose text was embedded before
+        embeddings: list[list[float] | None] = [None] * len(chunk_texts)
+        embedded = await self.embedding_cache.embed(
+            [chunk_texts[order] for order in missing]
+        )
+        for order, embedding in zip(missing, embedded):
+            embeddings[order] = embedding
+        return chunk_texts, embeddings
+
+    async def fill_embeddings(
+        self, chunk_texts: list[str], embeddings: list[list[float] | None]
+    ) -> list[list[float]]:
+        """Embed the chunks that `prepare_chunks` expected to reuse."""
+        missing = [
+            order for order, embedding in enumerate(embeddings) if embedding is None
+        ]
+        filled = list(embeddings)
+        if missing:
+            embedded = await self.embedding_cache.embed(
+                [chunk_texts[order] for order in missing]
+            )
+            for order, embedding in zip(missing, embedded):
+                filled[order] = embedding
+        return cast(list[list[float]], filled)
+
+    def _get_contents(
+        self, connection: sqlite3.Connection, document_id: int
+    ) -> list[str]:
+        cursor = connection.cursor()
+        cursor.execute(
+            "SELECT content FROM chunks WHERE document_id = :document_id",
+            {"document_id": document_id},
+        )
+        return [content for (content,) in cursor.fetchall()]
+
     async def create_chunks_for_document(
         self, document_id: int, content: str, commit: bool = True
     ) -> list[Chunk]:
         """Create chunks and embeddings for a document."""
-        # Chunk the document content
-        chunk_texts = await chunker.chunk(content)
-        created_chunks = []
+        chunk_texts, embeddings = await self.prepare_chunks(content)
+        embeddings = await self.fill_embeddings(chunk_texts, embeddings)
+        return await self.store.write(
+            self._create_chunks, document_id, chunk_texts, embeddings, commit
+        )
 
-        # Create chunks with embeddings using the create method
-        for order, chunk_text in enumerate(chunk_texts):
-            # Create chunk with order in metadata
-            chunk = Chunk(
+    def _create_chunks(
+        self,
+        connection: sqlite3.Connection,
+        document_id: int,
+        chunk_texts: list[str],
+        embeddings: list[list[float]],
+        commit: bool = True,
+    ) -> list[Chunk]:
+        # Create chunks with order in metadata
+        chunks = [
+            Chunk(
                 document_id=document_id, content=chunk_text, metadata={"order": order}
             )
+            for order, chunk_text in enumerate(chunk_texts)
+        ]
+        return self._create_many(connection, chunks, embeddings, commit)
+
+    def _replace_chunks(
+        self,
+        connection: sqlite3.Connection,
+        document_id: int,
+        chunk_texts: list[str],
+        embeddings: Sequence[list[float] | None],
+        commit: bool = True,
+    ) -> list[Chunk]:
+        """Make a document's chunks match `chunk_texts`, reusing unchanged ones.
+
+        Existing chunks whose content is still present keep their rows and
+        vectors, and only their order is updated. Other chunks are deleted,
+        and new ones are inserted with their embedding. Raises
+        `ChunksChangedError` if a chunk without embedding has no existing row
+        to reuse.
+        """
+        cursor = connection.cursor()
+        cursor.execute(
+            """
+            SELECT id, content, metadata FROM chunks
+            WHERE document_id = :document_id ORDER BY id
+            """,
+            {"document_id": document_id},
+        )
+        existing: dict[str, list[Chunk]] = {}
+        for chunk_id, content, metadata_json in cursor.fetchall():
+            existing.setdefault(content, []).append(
+                Chunk(
+                    id=chunk_id,
+                    document_id=document_id,
+                    content=content,
+                    metadata=json.loads(metadata_json) if metadata_json else {},
+                )
+            )
 
-            created_chunk = await self.create(chunk, commit=commit)
-            created_chunks.append(created_chunk)
+        chunks: list[Chunk] = []
+        created: list[Chunk] = []
+        created_embeddings: list[list[float]] = []
+        reordered: list[tuple[str, int]] = []
+        for order, (chunk_text, embedding) in enumerate(
+            zip(chunk_texts, embeddings, strict=True)
+        ):
+            if matches := existing.get(chunk_text):
+                chunk = matches.pop(0)
+                if chunk.metadata.get("order") != order:
+                    chunk.metadata = {**chunk.metadata, "order": order}
+                    assert chunk.id is not None
+                    reordered.append((json.dumps(chunk.metadata), chunk.id))
+            elif embedding is None:
+                raise ChunksChangedError(
+                    f"Chunks of document {document_id} changed during the update"
+                )
+            else:
+                chunk = Chunk(
+                    document_id=document_id,
+                    content=chunk_text,
+                    metadata={"order": order},
+                )
+                created.append(chunk)
+                created_embeddings.append(embedding)
+            chunks.append(chunk)
+
+        stale = [(chunk.id,) for matches in existing.values() for chunk in matches]
+        # The FTS5 rows go first, as removing them reads the indexed content
+        # back from the chunks table
+        cursor.executemany("DELETE FROM chunks_fts WHERE rowid = ?", stale)
+        self._delete_embeddings(cursor, stale)
+        cursor.executemany("DELETE FROM chunks WHERE id = ?", stale)
+        cursor.executemany("UPDATE chunks SET metadata = ? WHERE id = ?", reordered)
+        self._create_many(connection, created, created_embeddings, commit=False)
 
-        return created_chunks
+        if commit:
+            connection.commit()
+        return chunks
 
     async def delete_all(self, commit: bool = True) -> bool:
         """Delete all chunks from the database."""
-        if self.store._connection is None:
-            raise ValueError("Store connection is not available")
+        return await self.store.write(self._delete_all, commit)
 
-        cursor = self.store._connection.cursor()
+    def _delete_all(self, connection: sqlite3.Connection, commit: bool = True) -> bool:
+        cursor = connection.cursor()
+        self.store.mark_changed()
 
         cursor.execute("DELETE FROM chunks_fts")
         cursor.execute("DELETE FROM chunk_embeddings")
+        if self.store.rescored:
+            cursor.execute("DELETE FROM chunk_vectors")
         cursor.execute("DELETE FROM chunks")
+        if self.store.vector_index is not None:
+            self.store.vector_index.clear()
 
         deleted = cursor.rowcount > 0
         if commit:
-            self.store._connection.commit()
+            connection.commit()
         return deleted
 
     async def delete_by_document_id(
         self, document_id: int, commit: bool = True
     ) -> bool:
         """Delete all chunks for a document."""
-        chunks = await self.get_by_document_id(document_id)
+        return await self.store.write(self._delete_by_document_id, document_id, commit)
 
-        deleted_any = False
-        for chunk in chunks:
-            if chunk.id is not None:
-                deleted = await self.delete(chunk.id, commit=False)
-                deleted_any = deleted_any or deleted
+    def _delete_by_document_id(
+        self, connection: sqlite3.Connection, document_id: int, commit: bool = True
+    ) -> bool:
+        return self._delete_by_document_ids(connection, [document_id], commit) > 0
 
-        if commit and deleted_any and self.store._connection:
-            self.store._connection.commit()
-        return deleted_any
+    async def delete_by_document_ids(
+        self, document_ids: Sequence[int], commit: bool = True
+    ) -> int:
+        """Delete all chunks for several documents.
+
+        Returns the number of deleted chunks.
+        """
+        return await self.store.write(
+            self._delete_by_document_ids, document_ids, commit
+        )
+
+    def _delete_by_document_ids(
+        self,
+        connection: sqlite3.Connection,
+        document_ids: Sequence[int],
+        commit: bool = True,
+    ) -> int:
+        cursor = connection.cursor()
+        deleted = 0
+        unique_ids = list(dict.fromkeys(document_ids))
+        for i in range(0, len(unique_ids), MAX_QUERY_PARAMS):
+            batch = unique_ids[i : i + MAX_QUERY_PARAMS]
+            placeholders = ",".join("?" * len(batch))
+            cursor.execute(
+                f"SELECT id FROM chunks WHERE document_id IN ({placeholders})", batch
+            )
+            chunk_ids = cursor.fetchall()
+            if not chunk_ids:
+                continue
+
+            # Point deletes by rowid are the fastest way to remove rows from
+            # the virtual tables, whose IN constraints may fall back to a scan.
+            # The FTS5 rows go first, as removing them reads the indexed
+            # content back from the chunks table.
+            cursor.executemany("DELETE FROM chunks_fts WHERE rowid = ?", chunk_ids)
+            self._delete_embeddings(cursor, chunk_ids)
+            cursor.execute(
+                f"DELETE FROM chunks WHERE document_id IN ({placeholders})", batch
+            )
+            deleted += cursor.rowcount
+
+        if commit and deleted:
+            connection.commit()
+        return deleted
 
     async def search_chunks(
-        self, query: str, limit: int = 5
+        self,
+        query: str,
+        limit: int = 5,
+        nprobe: int | None = None,
+        filters: SearchFilters | None = None,
     ) -> list[tuple[Chunk, float]]:
-        """Search for relevant chunks using vector similarity."""
-        if self.store._connection is None:
-            raise ValueError("Store connection is not available")
-
-        cursor = self.store._connection.cursor()
+        """Search for relevant chunks using vector similarity.
 
+        Only chunks of documents matching all `filters` are searched, see
+        `parse_filters`.
+        """
+        conditions = parse_filters(filters)
         # Generate embedding for the query
-        query_embedding = await self.embedder.embed(query)
+        query_embedding = await self.query_cache.embed(query)
         serialized_query_embedding = self.store.serialize_embedding(query_embedding)
+        return await self.store.read(
+            self._search_chunks, serialized_query_embedding, limit, nprobe, conditions
+        )
 
-        # Search for similar chunks using sqlite-vec
+    def _search_chunks(
+        self,
+        connection: sqlite3.Connection,
+        serialized_query_embedding: bytes,
+        limit: int = 5,
+        nprobe: int | None = None,
+        filters: Sequence[Filter] = (),
+    ) -> list[tuple[Chunk, float]]:
+        hits = self._find_nearest(
+            connection, serialized_query_embedding, limit, nprobe, filters
+        )
+        return self._get_search_results(connection, hits)
+
+    def _find_nearest(
+        self,
+        connection: sqlite3.Connection,
+        serialized_query_embedding: bytes,
+        limit: int,
+        nprobe: int | None = None,
+        filters: Sequence[Filter] = (),
+    ) -> list[tuple[int, float]]:
+        """Find the (chunk id, L2 distance) of the nearest chunks.
+
+        With `filters`, the search is restricted to the eligible chunks, so
+        that it neither scans nor returns the others.
+        """
+        cursor = connection.cursor()
+        filtered_sql, parameters = "", {}
+        if filters:
+            eligible_sql, parameters = get_filtered_chunks_sql(filters)
+            filtered_sql = f"AND chunk_id IN ({eligible_sql})"
+
+        if self.store.vector_index is not None:
+            ids = None
+            if filters:
+                cursor.execute(eligible_sql, parameters)
+                ids = [chunk_id for (chunk_id,) in cursor.fetchall()]
+            return self.store.vector_index.search(
+                self.store.deserialize_embedding(serialized_query_embedding),
+                limit,
+                nprobe,
+                ids,
+            )
+
+        if not self.store.rescored:
+            cursor.execute(
+                f"""
+                SELECT chunk_id, distance FROM chunk_embeddings
+                WHERE embedding MATCH :embedding AND k = :k {filtered_sql}
+                ORDER BY distance
+                """,
+                {"embedding": serialized_query_embedding, "k": limit, **parameters},
+            )
+            return cursor.fetchall()
+
+        # Score the candidates of a coarse search over the quantized or
+        # truncated embeddings again with their full float32 embedding
+        quantization = self.store.quantization
+        [quantized_query_embedding] = quantize(
+            [serialized_query_embedding], quantization, self.store.prefix_dim
+        )
         cursor.execute(
-            """
-            SELECT c.id, c.document_id, c.content, c.metadata, distance, d.uri, d.metadata as document_metadata
-            FROM chunk_embeddings
-            JOIN chunks c ON c.id = chunk_embeddings.chunk_id
-            JOIN documents d ON c.document_id = d.id
-            WHERE embedding MATCH :embedding AND k = :k
+            f"""
+            WITH candidates AS (
+                SELECT chunk_id FROM chunk_embeddings
+                WHERE embedding MATCH {VECTOR_FUNCTIONS[quantization]}(:quantized)
+                    AND k = :k {filtered_sql}
+            )
+            SELECT v.chunk_id, vec_distance_l2(v.embedding, :embedding) AS distance
+            FROM candidates
+            JOIN chunk_vectors v ON v.chunk_id = candidates.chunk_id
             ORDER BY distance
+            LIMIT :limit
             """,
-            {"embedding": serialized_query_embedding, "k": limit},
+            {
+                "quantized": quantized_query_embedding,
+                "embedding": serialized_query_embedding,
+                "k": limit * max(1, Config.EMBEDDINGS_RESCORE_FACTOR),
+                "limit": limit,
+                **parameters,
+            },
         )
+        return cursor.fetchall()
 
-        results = cursor.fetchall()
+    def _get_search_results(
+        self, connection: sqlite3.Connection, hits: list[tuple[int, float]]
+    ) -> list[tuple[Chunk, float]]:
+        """Load the chunks of (chunk id, L2 distance) hits."""
+        chunks = self._get_chunks(connection, [chunk_id for chunk_id, _ in hits])
         return [
-            (
-                Chunk(
-                    id=chunk_id,
-                    document_id=document_id,
-                    content=content,
-                    metadata=json.loads(metadata_json) if metadata_json else {},
-                    document_uri=document_uri,
-                    document_meta=json.loads(document_metadata_json)
-                    if document_metadata_json
-                    else {},
-                ),
-                1.0 / (1.0 + distance),
-            )
-            for chunk_id, document_id, content, metadata_json, distance, document_uri, document_metadata_json in results
+            (chunks[chunk_id], 1.0 / (1.0 + distance))
+            for chunk_id, distance in hits
+            if chunk_id in chunks
         ]
 
-    async def search_chunks_fts(
-        self, query: str, limit: int = 5
-    ) -> list[tuple[Chunk, float]]:
-        """Search for chunks using FTS5 full-text search."""
-        if self.store._connection is None:
-            raise ValueError("Store connection is not available")
-
-        cursor = self.store._connection.cursor()
-
-        # Clean the query for FTS5 - extract keywords for better matching
-        # Remove special characters and split into words
-        words = re.findall(r"\b\w+\b", query.lower())
-        # Join with OR to find chunks containing any of the keywords
-        fts_query = " OR ".join(words) if words else query
-
-        # Search using FTS5
+    def _get_chunks(
+        self, connection: sqlite3.Connection, chunk_ids: list[int]
+    ) -> dict[int, Chunk]:
+        """Load chunks with their document information by id.
+
+        Chunks deleted since they were found are missing from the result.
+        """
+        if not chunk_ids:
+            return {}
+        cursor = connection.cursor()
+        placeholders = ",".join("?" * len(chunk_ids))
         cursor.execute(
-            """
-            SELECT c.id, c.document_id, c.content, c.metadata, rank, d.uri, d.metadata as document_metadata
-            FROM chunks_fts
-            JOIN chunks c ON c.id = chunks_fts.rowid
+            f"""
+            SELECT c.id, c.document_id, c.content, c.metadata, d.uri, d.metadata as document_metadata
+            FROM chunks c
             JOIN documents d ON c.document_id = d.id
-            WHERE chunks_fts MATCH :query
-            ORDER BY rank
-            LIMIT :limit
+            WHERE c.id IN ({placeholders})
             """,
-            {"query": fts_query, "limit": limit},
+            chunk_ids,
         )
-
-        results = cursor.fetchall()
-
-        return [
-            (
-                Chunk(
-                    id=chunk_id,
-                    document_id=document_id,
-                    content=content,
-                    metadata=json.loads(metadata_json) if metadata_json else {},
-                    document_uri=document_uri,
-                    document_meta=json.loads(document_metadata_json)
-                    if document_metadata_json
-                    else {},
-                ),
-                -rank,
+        return {
+            chunk_id: Chunk(
+                id=chunk_id,
+                document_id=document_id,
+                content=content,
+                metadata=json.loads(metadata_json) if metadata_json else {},
+                document_uri=document_uri,
+                document_meta=json.loads(document_metadata_json)
+                if document_metadata_json
+                else {},
             )
-            for chunk_id, document_id, content, metadata_json, rank, document_uri, document_metadata_json in results
-            # FTS5 rank is negative BM25 score
-        ]
+            for chunk_id, document_id, content, metadata_json, document_uri, document_metadata_json in cursor.fetchall()
+        }
 
-    async def search_chunks_hybrid(
-        self, query: str, limit: int = 5, k: int = 60
+    async def search_chunks_fts(
+        self, query: str, limit: int = 5, filters: SearchFilters | None = None
     ) -> list[tuple[Chunk, float]]:
-        """Hybrid search using Reciprocal Rank Fusion (RRF) combining vector similarity and FTS5 full-text search."""
-        if self.store._connection is None:
-            raise ValueError("Store connection is not available")
+        """Search for chunks using FTS5 full-text search.
 
-        cursor = self.store._connection.cursor()
+        Only chunks of documents matching all `filters` are searched, see
+        `parse_filters`.
+        """
+        return await self.store.read(
+            self._search_chunks_fts, query, limit, parse_filters(filters)
+        )
 
-        # Generate embedding for the query
-        query_embedding = await self.embedder.embed(query)
-        serialized_query_embedding = self.store.serialize_embedding(query_embedding)
+    def _search_chunks_fts(
+        self,
+        connection: sqlite3.Connection,
+        query: str,
+        limit: int = 5,
+        filters: Sequence[Filter] = (),
+    ) -> list[tuple[Chunk, float]]:
+        matches = self._find_matches(connection, query, limit, filters)
+        chunks = self._get_chunks(connection, [chunk_id for chunk_id, _ in matches])
+        return [
+            (chunks[chunk_id], score)
+            for chunk_id, score in matches
+            if chunk_id in chunks
+        ]
 
+    def _find_matches(
+        self,
+        connection: sqlite3.Connection,
+        query: str,
+        limit: int,
+        filters: Sequence[Filter] = (),
+    ) -> list[tuple[int, float]]:
+        """Find the (chunk id, BM25 score) of the best full-text matches of
+        the chunks eligible for `filters`."""
         # Clean the query for FTS5 - extract keywords for better matching
         # Remove special characters and split into words
         words = re.findall(r"\b\w+\b", query.lower())
         # Join with OR to find chunks containing any of the keywords
         fts_query = " OR ".join(words) if words else query
-        # Perform hybrid search using RRF (Reciprocal Rank Fusion)
+
+        filtered_sql, parameters = "", {}
+        if filters:
+            eligible_sql, parameters = get_filtered_chunks_sql(filters)
+            filtered_sql = f"AND rowid IN ({eligible_sql})"
+
+        cursor = connection.cursor()
+        # FTS5 rank is negative BM25 score
         cursor.execute(
-            """
-            WITH vector_search AS (
-                SELECT
-                    c.id,
-                    c.document_id,
-                    c.content,
-                    c.metadata,
-                    ROW_NUMBER() OVER (ORDER BY ce.distance) as vector_rank
-                FROM chunk_embeddings ce
-                JOIN chunks c ON c.id = ce.chunk_id
-                WHERE ce.embedding MATCH :embedding AND k = :k_vector
-                ORDER BY ce.distance
-            ),
-            fts_search AS (
-                SELECT
-                    c.id,
-                    c.document_id,
-                    c.content,
-                    c.metadata,
-                    ROW_NUMBER() OVER (ORDER BY chunks_fts.rank) as fts_rank
-                FROM chunks_fts
-                JOIN chunks c ON c.id = chunks_fts.rowid
-                WHERE chunks_fts MATCH :fts_query
-                ORDER BY chunks_fts.rank
-            ),
-            all_chunks AS (
-                SELECT id, document_id, content, metadata FROM vector_search
-                UNION
-                SELECT id, document_id, content, metadata FROM fts_search
-            ),
-            rrf_scores AS (
-                SELECT
-                    a.id,
-                    a.document_id,
-                    a.content,
-                    a.metadata,
-                    COALESCE(1.0 / (:k + v.vector_rank), 0) + COALESCE(1.0 / (:k + f.fts_rank), 0) as rrf_score
-                FROM all_chunks a
-                LEFT JOIN vector_search v ON a.id = v.id
-                LEFT JOIN fts_search f ON a.id = f.id
-            )
-            SELECT r.id, r.document_id, r.content, r.metadata, r.rrf_score, d.uri, d.metadata as document_metadata
-            FROM rrf_scores r
-            JOIN documents d ON r.document_id = d.id
-            ORDER BY r.rrf_score DESC
+            f"""
+            SELECT rowid, -rank FROM chunks_fts
+            WHERE chunks_fts MATCH :query {filtered_sql}
+            ORDER BY rank
             LIMIT :limit
             """,
-            {
-                "embedding": serialized_query_embedding,
-                "k_vector": limit * 3,
-                "fts_query": fts_query,
-                "k": k,
-                "limit": limit,
-            },
+            {"query": fts_query, "limit": limit, **parameters},
         )
+        return cursor.fetchall()
 
-        results = cursor.fetchall()
-        return [
-            (
-                Chunk(
-                    id=chunk_id,
-                    document_id=document_id,
-                    content=content,
-                    metadata=json.loads(metadata_json) if metadata_json else {},
-                    document_uri=document_uri,
-                    document_meta=json.loads(document_metadata_json)
-                    if document_metadata_json
-                    else {},
+    async def search_chunks_hybrid(
+        self,
+        query: str,
+        limit: int = 5,
+        k: int = 60,
+        nprobe: int | None = None,
+        fusion: str | None = None,
+        filters: SearchFilters | None = None,
+    ) -> SearchResults:
+        """Hybrid search fusing vector similarity and FTS5 full-text search.
+
+        `fusion` is "rrf" (Reciprocal Rank Fusion with parameter `k`),
+        "minmax" or "zscore", and defaults to HYBRID_FUSION. Only chunks of
+        documents matching all `filters` are searched, see `parse_filters`.
+
+        The full-text search runs on a reader while the query is embedded, and
+        the results report the milliseconds spent embedding the query
+        ("embed"), in each search ("fts", "vector"), fusing ("fusion"),
+        loading the chunks ("load") and overall ("total").
+        """
+        conditions = parse_filters(filters)
+        timings: dict[str, float] = {}
+        start = time.perf_counter()
+        candidates = limit * max(1, Config.HYBRID_CANDIDATE_FACTOR)
+        fts = asyncio.ensure_future(
+            _timed(
+                timings,
+                "fts",
+                self.store.read(self._find_matches, query, candidates, conditions),
+            )
+        )
+        try:
+            query_embedding = await _timed(
+                timings, "embed", self.query_cache.embed(query)
+            )
+            serialized_query_embedding = self.store.serialize_embedding(query_embedding)
+            hits = await _timed(
+                timings,
+                "vector",
+                self.store.read(
+                    self._find_nearest,
+                    serialized_query_embedding,
+                    candidates,
+                    nprobe,
+                    conditions,
                 ),
-                rrf_score,
             )
-            for chunk_id, document_id, content, metadata_json, rrf_score, document_uri, document_metadata_json in results
-        ]
+            matches = await fts
+        except BaseException:
+            fts.cancel()
+            raise
+
+        fusion_start = time.perf_counter()
+        results = self._fuse(hits, matches, limit, k, fusion)
+        timings["fusion"] = (time.perf_counter() - fusion_start) * 1000
+        chunks = await _timed(
+            timings,
+            "load",
+            self.store.read(self._get_chunks, [chunk_id for chunk_id, _ in results]),
+        )
+        timings["total"] = (time.perf_counter() - start) * 1000
+        return SearchResults(
+            (
+                (chunks[chunk_id], score)
+                for chunk_id, score in results
+                if chunk_id in chunks
+            ),
+            timings,
+        )
+
+    def _fuse(
+        self,
+        hits: list[tuple[int, float]],
+        matches: list[tuple[int, float]],
+        limit: int,
+        k: int,
+        fusion: str | None,
+    ) -> list[tuple[int, float]]:
+        """Fuse the (chunk id, distance) vector hits and (chunk id, BM25 score)
+        full-text matches into the (chunk id, score) of the `limit` best chunks.
+
+        Each search only returns the ids and scores of its best candidates, the
+        content is loaded for the fused results.
+        """
+        return fuse(
+            [
+                [(chunk_id, -distance) for chunk_id, distance in hits],
+                matches,
+            ],
+            limit,
+            fusion or Config.HYBRID_FUSION,
+            k,
+            [Config.HYBRID_VECTOR_WEIGHT, Config.HYBRID_FTS_WEIGHT],
+        )
 
     async def get_by_document_id(self, document_id: int) -> list[Chunk]:
         """Get all chunks for a specific document."""
-        if self.store._connection is None:
-            raise ValueError("Store connection is not available")
+        return await self.store.read(self._get_by_document_id, document_id)
 
-        cursor = self.store._connection.cursor()
+    def _get_by_document_id(
+        self, connection: sqlite3.Connection, document_id: int
+    ) -> list[Chunk]:
+        cursor = connection.cursor()
         cursor.execute(
             """
             SELECT c.id, c.document_id, c.content, c.metadata, d.uri, d.metadata as document_metadata
@@ -458,3 +932,12 @@ class ChunkRepository(BaseRepository[Chunk]):
             )
             for chunk_id, document_id, content, metadata_json, document_uri, document_metadata_json in rows
         ]
+
+
+async def _timed(timings: dict[str, float], name: str, awaitable: Awaitable[T]) -> T:
+    """Await `awaitable`, recording its duration in milliseconds in `timings`."""
+    start = time.perf_counter()
+    try:
+        return await awaitable
+    finally:
+        timings[name] = (time.perf_counter() - start) * 1000
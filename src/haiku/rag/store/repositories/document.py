@@ -1,7 +1,11 @@
 import json
+import sqlite3
+from collections.abc import Sequence
+from datetime import datetime
 
 from haiku.rag.store.models.document import Document
-from haiku.rag.store.repositories.base import BaseRepository
+from haiku.rag.store.repositories.base import MAX_QUERY_PARAMS, BaseRepository
+from haiku.rag.store.repositories.chunk import ChunksChangedError
 
 
 class DocumentRepository(BaseRepository[Document]):
@@ -18,13 +22,25 @@ class DocumentRepository(BaseRepository[Document]):
 
     async def create(self, entity: Document) -> Document:
         """Create a document with its chunks and embeddings."""
-        if self.store._connection is None:
-            raise ValueError("Store connection is not available")
+        # Chunk and embed before touching the database so that the write
+        # transaction does not span provider requests
+        chunk_texts, embeddings = await self.chunk_repository.prepare_chunks(
+            entity.content
+        )
+        return await self.save(entity, chunk_texts, embeddings)
 
-        cursor = self.store._connection.cursor()
+    def _create(
+        self,
+        connection: sqlite3.Connection,
+        entity: Document,
+        chunk_texts: list[str],
+        embeddings: list[list[float]],
+    ) -> Document:
+        cursor = connection.cursor()
 
         # Start transaction
         cursor.execute("BEGIN TRANSACTION")
+        self.store.mark_changed()
 
         try:
             # Insert the document
@@ -47,8 +63,8 @@ class DocumentRepository(BaseRepository[Document]):
             entity.id = document_id
 
             # Create chunks and embeddings using ChunkRepository
-            await self.chunk_repository.create_chunks_for_document(
-                document_id, entity.content, commit=False
+            self.chunk_repository._create_chunks(
+                connection, document_id, chunk_texts, embeddings, commit=False
             )
 
             cursor.execute("COMMIT")
@@ -58,12 +74,42 @@ class DocumentRepository(BaseRepository[Document]):
             cursor.execute("ROLLBACK")
             raise
 
+    async def save(
+        self,
+        entity: Document,
+        chunk_texts: list[str],
+        embeddings: list[list[float] | None],
+    ) -> Document:
+        """Create or update a document from already chunked and embedded content.
+
+        Documents without an ID are created, others are updated. Chunks
+        prepared without embedding reuse the document's existing chunks, see
+        `ChunkRepository.prepare_chunks`.
+        """
+        if entity.id is None:
+            return await self.store.write(
+                self._create,
+                entity,
+                chunk_texts,
+                await self.chunk_repository.fill_embeddings(chunk_texts, embeddings),
+            )
+        try:
+            return await self.store.write(self._update, entity, chunk_texts, embeddings)
+        except ChunksChangedError:
+            # Another write changed the chunks after they were compared
+            embeddings = await self.chunk_repository.fill_embeddings(
+                chunk_texts, embeddings
+            )
+            return await self.store.write(self._update, entity, chunk_texts, embeddings)
+
     async def get_by_id(self, entity_id: int) -> Document | None:
         """Get a document by its ID."""
-        if self.store._connection is None:
-            raise ValueError("Store connection is not available")
+        return await self.store.read(self._get_by_id, entity_id)
 
-        cursor = self.store._connection.cursor()
+    def _get_by_id(
+        self, connection: sqlite3.Connection, entity_id: int
+    ) -> Document | None:
+        cursor = connection.cursor()
         cursor.execute(
             """
             SELECT id, content, uri, metadata, created_at, updated_at
@@ -90,10 +136,10 @@ class DocumentRepository(BaseRepository[Document]):
 
     async def get_by_uri(self, uri: str) -> Document | None:
         """Get a document by its URI."""
-        if self.store._connection is None:
-            raise ValueError("Store connection is not available")
+        return await self.store.read(self._get_by_uri, uri)
 
-        cursor = self.store._connection.cursor()
+    def _get_by_uri(self, connection: sqlite3.Connection, uri: str) -> Document | None:
+        cursor = connection.cursor()
         cursor.execute(
             """
             SELECT id, content, uri, metadata, created_at, updated_at
@@ -118,17 +164,103 @@ class DocumentRepository(BaseRepository[Document]):
             updated_at=updated_at,
         )
 
+    async def get_uri_index(self, uri_prefix: str = "") -> dict[str, tuple[int, str]]:
+        """Map the URIs starting with `uri_prefix` to their document ID and MD5.
+
+        Documents without an MD5 in their metadata map to an empty string.
+        """
+        return await self.store.read(self._get_uri_index, uri_prefix)
+
+    def _get_uri_index(
+        self, connection: sqlite3.Connection, uri_prefix: str
+    ) -> dict[str, tuple[int, str]]:
+        cursor = connection.cursor()
+        cursor.execute(
+            """
+            SELECT uri, id, JSON_EXTRACT(metadata, '$.md5') FROM documents
+            WHERE uri IS NOT NULL AND SUBSTR(uri, 1, :length) = :prefix
+            """,
+            {"prefix": uri_prefix, "length": len(uri_prefix)},
+        )
+        return {
+            uri: (document_id, md5 or "") for uri, document_id, md5 in cursor.fetchall()
+        }
+
+    async def get_ids_by_uri(self, uris: Sequence[str]) -> dict[str, int]:
+        """Map URIs to the IDs of their documents, for those that exist."""
+        return await self.store.read(self._get_ids_by_uri, uris)
+
+    def _get_ids_by_uri(
+        self, connection: sqlite3.Connection, uris: Sequence[str]
+    ) -> dict[str, int]:
+        cursor = connection.cursor()
+        ids: dict[str, int] = {}
+        unique_uris = list(dict.fromkeys(uris))
+        for i in range(0, len(unique_uris), MAX_QUERY_PARAMS):
+            batch = unique_uris[i : i + MAX_QUERY_PARAMS]
+            placeholders = ",".join("?" * len(batch))
+            cursor.execute(
+                f"SELECT uri, id FROM documents WHERE uri IN ({placeholders})", batch
+            )
+            ids.update(cursor.fetchall())
+        return ids
+
+    async def move_many(
+        self, moves: Sequence[tuple[str, str]]
+    ) -> list[tuple[str, str]]:
+        """Change the URI of documents, given as (old URI, new URI) pairs.
+
+        Chunks and embeddings are kept. Returns the moves of documents that
+        existed.
+        """
+        if not moves:
+            return []
+        return await self.store.write(self._move_many, moves)
+
+    def _move_many(
+        self, connection: sqlite3.Connection, moves: Sequence[tuple[str, str]]
+    ) -> list[tuple[str, str]]:
+        cursor = connection.cursor()
+        self.store.mark_changed()
+        updated_at = datetime.now()
+        moved = []
+        for old_uri, new_uri in moves:
+            cursor.execute(
+                """
+                UPDATE documents SET uri = :new_uri, updated_at = :updated_at
+                WHERE uri = :old_uri
+                """,
+                {"old_uri": old_uri, "new_uri": new_uri, "updated_at": updated_at},
+            )
+            if cursor.rowcount:
+                moved.append((old_uri, new_uri))
+        connection.commit()
+        return moved
+
     async def update(self, entity: Document) -> Document:
         """Update an existing document and regenerate its chunks and embeddings."""
-        if self.store._connection is None:
-            raise ValueError("Store connection is not available")
         if entity.id is None:
             raise ValueError("Document ID is required for update")
 
-        cursor = self.store._connection.cursor()
+        # Only chunks the document does not have yet are embedded
+        chunk_texts, embeddings = await self.chunk_repository.prepare_chunks(
+            entity.content, entity.id
+        )
+        return await self.save(entity, chunk_texts, embeddings)
+
+    def _update(
+        self,
+        connection: sqlite3.Connection,
+        entity: Document,
+        chunk_texts: list[str],
+        embeddings: list[list[float] | None],
+    ) -> Document:
+        assert entity.id is not None
+        cursor = connection.cursor()
 
         # Start transaction
         cursor.execute("BEGIN TRANSACTION")
+        self.store.mark_changed()
 
         try:
             # Update the document
@@ -147,10 +279,9 @@ class DocumentRepository(BaseRepository[Document]):
                 },
             )
 
-            # Delete existing chunks and regenerate using ChunkRepository
-            await self.chunk_repository.delete_by_document_id(entity.id, commit=False)
-            await self.chunk_repository.create_chunks_for_document(
-                entity.id, entity.content, commit=False
+            # Keep unchanged chunks and replace the others using ChunkRepository
+            self.chunk_repository._replace_chunks(
+                connection, entity.id, chunk_texts, embeddings, commit=False
             )
 
             cursor.execute("COMMIT")
@@ -162,27 +293,62 @@ class DocumentRepository(BaseRepository[Document]):
 
     async def delete(self, entity_id: int) -> bool:
         """Delete a document and all its associated chunks and embeddings."""
-        # Delete chunks and embeddings first
-        await self.chunk_repository.delete_by_document_id(entity_id)
+        return await self.store.write(self._delete, entity_id)
+
+    def _delete(self, connection: sqlite3.Connection, entity_id: int) -> bool:
+        return self._delete_many(connection, [entity_id]) > 0
 
-        if self.store._connection is None:
-            raise ValueError("Store connection is not available")
+    async def delete_many(self, entity_ids: Sequence[int]) -> int:
+        """Delete several documents and their chunks in a single transaction.
 
-        cursor = self.store._connection.cursor()
-        cursor.execute("DELETE FROM documents WHERE id = :id", {"id": entity_id})
+        Returns the number of deleted documents.
+        """
+        return await self.store.write(self._delete_many, entity_ids)
 
-        deleted = cursor.rowcount > 0
-        self.store._connection.commit()
-        return deleted
+    def _delete_many(
+        self, connection: sqlite3.Connection, entity_ids: Sequence[int]
+    ) -> int:
+        cursor = connection.cursor()
+
+        # Start transaction
+        cursor.execute("BEGIN TRANSACTION")
+        self.store.mark_changed()
+
+        try:
+            self.chunk_repository._delete_by_document_ids(
+                connection, entity_ids, commit=False
+            )
+
+            deleted = 0
+            unique_ids = list(dict.fromkeys(entity_ids))
+            for i in range(0, len(unique_ids), MAX_QUERY_PARAMS):
+                batch = unique_ids[i : i + MAX_QUERY_PARAMS]
+                placeholders = ",".join("?" * len(batch))
+                cursor.execute(
+                    f"DELETE FROM documents WHERE id IN ({placeholders})", batch
+                )
+                deleted += cursor.rowcount
+
+            cursor.execute("COMMIT")
+            return deleted
+
+        except Exception:
+            cursor.execute("ROLLBACK")
+            raise
 
     async def list_all(
         self, limit: int | None = None, offset: int | None = None
     ) -> list[Document]:
         """List all documents with optional pagination."""
-        if self.store._connection is None:
-            raise ValueError("Store connection is not available")
+        return await self.store.read(self._list_all, limit, offset)
 
-        cursor = self.store._connection.cursor()
+    def _list_all(
+        self,
+        connection: sqlite3.Connection,
+        limit: int | None = None,
+        offset: int | None = None,
+    ) -> list[Document]:
+        cursor = connection.cursor()
         query = "SELECT id, content, uri, metadata, created_at, updated_at FROM documents ORDER BY created_at DESC"
         params = {}
 
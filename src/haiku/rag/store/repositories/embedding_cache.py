@@ -0,0 +1,349 @@
+import asyncio
+import hashlib
+import re
+import sqlite3
+import time
+import unicodedata
+from collections import OrderedDict
+from collections.abc import Sequence
+
+from haiku.rag.config import Config
+from haiku.rag.embeddings.base import EmbedderBase
+from haiku.rag.store.engine import Store
+from haiku.rag.store.repositories.base import MAX_QUERY_PARAMS
+
+
+class EmbeddingCacheRepository:
+    """Repository for the content-addressed embedding cache.
+
+    Embeddings are keyed by the embedder model, the vector dimension and the
+    SHA-256 of the embedded text, so identical texts are only embedded once.
+    """
+
+    def __init__(
+        self,
+        store: Store,
+        embedder: EmbedderBase,
+        enabled: bool = Config.EMBEDDINGS_CACHE,
+        max_entries: int = Config.EMBEDDINGS_CACHE_MAX_ENTRIES,
+    ):
+        self.store = store
+        self.embedder = embedder
+        self.enabled = enabled
+        self.max_entries = max_entries
+        # Number of cached embeddings, counted once and then tracked through
+        # the writes of this repository, see `_evict`
+        self._entries: int | None = None
+
+    @staticmethod
+    def hash_text(text: str) -> str:
+        """Content hash used as the cache key for a text."""
+        return hashlib.sha256(text.encode("utf-8")).hexdigest()
+
+    async def embed(self, texts: Sequence[str]) -> list[list[float]]:
+        """Embed texts, only calling the embedder for texts not already cached."""
+        if not self.enabled:
+            return await self.embedder.embed_batch(list(texts))
+
+        hashes = [self.hash_text(text) for text in texts]
+        embeddings = await self.get(hashes)
+
+        missing: dict[str, str] = {}
+        for text_hash, text in zip(hashes, texts):
+            if text_hash not in embeddings:
+                missing[text_hash] = text
+
+        if missing:
+            new_embeddings = await self.embedder.embed_batch(list(missing.values()))
+            new_entries = dict(zip(missing.keys(), new_embeddings))
+            await self.put(new_entries)
+            embeddings.update(new_entries)
+
+        return [embeddings[text_hash] for text_hash in hashes]
+
+    async def get(self, hashes: Sequence[str]) -> dict[str, list[float]]:
+        """Look up cached embeddings by text hash, marking them as recently used."""
+        return await self.store.write(self._get, hashes)
+
+    async def lookup(self, hashes: Sequence[str]) -> dict[str, list[float]]:
+        """Look up cached embeddings by text hash on a reader connection.
+
+        Unlike `get`, entries are not marked as recently used, so that lookups
+        do not wait for the writer.
+        """
+        return await self.store.read(self._lookup, hashes)
+
+    def _get(
+        self, connection: sqlite3.Connection, hashes: Sequence[str]
+    ) -> dict[str, list[float]]:
+        found = self._lookup(connection, hashes)
+        self._touch(connection, list(found))
+        return found
+
+    async def touch(self, hashes: Sequence[str]) -> None:
+        """Mark cached embeddings as recently used, e.g. after a `lookup`."""
+        await self.store.write(self._touch, hashes)
+
+    def _touch(self, connection: sqlite3.Connection, hashes: Sequence[str]) -> None:
+        if not hashes:
+            return
+        opened = not connection.in_transaction
+        connection.cursor().executemany(
+            """
+            UPDATE embedding_cache SET last_used_at = CURRENT_TIMESTAMP
+            WHERE model = ? AND dim = ? AND text_hash = ?
+            """,
+            [
+                (self.embedder._model, self.embedder._vector_dim, text_hash)
+                for text_hash in hashes
+            ],
+        )
+        if opened:
+            connection.commit()
+
+    def _lookup(
+        self, connection: sqlite3.Connection, hashes: Sequence[str]
+    ) -> dict[str, list[float]]:
+        cursor = connection.cursor()
+        unique_hashes = list(dict.fromkeys(hashes))
+        found: dict[str, list[float]] = {}
+        for i in range(0, len(unique_hashes), MAX_QUERY_PARAMS):
+            batch = unique_hashes[i : i + MAX_QUERY_PARAMS]
+            placeholders = ",".join("?" * len(batch))
+            cursor.execute(
+                f"""
+                SELECT text_hash, embedding FROM embedding_cache
+                WHERE model = ? AND dim = ? AND text_hash IN ({placeholders})
+                """,
+                (self.embedder._model, self.embedder._vector_dim, *batch),
+            )
+            for text_hash, blob in cursor.fetchall():
+                found[text_hash] = self.store.deserialize_embedding(blob)
+        return found
+
+    async def put(self, entries: dict[str, list[float]]) -> None:
+        """Store embeddings by text hash, evicting the least recently used if needed."""
+        await self.store.write(self._put, entries)
+
+    def _put(
+        self, connection: sqlite3.Connection, entries: dict[str, list[float]]
+    ) -> None:
+        opened = not connection.in_transaction
+        cursor = connection.cursor()
+        cursor.executemany(
+            """
+            INSERT OR IGNORE INTO embedding_cache (model, dim, text_hash, embedding)
+            VALUES (?, ?, ?, ?)
+            """,
+            [
+                (
+                    self.embedder._model,
+                    self.embedder._vector_dim,
+                    text_hash,
+                    self.store.serialize_embedding(embedding),
+                )
+                for text_hash, embedding in entries.items()
+            ],
+        )
+        if self._entries is not None:
+            # Texts embedded concurrently are only stored once
+            self._entries += cursor.rowcount
+        if self.max_entries > 0:
+            self._evict(cursor, self.max_entries)
+        # Cache writes are committed on their own, since the documents they are
+        # computed for are written in a later transaction. A transaction left
+        # open by the caller, e.g. during a rebuild, is the caller's to commit.
+        if opened:
+            connection.commit()
+
+    async def prune(self, max_entries: int | None = None) -> int:
+        """Evict least recently used entries until at most `max_entries` remain.
+
+        Defaults to the configured maximum. Returns the number of evicted entries.
+        """
+        return await self.store.write(
+            self._prune, self.max_entries if max_entries is None else max_entries
+        )
+
+    def _prune(self, connection: sqlite3.Connection, max_entries: int) -> int:
+        opened = not connection.in_transaction
+        evicted = self._evict(connection.cursor(), max_entries)
+        if opened:
+            connection.commit()
+        return evicted
+
+    async def count(self) -> int:
+        """Number of cached embeddings across all models."""
+        return await self.store.read(self._count)
+
+    @staticmethod
+    def _count(connection: sqlite3.Connection) -> int:
+        cursor = connection.cursor()
+        cursor.execute("SELECT COUNT(*) FROM embedding_cache")
+        return cursor.fetchone()[0]
+
+    def _evict(self, cursor, max_entries: int) -> int:
+        max_entries = max(max_entries, 0)
+        # The ordered scan below is only needed once the cache is full, which
+        # the tracked count tells without scanning the table. The count misses
+        # entries written by other processes and counts those of rolled back
+        # transactions, which either delays eviction until this process fills
+        # the cache, or runs an eviction that finds nothing to evict.
+        if self._entries is None:
+            cursor.execute("SELECT COUNT(*) FROM embedding_cache")
+            self._entries = cursor.fetchone()[0]
+        if self._entries <= max_entries:
+            return 0
+        cursor.execute(
+            """
+            DELETE FROM embedding_cache WHERE rowid IN (
+                SELECT rowid FROM embedding_cache
+                ORDER BY last_used_at DESC, rowid DESC
+                LIMIT -1 OFFSET :max_entries
+            )
+            """,
+            {"max_entries": max_entries},
+        )
+        evicted = cursor.rowcount
+        # An eviction leaves max_entries. One that found nothing to evict was
+        # run on an overestimated count, which is taken again.
+        self._entries = max_entries if evicted else None
+        return evicted
+
+
+class QueryEmbeddingCache:
+    """In-process LRU cache of query embeddings, in front of the embedder.
+
+    Queries are normalized (Unicode NFKC, collapsed whitespace) and keyed by
+    the embedder provider, model, vector dimension and normalized text.
+    Entries expire `ttl` seconds after they were embedded (0 keeps them until
+    evicted). When `persistent` is given, misses are looked up in the
+    database embedding cache before calling the embedder, and new embeddings
+    are stored there, so they survive restarts and are shared between
+    processes. Lookups run on a reader, while new embeddings and the recency
+    of the entries found are written in the background, in batches, so that
+    searches never wait for the writer. `close` waits for pending writes.
+    """
+
+    def __init__(
+        self,
+        embedder: EmbedderBase,
+        persistent: EmbeddingCacheRepository | None = None,
+        max_entries: int = Config.EMBEDDINGS_QUERY_CACHE_MAX_ENTRIES,
+        ttl: float = Config.EMBEDDINGS_QUERY_CACHE_TTL,
+    ):
+        self.embedder = embedder
+        self.persistent = persistent
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self._entries: OrderedDict[tuple, tuple[float, list[float]]] = OrderedDict()
+        # Writes to the persistent cache that are yet to be made
+        self._new: dict[str, list[float]] = {}
+        self._used: set[str] = set()
+        self._flush_task: asyncio.Task | None = None
+        self.hits = 0
+        self.persistent_hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+
+    @staticmethod
+    def normalize(query: str) -> str:
+        """Normalize a query so that trivially different spellings share an entry."""
+        return re.sub(r"\s+", " ", unicodedata.normalize("NFKC", query)).strip()
+
+    def _key(self, query: str) -> tuple:
+        return (
+            type(self.embedder).__module__,
+            self.embedder._model,
+            self.embedder._vector_dim,
+            query,
+        )
+
+    async def embed(self, query: str) -> list[float]:
+        """Embed a query, skipping the embedder for recently embedded queries."""
+        query = self.normalize(query)
+        key = self._key(query)
+        entry = self._entries.get(key)
+        if entry is not None:
+            expires_at, embedding = entry
+            if not self.ttl or time.monotonic() < expires_at:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return embedding
+            del self._entries[key]
+            self.expirations += 1
+
+        persistent = (
+            self.persistent if self.persistent and self.persistent.enabled else None
+        )
+        text_hash = EmbeddingCacheRepository.hash_text(query)
+        embedding = None
+        if persistent is not None:
+            embedding = (await persistent.lookup([text_hash])).get(text_hash)
+            if embedding is not None:
+                self.persistent_hits += 1
+                self._used.add(text_hash)
+        if embedding is None:
+            self.misses += 1
+            embedding = await self.embedder.embed(query)
+            if persistent is not None:
+                self._new[text_hash] = embedding
+        if persistent is not None and (
+            self._flush_task is None or self._flush_task.done()
+        ):
+            self._flush_task = asyncio.create_task(self._flush(persistent))
+        self._put(key, embedding)
+        return embedding
+
+    async def _flush(self, persistent: EmbeddingCacheRepository) -> None:
+        # Lookups made while a batch is written are written in the next one
+        while self._new or self._used:
+            new, self._new = self._new, {}
+            used, self._used = self._used, set()
+            try:
+                if new:
+                    await persistent.put(new)
+                await persistent.touch(list(used))
+            except Exception:
+                # The persistent cache only saves embedding requests
+                pass
+
+    async def close(self) -> None:
+        """Wait for the pending writes to the persistent cache."""
+        if self._flush_task is not None:
+            await self._flush_task
+            self._flush_task = None
+
+    def _put(self, key: tuple, embedding: list[float]) -> None:
+        if self.max_entries <= 0:
+            return
+        self._entries[key] = (time.monotonic() + self.ttl, embedding)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+            self.evictions += 1
+
+    def clear(self) -> None:
+        """Drop every cached query embedding, keeping the metrics."""
+        self._entries.clear()
+
+    @property
+    def metrics(self) -> dict[str, float]:
+        """Hit and miss counts and hit rate since the cache was created.
+
+        `hits` are served from memory, `persistent_hits` from the database and
+        `misses` by the embedder.
+        """
+        lookups = self.hits + self.persistent_hits + self.misses
+        return {
+            "entries": len(self._entries),
+            "hits": self.hits,
+            "persistent_hits": self.persistent_hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "expirations": self.expirations,
+            "hit_rate": (self.hits + self.persistent_hits) / lookups
+            if lookups
+            else 0.0,
+        }
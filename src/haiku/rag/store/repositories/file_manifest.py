@@ -0,0 +1,97 @@
+import sqlite3
+from collections.abc import Sequence
+
+from haiku.rag.store.engine import Store
+from haiku.rag.store.models.file_manifest import FileManifestEntry
+from haiku.rag.store.repositories.base import MAX_QUERY_PARAMS
+
+
+class FileManifestRepository:
+    """Repository for the manifest of monitored files.
+
+    The manifest records the size, modification time and MD5 of every file
+    the monitor ingested, so that files whose stat data did not change are
+    skipped without being read.
+    """
+
+    def __init__(self, store: Store):
+        self.store = store
+
+    async def list_all(self) -> dict[str, FileManifestEntry]:
+        """All manifest entries by URI."""
+        return await self.store.read(self._list_all)
+
+    @staticmethod
+    def _list_all(connection: sqlite3.Connection) -> dict[str, FileManifestEntry]:
+        cursor = connection.cursor()
+        cursor.execute("SELECT uri, size, mtime_ns, md5 FROM file_manifest")
+        return {
+            uri: FileManifestEntry(uri=uri, size=size, mtime_ns=mtime_ns, md5=md5)
+            for uri, size, mtime_ns, md5 in cursor.fetchall()
+        }
+
+    async def get_by_size(self, sizes: Sequence[int]) -> list[FileManifestEntry]:
+        """Entries of files with one of the given sizes."""
+        return await self.store.read(self._get_by_size, sizes)
+
+    @staticmethod
+    def _get_by_size(
+        connection: sqlite3.Connection, sizes: Sequence[int]
+    ) -> list[FileManifestEntry]:
+        cursor = connection.cursor()
+        entries = []
+        unique_sizes = list(dict.fromkeys(sizes))
+        for i in range(0, len(unique_sizes), MAX_QUERY_PARAMS):
+            batch = unique_sizes[i : i + MAX_QUERY_PARAMS]
+            placeholders = ",".join("?" * len(batch))
+            cursor.execute(
+                f"""
+                SELECT uri, size, mtime_ns, md5 FROM file_manifest
+                WHERE size IN ({placeholders})
+                """,
+                batch,
+            )
+            entries.extend(
+                FileManifestEntry(uri=uri, size=size, mtime_ns=mtime_ns, md5=md5)
+                for uri, size, mtime_ns, md5 in cursor.fetchall()
+            )
+        return entries
+
+    async def upsert_many(self, entries: Sequence[FileManifestEntry]) -> None:
+        """Insert or replace manifest entries."""
+        if entries:
+            await self.store.write(self._upsert_many, entries)
+
+    @staticmethod
+    def _upsert_many(
+        connection: sqlite3.Connection, entries: Sequence[FileManifestEntry]
+    ) -> None:
+        cursor = connection.cursor()
+        cursor.executemany(
+            """
+            INSERT OR REPLACE INTO file_manifest (uri, size, mtime_ns, md5)
+            VALUES (?, ?, ?, ?)
+            """,
+            [(entry.uri, entry.size, entry.mtime_ns, entry.md5) for entry in entries],
+        )
+        connection.commit()
+
+    async def delete_many(self, uris: Sequence[str]) -> int:
+        """Delete the entries of several files. Returns the number deleted."""
+        if not uris:
+            return 0
+        return await self.store.write(self._delete_many, uris)
+
+    @staticmethod
+    def _delete_many(connection: sqlite3.Connection, uris: Sequence[str]) -> int:
+        cursor = connection.cursor()
+        deleted = 0
+        for i in range(0, len(uris), MAX_QUERY_PARAMS):
+            batch = list(uris[i : i + MAX_QUERY_PARAMS])
+            placeholders = ",".join("?" * len(batch))
+            cursor.execute(
+                f"DELETE FROM file_manifest WHERE uri IN ({placeholders})", batch
+            )
+            deleted += cursor.rowcount
+        connection.commit()
+        return deleted
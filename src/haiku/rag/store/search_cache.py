@@ -0,0 +1,81 @@
+import sys
+from collections import OrderedDict
+from collections.abc import Hashable
+
+from haiku.rag.config import Config
+from haiku.rag.store.models.chunk import SearchResults
+
+# Estimated memory of a cached result besides the chunk content
+RESULT_OVERHEAD = 1024
+
+
+class SearchCache:
+    """In-memory LRU cache of search results for the current store version.
+
+    Results are keyed by the search arguments and stored with the
+    `Store.version()` they were computed at. Once a write, of this or another
+    process, bumps the version, older results are dropped, including those of
+    searches that were still running. The cache is bounded by an estimate of
+    the memory used by the results, `max_size` bytes. Results are copied in
+    and out, so callers may modify the chunks they are returned.
+    """
+
+    def __init__(self, max_size: int = Config.SEARCH_CACHE_MAX_SIZE):
+        self.max_size = max_size
+        self._entries: OrderedDict[Hashable, tuple[SearchResults, int]] = OrderedDict()
+        self._version = 0
+        self._size = 0
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key: Hashable, version: int) -> SearchResults | None:
+        """Return the cached results of a search at `version`, or None."""
+        self._advance(version)
+        entry = self._entries.get(key) if version == self._version else None
+        if entry is None:
+            self.misses += 1
+            return None
+        self._entries.move_to_end(key)
+        self.hits += 1
+        return self._copy(entry[0])
+
+    def put(self, key: Hashable, version: int, results: SearchResults) -> None:
+        """Store the results of a search started at `version`."""
+        self._advance(version)
+        size = self._estimate_size(results)
+        if version != self._version or size > self.max_size:
+            return
+        previous = self._entries.pop(key, None)
+        if previous is not None:
+            self._size -= previous[1]
+        self._entries[key] = (self._copy(results), size)
+        self._size += size
+        while self._size > self.max_size:
+            _, (_, evicted) = self._entries.popitem(last=False)
+            self._size -= evicted
+
+    def clear(self) -> None:
+        self._entries.clear()
+        self._size = 0
+
+    @property
+    def size(self) -> int:
+        """Estimated memory used by the cached results, in bytes."""
+        return self._size
+
+    def _advance(self, version: int) -> None:
+        if version > self._version:
+            self._version = version
+            self.clear()
+
+    @staticmethod
+    def _copy(results: SearchResults) -> SearchResults:
+        return SearchResults(
+            (chunk.model_copy(deep=True), score) for chunk, score in results
+        )
+
+    @staticmethod
+    def _estimate_size(results: SearchResults) -> int:
+        return sum(
+            sys.getsizeof(chunk.content) + RESULT_OVERHEAD for chunk, _ in results
+        )
@@ -0,0 +1,566 @@
+import sqlite3
+import threading
+from abc import ABC, abstractmethod
+from collections.abc import Sequence
+from pathlib import Path
+from typing import Any
+
+from haiku.rag.config import Config
+
+
+class VectorIndex(ABC):
+    """In-process nearest neighbour index over the chunk embeddings.
+
+    The embeddings in the database stay the source of truth. Changes made by a
+    write are staged with `add` and `remove`, and only become visible to
+    searches once the Store `commit`s them after the write's transaction
+    ended, or are dropped with `rollback` if it failed.
+    """
+
+    def __init__(self, dim: int):
+        self.dim = dim
+        self._staged: list[tuple[str, Any, Any]] = []
+        self._lock = threading.RLock()
+
+    def load(
+        self, connection: sqlite3.Connection, table: str = "chunk_embeddings"
+    ) -> None:
+        """Replace the index content with the float32 embeddings in `table`."""
+        cursor = connection.cursor()
+        cursor.execute(f"SELECT COUNT(*) FROM {table}")
+        (count,) = cursor.fetchone()
+        cursor.execute(f"SELECT chunk_id, embedding FROM {table}")
+        with self._lock:
+            self._staged = []
+            self._load(count, cursor)
+
+    def add(self, ids: Sequence[int], embeddings: Sequence[bytes]) -> None:
+        """Stage serialized embeddings of new or updated chunks."""
+        self._staged.append(("add", list(ids), list(embeddings)))
+
+    def remove(self, ids: Sequence[int]) -> None:
+        """Stage the removal of chunks."""
+        self._staged.append(("remove", list(ids), None))
+
+    def clear(self) -> None:
+        """Stage the removal of all chunks."""
+        self._staged.append(("clear", None, None))
+
+    def commit(self) -> None:
+        """Apply the staged changes."""
+        with self._lock:
+            staged, self._staged = self._staged, []
+            for operation, ids, embeddings in staged:
+                if operation == "add":
+                    self._add(ids, embeddings)
+                elif operation == "remove":
+                    self._remove(ids)
+                else:
+                    self._clear()
+
+    def rollback(self) -> None:
+        """Drop the staged changes."""
+        self._staged = []
+
+    def save(self) -> None:
+        """Persist the index, for indexes that are expensive to build."""
+        pass
+
+    def search(
+        self,
+        embedding: Sequence[float],
+        limit: int,
+        nprobe: int | None = None,
+        ids: Sequence[int] | None = None,
+    ) -> list[tuple[int, float]]:
+        """Return the (chunk id, L2 distance) of the nearest chunks.
+
+        `nprobe` trades recall for speed in approximate indexes, and is
+        ignored by exact ones. With `ids`, only those chunks are searched,
+        exactly.
+        """
+        if ids is not None:
+            return self._search_ids(embedding, limit, ids)
+        [results] = self.search_batch([embedding], limit, nprobe)
+        return results
+
+    @abstractmethod
+    def search_batch(
+        self,
+        embeddings: Sequence[Sequence[float]],
+        limit: int,
+        nprobe: int | None = None,
+    ) -> list[list[tuple[int, float]]]:
+        """Search the nearest chunks of several query embeddings at once."""
+        pass
+
+    @abstractmethod
+    def _search_ids(
+        self, embedding: Sequence[float], limit: int, ids: Sequence[int]
+    ) -> list[tuple[int, float]]:
+        pass
+
+    @abstractmethod
+    def __len__(self) -> int:
+        pass
+
+    @abstractmethod
+    def _load(self, count: int, rows: sqlite3.Cursor) -> None:
+        pass
+
+    @abstractmethod
+    def _add(self, ids: list[int], embeddings: list[bytes]) -> None:
+        pass
+
+    @abstractmethod
+    def _remove(self, ids: list[int]) -> None:
+        pass
+
+    @abstractmethod
+    def _clear(self) -> None:
+        pass
+
+
+class NumpyVectorIndex(VectorIndex):
+    """Exact search over a contiguous float32 matrix of all embeddings.
+
+    Distances are computed for every chunk with a single matrix product, and
+    the nearest ones are selected with `argpartition`. Memory use is four
+    bytes per dimension and chunk.
+    """
+
+    def __init__(self, dim: int):
+        super().__init__(dim)
+        import numpy as np
+
+        self._np = np
+        self._vectors = np.empty((0, dim), dtype=np.float32)
+        # Squared norms of the vectors, to compute L2 distances from dot products
+        self._norms = np.empty(0, dtype=np.float32)
+        self._ids = np.empty(0, dtype=np.int64)
+        self._rows: dict[int, int] = {}
+        self._size = 0
+
+    def __len__(self) -> int:
+        return self._size
+
+    def _load(self, count: int, rows: sqlite3.Cursor) -> None:
+        np = self._np
+        self._clear()
+        self._reserve(count)
+        for row, (chunk_id, blob) in enumerate(rows):
+            self._vectors[row] = np.frombuffer(blob, dtype=np.float32)
+            self._ids[row] = chunk_id
+            self._rows[chunk_id] = row
+        self._size = len(self._rows)
+        self._norms[: self._size] = np.einsum(
+            "ij,ij->i", self._vectors[: self._size], self._vectors[: self._size]
+        )
+
+    def _reserve(self, capacity: int) -> None:
+        np = self._np
+        if capacity <= len(self._ids):
+            return
+        # Grow geometrically so that appending rows is amortized constant time
+        capacity = max(capacity, 2 * len(self._ids), 1024)
+        vectors = np.empty((capacity, self.dim), dtype=np.float32)
+        vectors[: self._size] = self._vectors[: self._size]
+        norms = np.empty(capacity, dtype=np.float32)
+        norms[: self._size] = self._norms[: self._size]
+        ids = np.empty(capacity, dtype=np.int64)
+        ids[: self._size] = self._ids[: self._size]
+        self._vectors, self._norms, self._ids = vectors, norms, ids
+
+    def _add(self, ids: list[int], embeddings: list[bytes]) -> None:
+        np = self._np
+        vectors = np.frombuffer(b"".join(embeddings), dtype=np.float32).reshape(
+            len(embeddings), self.dim
+        )
+        self._reserve(self._size + len(ids))
+        for chunk_id, vector in zip(ids, vectors):
+            row = self._rows.get(chunk_id)
+            if row is None:
+                row = self._size
+                self._size += 1
+                self._rows[chunk_id] = row
+                self._ids[row] = chunk_id
+            self._vectors[row] = vector
+            self._norms[row] = vector @ vector
+
+    def _remove(self, ids: list[int]) -> None:
+        for chunk_id in ids:
+            row = self._rows.pop(chunk_id, None)
+            if row is None:
+                continue
+            # Move the last row into the hole to keep the matrix contiguous
+            last = self._size - 1
+            if row != last:
+                moved_id = int(self._ids[last])
+                self._vectors[row] = self._vectors[last]
+                self._norms[row] = self._norms[last]
+                self._ids[row] = moved_id
+                self._rows[moved_id] = row
+            self._size = last
+
+    def _clear(self) -> None:
+        self._rows = {}
+        self._size = 0
+
+    def search_batch(
+        self,
+        embeddings: Sequence[Sequence[float]],
+        limit: int,
+        nprobe: int | None = None,
+    ) -> list[list[tuple[int, float]]]:
+        queries = self._as_queries(embeddings)
+        with self._lock:
+            size = self._size
+            distances = self._norms[:size] - 2 * (queries @ self._vectors[:size].T)
+            return self._nearest(queries, distances, self._ids[:size], limit)
+
+    def _search_ids(
+        self, embedding: Sequence[float], limit: int, ids: Sequence[int]
+    ) -> list[tuple[int, float]]:
+        np = self._np
+        queries = self._as_queries([embedding])
+        with self._lock:
+            rows = np.fromiter(
+                (
+                    row
+                    for chunk_id in ids
+                    if (row := self._rows.get(chunk_id)) is not None
+                ),
+                dtype=np.int64,
+            )
+            distances = self._norms[rows] - 2 * (self._vectors[rows] @ queries[0])
+            [results] = self._nearest(
+                queries, distances[None, :], self._ids[rows], limit
+            )
+            return results
+
+    def _as_queries(self, embeddings: Sequence[Sequence[float]]) -> Any:
+        return self._np.asarray(embeddings, dtype=self._np.float32).reshape(
+            -1, self.dim
+        )
+
+    def _nearest(
+        self, queries: Any, distances: Any, ids: Any, limit: int
+    ) -> list[list[tuple[int, float]]]:
+        """Select the nearest of the candidate `ids` for each query.
+
+        `distances` are the squared L2 distances to the candidates minus the
+        squared norm of the query, ||q - x||² = ||q||² - 2 q·x + ||x||², as
+        that term does not change the order.
+        """
+        np = self._np
+        k = min(limit, distances.shape[1])
+        if k <= 0:
+            return [[] for _ in range(len(queries))]
+        nearest = np.argpartition(distances, k - 1, axis=1)[:, :k]
+        nearest_distances = np.take_along_axis(distances, nearest, axis=1)
+        order = np.argsort(nearest_distances, axis=1)
+        nearest = np.take_along_axis(nearest, order, axis=1)
+        nearest_distances = np.take_along_axis(nearest_distances, order, axis=1)
+
+        query_norms = np.einsum("ij,ij->i", queries, queries)
+        nearest_distances = np.sqrt(
+            np.maximum(nearest_distances + query_norms[:, None], 0)
+        )
+        return [
+            list(zip(row_ids.tolist(), row_distances.tolist()))
+            for row_ids, row_distances in zip(ids[nearest], nearest_distances)
+        ]
+
+
+class IvfFlatIndex(NumpyVectorIndex):
+    """Approximate search over inverted lists of k-means clusters (IVF-flat).
+
+    Embeddings are assigned to the nearest of `nlist` centroids, and a search
+    only scans the lists of the `nprobe` centroids nearest to the query.
+    Below `min_train_size` chunks, or until it is trained, the index searches
+    exhaustively. It is trained again when it grew fourfold since training.
+
+    Once trained, the matrix rows are sorted by list so that each list is a
+    contiguous slice. Added chunks are appended to an unsorted tail that every
+    search scans, and removed ones are left as tombstones, until either makes
+    up a tenth of the index and the rows are sorted again.
+
+    Centroids and list assignments are saved to `path` after training and by
+    `save`, unless `read_only`. On load, they are reconciled with the
+    embeddings in the database, so that a stale or missing file only costs
+    assigning or training again.
+    """
+
+    def __init__(
+        self,
+        dim: int,
+        path: Path | None = None,
+        nlist: int = 0,
+        nprobe: int = 16,
+        min_train_size: int = 10_000,
+        read_only: bool = False,
+    ):
+        super().__init__(dim)
+        self.path = path
+        self.read_only = read_only
+        # 0 picks sqrt(chunks) lists when training
+        self.nlist = nlist
+        self.nprobe = nprobe
+        self.min_train_size = min_train_size
+        self._centroids: Any = None
+        self._lists = self._np.empty(0, dtype=self._np.int32)
+        # Start row of each list, followed by the start of the unsorted tail
+        self._offsets: Any = None
+        self._tombstones = 0
+        self._trained_size = 0
+
+    @property
+    def trained(self) -> bool:
+        return self._centroids is not None
+
+    def __len__(self) -> int:
+        return len(self._rows)
+
+    def _load(self, count: int, rows: sqlite3.Cursor) -> None:
+        super()._load(count, rows)
+        if self.path is not None and self.path.exists():
+            self._read(self.path)
+        if self.trained:
+            self._sort()
+        self._train_if_needed()
+
+    def _read(self, path: Path) -> None:
+        np = self._np
+        with np.load(path) as saved:
+            centroids = saved["centroids"]
+            if centroids.ndim != 2 or centroids.shape[1] != self.dim:
+                return
+            saved_lists = dict(zip(saved["ids"].tolist(), saved["lists"].tolist()))
+            self._trained_size = int(saved["trained_size"])
+        self._centroids = centroids.astype(np.float32)
+
+        # Chunks written since the file was saved are assigned again
+        size = self._size
+        lists = np.array(
+            [saved_lists.get(chunk_id, -1) for chunk_id in self._ids[:size].tolist()],
+            dtype=np.int32,
+        )
+        missing = np.flatnonzero(lists < 0)
+        lists[missing] = self._assign(self._vectors[missing])
+        self._lists[:size] = lists
+
+    def save(self) -> None:
+        if self.path is None or self.read_only or not self.trained:
+            return
+        with self._lock:
+            live = self._ids[: self._size] >= 0
+            temp_path = self.path.with_name(f".{self.path.name}.tmp")
+            with open(temp_path, "wb") as f:
+                self._np.savez(
+                    f,
+                    centroids=self._centroids,
+                    ids=self._ids[: self._size][live],
+                    lists=self._lists[: self._size][live],
+                    trained_size=self._trained_size,
+                )
+            temp_path.replace(self.path)
+
+    def commit(self) -> None:
+        with self._lock:
+            super().commit()
+            if not self.trained:
+                self._train_if_needed()
+                return
+            unsorted = self._size - self._offsets[-1] + self._tombstones
+            if unsorted > len(self._rows) // 10:
+                self._sort()
+                self._train_if_needed()
+
+    def _reserve(self, capacity: int) -> None:
+        super()._reserve(capacity)
+        if len(self._lists) < len(self._ids):
+            lists = self._np.empty(len(self._ids), dtype=self._np.int32)
+            lists[: len(self._lists)] = self._lists
+            self._lists = lists
+
+    def _add(self, ids: list[int], embeddings: list[bytes]) -> None:
+        if not self.trained:
+            super()._add(ids, embeddings)
+            return
+        # Updated chunks move to the tail, as they may belong to another list
+        self._remove([chunk_id for chunk_id in ids if chunk_id in self._rows])
+        start = self._size
+        super()._add(ids, embeddings)
+        self._lists[start : self._size] = self._assign(
+            self._vectors[start : self._size]
+        )
+
+    def _remove(self, ids: list[int]) -> None:
+        if not self.trained:
+            super()._remove(ids)
+            return
+        # Rows stay in place so that the lists remain sorted
+        for chunk_id in ids:
+            row = self._rows.pop(chunk_id, None)
+            if row is None:
+                continue
+            self._ids[row] = -1
+            self._norms[row] = self._np.inf
+            self._tombstones += 1
+
+    def _clear(self) -> None:
+        super()._clear()
+        self._centroids = None
+        self._offsets = None
+        self._tombstones = 0
+        self._trained_size = 0
+
+    def _sort(self) -> None:
+        """Drop tombstones and sort the rows by list."""
+        np = self._np
+        size = self._size
+        live = np.flatnonzero(self._ids[:size] >= 0)
+        order = live[np.argsort(self._lists[live], kind="stable")]
+        count = len(order)
+        self._vectors[:count] = self._vectors[order]
+        self._norms[:count] = self._norms[order]
+        self._ids[:count] = self._ids[order]
+        self._lists[:count] = self._lists[order]
+        self._size = count
+        self._tombstones = 0
+        self._rows = dict(zip(self._ids[:count].tolist(), range(count)))
+        self._offsets = np.searchsorted(
+            self._lists[:count], np.arange(len(self._centroids) + 1)
+        )
+
+    def _assign(self, vectors: Any) -> Any:
+        """Return the nearest centroid of each vector."""
+        np = self._np
+        assigned = np.empty(len(vectors), dtype=np.int32)
+        centroid_norms = np.einsum("ij,ij->i", self._centroids, self._centroids)
+        # Bound the size of the distance matrix
+        for start in range(0, len(vectors), 4096):
+            batch = vectors[start : start + 4096]
+            distances = centroid_norms - 2 * (batch @ self._centroids.T)
+            assigned[start : start + len(batch)] = np.argmin(distances, axis=1)
+        return assigned
+
+    def _train_if_needed(self) -> None:
+        if len(self._rows) < self.min_train_size:
+            return
+        if self.trained and len(self._rows) < 4 * self._trained_size:
+            return
+        self.train()
+
+    def train(self, iterations: int = 10) -> None:
+        """Cluster the embeddings with k-means and sort them into lists.
+
+        Centroids are fitted on a sample of at most 64 vectors per list.
+        """
+        np = self._np
+        with self._lock:
+            if self.trained:
+                self._sort()
+            size = self._size
+            nlist = self.nlist or int(np.sqrt(size))
+            nlist = max(1, min(nlist, size))
+            rng = np.random.default_rng(0)
+            sample_size = min(size, 64 * nlist)
+            sample = self._vectors[rng.choice(size, sample_size, replace=False)]
+            self._centroids = sample[
+                rng.choice(sample_size, nlist, replace=False)
+            ].copy()
+
+            for _ in range(iterations):
+                assigned = self._assign(sample)
+                counts = np.bincount(assigned, minlength=nlist)
+                sums = np.zeros_like(self._centroids)
+                np.add.at(sums, assigned, sample)
+                empty = counts == 0
+                self._centroids[~empty] = sums[~empty] / counts[~empty, None]
+                # Restart empty clusters from random sample vectors
+                self._centroids[empty] = sample[
+                    rng.choice(sample_size, int(empty.sum()), replace=False)
+                ]
+
+            self._lists[:size] = self._assign(self._vectors[:size])
+            self._sort()
+            self._trained_size = size
+        self.save()
+
+    def search_batch(
+        self,
+        embeddings: Sequence[Sequence[float]],
+        limit: int,
+        nprobe: int | None = None,
+    ) -> list[list[tuple[int, float]]]:
+        np = self._np
+        with self._lock:
+            if not self.trained:
+                return super().search_batch(embeddings, limit)
+            queries = self._as_queries(embeddings)
+            offsets = self._offsets
+            nprobe = max(1, min(nprobe or self.nprobe, len(self._centroids)))
+            centroid_norms = np.einsum("ij,ij->i", self._centroids, self._centroids)
+            centroid_distances = centroid_norms - 2 * (queries @ self._centroids.T)
+            probes = np.argpartition(centroid_distances, nprobe - 1, axis=1)[:, :nprobe]
+
+            results = []
+            for query, query_probes in zip(queries, probes):
+                slices = [
+                    slice(offsets[probe], offsets[probe + 1])
+                    for probe in query_probes.tolist()
+                ]
+                slices.append(slice(offsets[-1], self._size))
+                distances = np.concatenate(
+                    [
+                        self._norms[rows] - 2 * (self._vectors[rows] @ query)
+                        for rows in slices
+                    ]
+                )
+                ids = np.concatenate([self._ids[rows] for rows in slices])
+                [nearest] = self._nearest(
+                    query[None, :], distances[None, :], ids, limit
+                )
+                # Tombstones are at an infinite distance
+                results.append(
+                    [
+                        (chunk_id, distance)
+                        for chunk_id, distance in nearest
+                        if chunk_id >= 0
+                    ]
+                )
+            return results
+
+
+def get_vector_index(
+    engine: str, dim: int, path: Path | None = None, read_only: bool = False
+) -> VectorIndex | None:
+    """Create the in-process index of a vector engine, None for sqlite-vec.
+
+    Indexes that are expensive to build are loaded from and, unless
+    `read_only`, saved to `path`.
+    """
+    if engine == "vec0":
+        return None
+
+    if engine in ("numpy", "ivf"):
+        try:
+            import numpy  # noqa: F401
+        except ImportError:
+            raise ImportError(
+                f"The {engine} vector engine requires the 'numpy' package. "
+                "Please install haiku.rag with the 'numpy' extra:"
+                "uv pip install haiku.rag --extra numpy"
+            )
+        if engine == "ivf":
+            return IvfFlatIndex(
+                dim,
+                path,
+                nlist=Config.IVF_NLIST,
+                nprobe=Config.IVF_NPROBE,
+                read_only=read_only,
+            )
+        return NumpyVectorIndex(dim)
+
+    raise ValueError(f"Unsupported vector engine: {engine}")
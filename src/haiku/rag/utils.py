@@ -1,3 +1,4 @@
+import hashlib
 import sys
 from pathlib import Path
 
@@ -23,3 +24,19 @@ def get_default_data_dir() -> Path:
 
     data_path = system_paths[sys.platform]
     return data_path
+
+
+def md5_file(path: Path, block_size: int = 1024 * 1024) -> str:
+    """
+    Compute the MD5 of a file, reading it in blocks.
+
+    :param path: File to hash
+    :param block_size: Number of bytes read at a time
+    :return: Hex digest of the file content
+    :rtype: str
+    """
+    md5 = hashlib.md5()
+    with path.open("rb") as f:
+        while block := f.read(block_size):
+            md5.update(block)
+    return md5.hexdigest()
@@ -0,0 +1,185 @@
+"""Measure hybrid search latency on queries of frequent and rare terms.
+
+Usage: python tests/benchmark_hybrid_search.py [--chunks N [N ...]]
+    [--queries N] [--embed-latency MS]
+
+Chunks are random texts over a small vocabulary with random embeddings, so no
+embedding provider is needed. Every chunk contains the word "common", a tenth
+of them "frequent" and a thousandth "rare", which sets the number of chunks
+matched by the full-text half of each query.
+
+The store is searched directly, then end to end through
+`search_chunks_hybrid` with an embedder answering after `--embed-latency`
+milliseconds, during which the full-text search runs.
+"""
+
+import argparse
+import asyncio
+import random
+import statistics
+import tempfile
+import time
+from pathlib import Path
+
+from rich.console import Console
+from rich.table import Table
+
+from haiku.rag.config import Config
+from haiku.rag.embeddings.base import EmbedderBase
+from haiku.rag.store.engine import Store
+from haiku.rag.store.models.chunk import Chunk
+from haiku.rag.store.repositories.chunk import ChunkRepository
+
+console = Console()
+
+INSERT_BATCH_SIZE = 10_000
+LIMIT = 5
+WORDS = "alpha beta gamma delta epsilon zeta eta theta iota kappa lambda mu".split()
+QUERIES = {
+    "common": "common alpha",
+    "frequent": "frequent",
+    "rare": "rare",
+}
+
+
+def random_text(index: int) -> str:
+    words = random.choices(WORDS, k=200) + ["common"]
+    if index % 10 == 0:
+        words.append("frequent")
+    if index % 1000 == 0:
+        words.append("rare")
+    return " ".join(words)
+
+
+def populate(db_path: Path, chunks: int) -> None:
+    store = Store(db_path, readers=0)
+    repository = ChunkRepository(store)
+    connection = store._connection
+    assert connection is not None
+    random.seed(0)
+    dim = Config.EMBEDDINGS_VECTOR_DIM
+    connection.execute("INSERT INTO documents (content) VALUES ('benchmark')")
+    for start in range(0, chunks, INSERT_BATCH_SIZE):
+        ids = range(start + 1, min(start + INSERT_BATCH_SIZE, chunks) + 1)
+        texts = [random_text(chunk_id) for chunk_id in ids]
+        connection.executemany(
+            "INSERT INTO chunks (id, document_id, content) VALUES (?, 1, ?)",
+            zip(ids, texts),
+        )
+        connection.executemany(
+            "INSERT INTO chunks_fts (rowid, content) VALUES (?, ?)", zip(ids, texts)
+        )
+        repository._insert_embeddings(
+            connection.cursor(),
+            list(ids),
+            [
+                store.serialize_embedding([random.random() for _ in range(dim)])
+                for _ in ids
+            ],
+        )
+    connection.commit()
+    store.close()
+
+
+def search_sequentially(
+    chunks: ChunkRepository, connection, query: str, embedding: bytes
+) -> list[tuple[Chunk, float]]:
+    """Run both retrievals of a hybrid search one after the other, fuse them
+    and load the chunks, all on one connection."""
+    candidates = LIMIT * max(1, Config.HYBRID_CANDIDATE_FACTOR)
+    hits = chunks._find_nearest(connection, embedding, candidates)
+    matches = chunks._find_matches(connection, query, candidates)
+    results = chunks._fuse(hits, matches, LIMIT, 60, None)
+    loaded = chunks._get_chunks(connection, [chunk_id for chunk_id, _ in results])
+    return [(loaded[chunk_id], score) for chunk_id, score in results]
+
+
+class SlowEmbedder(EmbedderBase):
+    def __init__(self, latency: float):
+        super().__init__("benchmark", Config.EMBEDDINGS_VECTOR_DIM)
+        self.latency = latency
+
+    async def embed(self, text: str) -> list[float]:
+        await asyncio.sleep(self.latency / 1000)
+        return [random.random() for _ in range(Config.EMBEDDINGS_VECTOR_DIM)]
+
+
+async def search_end_to_end(
+    chunks: ChunkRepository, query: str, count: int
+) -> list[dict[str, float]]:
+    return [
+        (await chunks.search_chunks_hybrid(query, LIMIT)).timings for _ in range(count)
+    ]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--chunks", type=int, nargs="+", default=[10_000, 100_000])
+    parser.add_argument("--queries", type=int, default=20)
+    parser.add_argument("--embed-latency", type=float, default=50)
+    args = parser.parse_args()
+
+    table = Table(title=f"Hybrid search, top {LIMIT}")
+    table.add_column("Chunks", justify="right")
+    table.add_column("Query")
+    table.add_column("FTS matches", justify="right")
+    table.add_column("p50 ms", justify="right")
+    table.add_column("max ms", justify="right")
+    end_to_end = Table(
+        title=f"End to end, embedding in {args.embed_latency:g}ms (p50 ms)"
+    )
+    end_to_end.add_column("Chunks", justify="right")
+    end_to_end.add_column("Query")
+    for column in ["embed", "fts", "vector", "total"]:
+        end_to_end.add_column(column, justify="right")
+
+    for count in args.chunks:
+        with tempfile.TemporaryDirectory() as temp_dir:
+            db_path = Path(temp_dir) / "benchmark.sqlite"
+            populate(db_path, count)
+            store = Store(db_path, readers=0)
+            chunks = ChunkRepository(store)
+            connection = store._connection
+            assert connection is not None
+            embedding = store.serialize_embedding(
+                [random.random() for _ in range(Config.EMBEDDINGS_VECTOR_DIM)]
+            )
+            for name, query in QUERIES.items():
+                (matches,) = connection.execute(
+                    "SELECT COUNT(*) FROM chunks_fts WHERE chunks_fts MATCH ?",
+                    (" OR ".join(query.split()),),
+                ).fetchone()
+                latencies = []
+                for _ in range(args.queries):
+                    start = time.perf_counter()
+                    search_sequentially(chunks, connection, query, embedding)
+                    latencies.append((time.perf_counter() - start) * 1000)
+                table.add_row(
+                    f"{count:,}",
+                    name,
+                    f"{matches:,}",
+                    f"{statistics.median(latencies):.1f}",
+                    f"{max(latencies):.1f}",
+                )
+            store.close()
+
+            store = Store(db_path)
+            chunks = ChunkRepository(store, SlowEmbedder(args.embed_latency))
+            for name, query in QUERIES.items():
+                timings = asyncio.run(search_end_to_end(chunks, query, args.queries))
+                end_to_end.add_row(
+                    f"{count:,}",
+                    name,
+                    *(
+                        f"{statistics.median(t[step] for t in timings):.1f}"
+                        for step in ["embed", "fts", "vector", "total"]
+                    ),
+                )
+            store.close()
+
+    console.print(table)
+    console.print(end_to_end)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,149 @@
+"""Measure search latency while another connection ingests into the same database.
+
+Usage: python tests/benchmark_store.py [--documents N] [--duration SECONDS]
+    [--write-rate DOCUMENTS_PER_SECOND]
+
+Embeddings are random vectors, so no embedding provider is needed.
+"""
+
+import argparse
+import random
+import statistics
+import tempfile
+import threading
+import time
+from pathlib import Path
+
+from rich.console import Console
+from rich.table import Table
+
+from haiku.rag.config import Config
+from haiku.rag.store.engine import ConnectionProfile, Store
+from haiku.rag.store.models.document import Document
+from haiku.rag.store.repositories.chunk import ChunkRepository
+from haiku.rag.store.repositories.document import DocumentRepository
+
+console = Console()
+
+CHUNKS_PER_DOCUMENT = 20
+WORDS = "alpha beta gamma delta epsilon zeta eta theta iota kappa lambda mu".split()
+
+PROFILES = {
+    "rollback journal": ConnectionProfile(
+        journal_mode="DELETE",
+        synchronous="FULL",
+        cache_size=-2_000,
+        mmap_size=0,
+        temp_store="DEFAULT",
+    ),
+    "default (WAL)": ConnectionProfile(),
+}
+
+
+def random_vector(dim: int) -> list[float]:
+    return [random.random() for _ in range(dim)]
+
+
+def random_text() -> str:
+    return " ".join(random.choices(WORDS, k=50))
+
+
+def insert_document(documents: DocumentRepository, connection) -> None:
+    texts = [random_text() for _ in range(CHUNKS_PER_DOCUMENT)]
+    embeddings = [random_vector(Config.EMBEDDINGS_VECTOR_DIM) for _ in texts]
+    documents._create(connection, Document(content=" ".join(texts)), texts, embeddings)
+
+
+def percentile(values: list[float], p: float) -> float:
+    return statistics.quantiles(values, n=100)[int(p) - 1] if len(values) > 1 else 0
+
+
+def run(
+    profile: ConnectionProfile,
+    db_path: Path,
+    duration: float,
+    with_writer: bool,
+    write_rate: float,
+) -> dict[str, float]:
+    reader = Store(db_path, profile=profile)
+    chunks = ChunkRepository(reader)
+    stop = threading.Event()
+    writes = 0
+
+    def write():
+        nonlocal writes
+        writer = Store(db_path, profile=profile)
+        documents = DocumentRepository(writer, ChunkRepository(writer))
+        # Ingest at a fixed rate so that both profiles do the same write work
+        while not stop.wait(1 / write_rate):
+            insert_document(documents, writer._connection)
+            writes += 1
+        writer.close()
+
+    writer_thread = threading.Thread(target=write)
+    if with_writer:
+        writer_thread.start()
+
+    latencies = []
+    start = time.perf_counter()
+    while time.perf_counter() - start < duration:
+        query = reader.serialize_embedding(random_vector(Config.EMBEDDINGS_VECTOR_DIM))
+        query_start = time.perf_counter()
+        chunks._search_chunks(reader._connection, query, 5)
+        chunks._search_chunks_fts(reader._connection, random.choice(WORDS), 5)
+        latencies.append((time.perf_counter() - query_start) * 1000)
+    elapsed = time.perf_counter() - start
+
+    stop.set()
+    if with_writer:
+        writer_thread.join()
+    reader.close()
+
+    return {
+        "searches/s": len(latencies) / elapsed,
+        "p50 ms": statistics.median(latencies),
+        "p95 ms": percentile(latencies, 95),
+        "max ms": max(latencies),
+        "writes/s": writes / elapsed,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--documents", type=int, default=200)
+    parser.add_argument("--duration", type=float, default=10.0)
+    parser.add_argument(
+        "--write-rate", type=float, default=10.0, help="documents ingested per second"
+    )
+    args = parser.parse_args()
+
+    table = Table(title="Search while ingesting")
+    table.add_column("Profile")
+    table.add_column("Writer")
+    for column in ["searches/s", "p50 ms", "p95 ms", "max ms", "writes/s"]:
+        table.add_column(column, justify="right")
+
+    for name, profile in PROFILES.items():
+        with tempfile.TemporaryDirectory() as temp_dir:
+            db_path = Path(temp_dir) / "benchmark.sqlite"
+            store = Store(db_path, profile=profile)
+            documents = DocumentRepository(store, ChunkRepository(store))
+            for _ in range(args.documents):
+                insert_document(documents, store._connection)
+            store.close()
+
+            for with_writer in (False, True):
+                stats = run(
+                    profile, db_path, args.duration, with_writer, args.write_rate
+                )
+                table.add_row(
+                    name,
+                    "yes" if with_writer else "no",
+                    *(f"{value:.1f}" for value in stats.values()),
+                )
+
+    console.print(table)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,194 @@
+"""Compare latency and recall of the vector engines and embedding storages.
+
+Usage: python tests/benchmark_vector_index.py [--chunks N [N ...]] [--dim DIM]
+    [--clusters N] [--nprobe N [N ...]] [--prefix-dim N] [--queries N]
+    [--batch-size N]
+
+Embeddings are random vectors drawn around `--clusters` centers, as real
+embeddings are clustered by topic, so no embedding provider is needed. Chunks
+are inserted directly into the database, and each engine runs the same queries
+through `ChunkRepository._search_chunks`. Quantized databases are searched by
+sqlite-vec and rescored with `EMBEDDINGS_RESCORE_FACTOR`, as are databases
+searching the first `--prefix-dim` dimensions. Random vectors are not trained
+to concentrate information in their first dimensions like Matryoshka
+embeddings, so prefix recall is a lower bound. Recall is the fraction of the
+exact top 10 chunks that an engine returns. Batched searches only apply to the
+in-process engines, sqlite-vec runs the queries of a batch one after the other.
+"""
+
+import argparse
+import statistics
+import tempfile
+import time
+from pathlib import Path
+
+import numpy as np
+from rich.console import Console
+from rich.table import Table
+
+from haiku.rag.config import Config
+from haiku.rag.store.engine import Store
+from haiku.rag.store.repositories.chunk import ChunkRepository
+
+console = Console()
+
+INSERT_BATCH_SIZE = 10_000
+LIMIT = 10
+# Exact float searches go first, as the reference for recall
+# (engine, quantization, whether the prefix is searched)
+ENGINES = [
+    ("vec0", "float", False),
+    ("numpy", "float", False),
+    ("ivf", "float", False),
+    ("vec0", "int8", False),
+    ("vec0", "bit", False),
+    ("vec0", "float", True),
+    ("vec0", "int8", True),
+]
+
+
+def random_vectors(rng: np.random.Generator, centers: np.ndarray, count: int):
+    if not len(centers):
+        return rng.random((count, centers.shape[1]), dtype=np.float32)
+    noise = rng.normal(scale=0.5, size=(count, centers.shape[1]))
+    return (centers[rng.integers(len(centers), size=count)] + noise).astype(np.float32)
+
+
+def populate(
+    db_path: Path,
+    chunks: int,
+    centers: np.ndarray,
+    quantization: str,
+    prefix_dim: int,
+) -> None:
+    store = Store(db_path, readers=0, quantization=quantization, prefix_dim=prefix_dim)
+    repository = ChunkRepository(store)
+    connection = store._connection
+    assert connection is not None
+    rng = np.random.default_rng(0)
+    connection.execute("INSERT INTO documents (content) VALUES ('benchmark')")
+    for start in range(0, chunks, INSERT_BATCH_SIZE):
+        ids = range(start + 1, min(start + INSERT_BATCH_SIZE, chunks) + 1)
+        vectors = random_vectors(rng, centers, len(ids))
+        connection.executemany(
+            "INSERT INTO chunks (id, document_id, content) VALUES (?, 1, ?)",
+            [(chunk_id, f"chunk {chunk_id}") for chunk_id in ids],
+        )
+        repository._insert_embeddings(
+            connection.cursor(), list(ids), [vector.tobytes() for vector in vectors]
+        )
+    connection.commit()
+    store.close()
+
+
+def run(
+    store: Store,
+    queries: np.ndarray,
+    batch_size: int,
+    nprobe: int | None,
+    expected: list[set[int]] | None,
+) -> tuple[dict[str, float], list[set[int]]]:
+    chunks = ChunkRepository(store)
+    connection = store._connection
+    assert connection is not None
+
+    latencies = []
+    found = []
+    for query in queries:
+        start = time.perf_counter()
+        results = chunks._search_chunks(connection, query.tobytes(), LIMIT, nprobe)
+        latencies.append((time.perf_counter() - start) * 1000)
+        found.append({chunk.id for chunk, _ in results})
+
+    batch_latencies = []
+    for start in range(0, len(queries), batch_size):
+        batch = queries[start : start + batch_size]
+        batch_start = time.perf_counter()
+        if store.vector_index is not None:
+            store.vector_index.search_batch(batch.tolist(), LIMIT, nprobe)
+        else:
+            for query in batch:
+                chunks._search_chunks(connection, query.tobytes(), LIMIT)
+        batch_latencies.append((time.perf_counter() - batch_start) * 1000 / len(batch))
+
+    expected = expected or found
+    recall = sum(
+        len(ids & expected_ids) for ids, expected_ids in zip(found, expected)
+    ) / sum(len(ids) for ids in expected)
+    return {
+        "p50 ms": statistics.median(latencies),
+        "max ms": max(latencies),
+        "batched ms/query": statistics.median(batch_latencies),
+        "recall@10": recall,
+    }, found
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument(
+        "--chunks", type=int, nargs="+", default=[10_000, 100_000, 1_000_000]
+    )
+    parser.add_argument("--dim", type=int, default=Config.EMBEDDINGS_VECTOR_DIM)
+    parser.add_argument(
+        "--clusters", type=int, default=1000, help="0 draws uniform vectors"
+    )
+    parser.add_argument("--nprobe", type=int, nargs="+", default=[4, 16, 64])
+    parser.add_argument("--prefix-dim", type=int, default=256)
+    parser.add_argument("--queries", type=int, default=100)
+    parser.add_argument("--batch-size", type=int, default=32)
+    args = parser.parse_args()
+
+    # Tables are created with the configured dimension
+    Config.EMBEDDINGS_VECTOR_DIM = args.dim
+
+    table = Table(title=f"Vector search, top {LIMIT} of {args.dim} dimensions")
+    table.add_column("Chunks", justify="right")
+    table.add_column("Engine")
+    table.add_column("DB MiB", justify="right")
+    table.add_column("Load s", justify="right")
+    for column in ["p50 ms", "max ms", "batched ms/query", "recall@10"]:
+        table.add_column(column, justify="right")
+
+    rng = np.random.default_rng(1)
+    centers = rng.normal(size=(args.clusters, args.dim)).astype(np.float32)
+    queries = random_vectors(rng, centers, args.queries)
+    for count in args.chunks:
+        with tempfile.TemporaryDirectory() as temp_dir:
+            expected = None
+            for engine, quantization, prefix in ENGINES:
+                prefix_dim = args.prefix_dim if prefix else 0
+                name = f"{quantization}-{prefix_dim}"
+                db_path = Path(temp_dir) / f"{name}.sqlite"
+                if not db_path.exists():
+                    populate(db_path, count, centers, quantization, prefix_dim)
+                size = sum(
+                    path.stat().st_size
+                    for path in Path(temp_dir).glob(f"{name}.sqlite*")
+                )
+                load_start = time.perf_counter()
+                store = Store(db_path, readers=0, vector_engine=engine)
+                load = time.perf_counter() - load_start
+                name = " ".join(
+                    [engine]
+                    + ([quantization] if quantization != "float" else [])
+                    + ([f"prefix {prefix_dim}"] if prefix_dim else [])
+                )
+                for nprobe in args.nprobe if engine == "ivf" else [None]:
+                    stats, found = run(
+                        store, queries, args.batch_size, nprobe, expected
+                    )
+                    expected = expected or found
+                    table.add_row(
+                        f"{count:,}",
+                        f"{name} (nprobe={nprobe})" if nprobe else name,
+                        f"{size / 2**20:.0f}",
+                        f"{load:.2f}",
+                        *(f"{value:.2f}" for value in stats.values()),
+                    )
+                store.close()
+
+    console.print(table)
+
+
+if __name__ == "__main__":
+    main()
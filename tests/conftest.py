@@ -3,6 +3,8 @@ from pathlib import Path
 import pytest
 from datasets import Dataset, load_dataset, load_from_disk
 
+from haiku.rag.reader import ParseCache, parser_pool
+
 
 @pytest.fixture(scope="session")
 def qa_corpus() -> Dataset:
@@ -16,3 +18,11 @@ def qa_corpus() -> Dataset:
         corpus = ds.filter(lambda doc: doc["document_topic"] == "News Stories")
         corpus.save_to_disk(ds_path)
         return corpus
+
+
+@pytest.fixture(autouse=True)
+def parse_cache(tmp_path: Path, monkeypatch: pytest.MonkeyPatch) -> ParseCache:
+    """Keep parsed content out of the user's data directory."""
+    cache = ParseCache(tmp_path / "parse_cache")
+    monkeypatch.setattr(parser_pool, "cache", cache)
+    return cache
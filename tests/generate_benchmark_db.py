@@ -8,6 +8,7 @@ from rich.progress import Progress
 
 from haiku.rag.client import HaikuRAG
 from haiku.rag.qa import get_qa_agent
+from haiku.rag.store.models.document import Document
 
 console = Console()
 
@@ -22,18 +23,22 @@ async def populate_db():
         task = progress.add_task("[green]Populating database...", total=len(corpus))
 
         async with HaikuRAG(db_path) as rag:
-            for doc in corpus:
-                uri = doc["document_id"]  # type: ignore
-                existing_doc = await rag.get_document_by_uri(uri)
-                if existing_doc is not None:
-                    progress.advance(task)
-                    continue
-
-                await rag.create_document(
-                    content=doc["document_extracted"],  # type: ignore
-                    uri=uri,
-                )
-                progress.advance(task)
+            result = await rag.ingest_many(
+                (
+                    Document(
+                        content=doc["document_extracted"],  # type: ignore
+                        uri=doc["document_id"],  # type: ignore
+                    )
+                    for doc in corpus
+                ),
+                on_document=lambda _: progress.advance(task),
+            )
+
+    for stage in result.stages.values():
+        console.print(
+            f"{stage.name}: {stage.processed} documents, "
+            f"{stage.throughput:.1f} documents/s"
+        )
 
 
 async def run_match_benchmark():
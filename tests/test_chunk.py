@@ -155,3 +155,56 @@ async def test_chunk_repository_crud():
     assert retrieved_chunk is None
 
     store.close()
+
+
+@pytest.mark.asyncio
+async def test_create_many_chunks():
+    """Test creating several chunks in one batch."""
+    store = Store(":memory:")
+    doc_repo = DocumentRepository(store)
+    chunk_repo = ChunkRepository(store)
+
+    document = await doc_repo.create(Document(content="Existing chunk"))
+    assert document.id is not None
+    [existing_chunk] = await chunk_repo.get_by_document_id(document.id)
+
+    chunks = [
+        Chunk(document_id=document.id, content=f"Batch chunk {word}")
+        for word in ["alpha", "beta", "gamma"]
+    ]
+    created = await chunk_repo.create_many(chunks)
+    assert created == chunks
+    assert [chunk.id for chunk in created] == [
+        existing_chunk.id + 1,  # type: ignore
+        existing_chunk.id + 2,  # type: ignore
+        existing_chunk.id + 3,  # type: ignore
+    ]
+
+    # Every chunk is stored with its embedding and full-text index entry
+    for chunk in created:
+        assert chunk.id is not None
+        stored = await chunk_repo.get_by_id(chunk.id)
+        assert stored is not None and stored.content == chunk.content
+    [(fts_chunk, _)] = await chunk_repo.search_chunks_fts("gamma", limit=5)
+    assert fts_chunk.id == created[2].id
+    results = await chunk_repo.search_chunks("Batch chunk beta", limit=4)
+    assert {chunk.id for chunk, _ in results} == {
+        existing_chunk.id,
+        *(chunk.id for chunk in created),
+    }
+
+    with pytest.raises(ValueError, match="one embedding per chunk"):
+        await chunk_repo.create_many(chunks, embeddings=[])
+
+    store.close()
+
+
+def test_serialize_embeddings():
+    """Batch serialization matches serializing embeddings one by one."""
+    embeddings = [[0.1, 0.2, 0.3], [1.0, 2.0, 3.0]]
+    assert Store.serialize_embeddings(embeddings) == [
+        Store.serialize_embedding(embedding) for embedding in embeddings
+    ]
+    assert Store.serialize_embeddings([]) == []
+    with pytest.raises(ValueError):
+        Store.serialize_embeddings([[0.1], [0.1, 0.2]])
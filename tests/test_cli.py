@@ -81,6 +81,24 @@ def test_search():
         mock_app_instance.search.assert_called_once_with(query="query", limit=5, k=60)
 
 
+def test_prune_cache():
+    with patch("haiku.rag.cli.HaikuRAGApp") as mock_app:
+        mock_app_instance = MagicMock()
+        mock_app_instance.prune_cache = AsyncMock()
+        mock_app.return_value = mock_app_instance
+
+        result = runner.invoke(cli, ["prune-cache", "--max-entries", "10"])
+
+        assert result.exit_code == 0
+        mock_app_instance.prune_cache.assert_called_once_with(max_entries=10)
+
+        mock_app_instance.prune_cache.reset_mock()
+        result = runner.invoke(cli, ["prune-cache"])
+
+        assert result.exit_code == 0
+        mock_app_instance.prune_cache.assert_called_once_with(max_entries=None)
+
+
 def test_serve():
     with patch("haiku.rag.cli.HaikuRAGApp") as mock_app:
         mock_app_instance = MagicMock()
@@ -1,4 +1,6 @@
+import asyncio
 import tempfile
+import threading
 from pathlib import Path
 from unittest.mock import AsyncMock, patch
 
@@ -7,6 +9,8 @@ import pytest
 from datasets import Dataset
 
 from haiku.rag.client import HaikuRAG
+from haiku.rag.reader import parser_pool
+from haiku.rag.store.models.document import Document
 
 
 @pytest.mark.asyncio
@@ -76,7 +80,7 @@ async def test_client_document_crud(qa_corpus: Dataset):
     deleted_again = await client.delete_document(created_doc.id)
     assert deleted_again is False
 
-    client.close()
+    await client.close()
 
 
 @pytest.mark.asyncio
@@ -116,7 +120,32 @@ async def test_client_create_document_from_source():
     finally:
         # Clean up
         temp_path.unlink()
-        client.close()
+        await client.close()
+
+
+@pytest.mark.asyncio
+async def test_client_create_document_from_source_parse_cache():
+    """Copies of a file and re-added documents are not parsed again."""
+    client = HaikuRAG(":memory:")
+
+    with tempfile.TemporaryDirectory() as temp_dir:
+        original = Path(temp_dir) / "original.txt"
+        original.write_text("Content shared by two files.")
+        copy = Path(temp_dir) / "copy.txt"
+        copy.write_text("Content shared by two files.")
+
+        with patch.object(parser_pool, "_parse", wraps=parser_pool._parse) as parse:
+            doc = await client.create_document_from_source(original)
+            assert doc.id is not None
+            await client.delete_document(doc.id)
+            await client.create_document_from_source(original)
+            doc = await client.create_document_from_source(copy)
+
+        assert parse.call_count == 1
+        assert doc.content == "Content shared by two files."
+        assert doc.uri == copy.as_uri()
+
+    await client.close()
 
 
 @pytest.mark.asyncio
@@ -138,7 +167,7 @@ async def test_client_create_document_from_source_unsupported():
 
     finally:
         temp_path.unlink()
-        client.close()
+        await client.close()
 
 
 @pytest.mark.asyncio
@@ -152,7 +181,7 @@ async def test_client_create_document_from_source_nonexistent():
     with pytest.raises(ValueError, match="File does not exist"):
         await client.create_document_from_source(non_existent_path)
 
-    client.close()
+    await client.close()
 
 
 @pytest.mark.asyncio
@@ -180,7 +209,7 @@ async def test_client_create_document_from_url():
         assert "md5" in doc.metadata
         assert doc.metadata["contentType"] == "text/html"
 
-    client.close()
+    await client.close()
 
 
 @pytest.mark.asyncio
@@ -224,7 +253,7 @@ async def test_client_create_document_from_url_with_different_content_types():
         assert "md5" in doc.metadata
         assert doc.metadata["contentType"] == "text/plain"
 
-    client.close()
+    await client.close()
 
 
 @pytest.mark.asyncio
@@ -242,7 +271,7 @@ async def test_client_create_document_from_url_unsupported_content():
         with pytest.raises(ValueError, match="Unsupported content type"):
             await client.create_document_from_source("https://example.com/binary.bin")
 
-    client.close()
+    await client.close()
 
 
 @pytest.mark.asyncio
@@ -262,7 +291,7 @@ async def test_client_create_document_from_url_http_error():
                 "https://example.com/notfound.html"
             )
 
-    client.close()
+    await client.close()
 
 
 @pytest.mark.asyncio
@@ -305,7 +334,7 @@ async def test_get_extension_from_content_type_or_url():
         == ".pdf"
     )
 
-    client.close()
+    await client.close()
 
 
 @pytest.mark.asyncio
@@ -344,7 +373,7 @@ async def test_client_metadata_content_type_and_md5():
 
     finally:
         temp_path.unlink()
-        client.close()
+        await client.close()
 
 
 @pytest.mark.asyncio
@@ -386,7 +415,7 @@ async def test_client_create_update_no_op_behavior():
 
     finally:
         temp_path.unlink()
-        client.close()
+        await client.close()
 
 
 @pytest.mark.asyncio
@@ -425,7 +454,7 @@ async def test_client_url_create_update_no_op_behavior():
         assert doc3.id == original_id  # Same document ID
         assert doc3.content == updated_content.decode()  # Updated content
 
-    client.close()
+    await client.close()
 
 
 @pytest.mark.asyncio
@@ -471,7 +500,7 @@ async def test_client_search():
     limited_results = await client.search("programming", limit=1)
     assert len(limited_results) <= 1
 
-    client.close()
+    await client.close()
 
 
 @pytest.mark.asyncio
@@ -497,3 +526,148 @@ async def test_client_async_context_manager():
     # Context manager should have automatically closed the connection
     # We can't easily test that the connection is closed without accessing internals,
     # but the test passing means the context manager methods work correctly
+
+
+@pytest.mark.asyncio
+async def test_client_injected_embedder_client():
+    """An injected provider client is used for embeddings and left open on close."""
+    from haiku.rag.config import Config
+    from haiku.rag.embeddings.ollama import Embedder as OllamaEmbedder
+
+    class MockOllamaClient:
+        def __init__(self):
+            self.requests = []
+            self.closed = False
+
+        async def embed(self, model, input):
+            self.requests.append(input)
+            return {"embeddings": [[0.1] * Config.EMBEDDINGS_VECTOR_DIM for _ in input]}
+
+        async def close(self):
+            self.closed = True
+
+    provider_client = MockOllamaClient()
+    embedder = OllamaEmbedder(
+        Config.EMBEDDINGS_MODEL, Config.EMBEDDINGS_VECTOR_DIM, client=provider_client
+    )
+    client = HaikuRAG(":memory:", embedder=embedder)
+    assert client.document_repository.chunk_repository is client.chunk_repository
+
+    await client.create_document(content="Test content for injection")
+    results = await client.search("injection", limit=1)
+    assert len(results) == 1
+    assert provider_client.requests == [
+        ["Test content for injection"],
+        ["injection"],
+    ]
+
+    await client.close()
+    assert not provider_client.closed
+
+
+@pytest.mark.asyncio
+async def test_client_close_releases_provider_clients():
+    """Closing the client closes the clients created by the embedder."""
+    client = HaikuRAG(":memory:")
+    await client.create_document(content="Test content for closing")
+
+    embedder = client.chunk_repository.embedder
+    assert embedder._client is not None
+
+    await client.close()
+    assert embedder._client is None
+
+
+@pytest.mark.asyncio
+async def test_client_concurrent_operations():
+    """Concurrent calls run their database work on the store thread."""
+    client = HaikuRAG(":memory:")
+    loop_thread = threading.get_ident()
+    store_threads = set()
+
+    def record_thread(connection):  # noqa: ARG001
+        store_threads.add(threading.get_ident())
+
+    await client.store.write(record_thread)
+    assert store_threads and loop_thread not in store_threads
+
+    documents = await asyncio.gather(
+        *(client.create_document(content=f"Concurrent document {i}") for i in range(5))
+    )
+    assert len({doc.id for doc in documents}) == 5
+
+    results = await asyncio.gather(
+        *(client.search(f"Concurrent document {i}", limit=5) for i in range(5))
+    )
+    assert all(len(result) == 5 for result in results)
+
+    await client.close()
+    with pytest.raises(ValueError, match="Store connection is not available"):
+        await client.store.write(record_thread)
+
+
+@pytest.mark.asyncio
+async def test_client_search_cache():
+    """Search results are cached until documents or chunks are written."""
+    client = HaikuRAG(":memory:")
+    assert client.search_cache is not None
+    document = await client.create_document(content="Python is a programming language.")
+
+    with patch.object(
+        client.chunk_repository,
+        "search_chunks_hybrid",
+        wraps=client.chunk_repository.search_chunks_hybrid,
+    ) as search:
+        first = await client.search("python", limit=3)
+        second = await client.search("python", limit=3)
+        assert search.call_count == 1
+        assert [chunk.id for chunk, _ in second] == [chunk.id for chunk, _ in first]
+        assert set(second.timings) == {"cache", "total"}
+
+        # Other arguments are cached separately
+        await client.search("python", limit=2)
+        assert search.call_count == 2
+
+        # Writes invalidate all results
+        generation = client.store.generation
+        document.content = "Rust is a programming language."
+        await client.update_document(document)
+        assert client.store.generation > generation
+        updated = await client.search("python", limit=3)
+        assert search.call_count == 3
+        assert "Rust" in updated[0][0].content
+
+        # A failed write leaves the cache in place
+        with pytest.raises(ValueError):
+            await client.update_document(Document(content="No id"))
+        await client.search("python", limit=3)
+        assert search.call_count == 3
+
+    assert client.search_cache.hits == 2
+    await client.close()
+
+
+@pytest.mark.asyncio
+async def test_client_search_cache_other_process(tmp_path):
+    """Cached results are dropped when another process writes to the database."""
+    db_path = tmp_path / "test.sqlite"
+    client = HaikuRAG(db_path)
+    other = HaikuRAG(db_path)
+    await client.create_document(content="Python is a programming language.")
+
+    with patch.object(
+        client.chunk_repository,
+        "search_chunks_hybrid",
+        wraps=client.chunk_repository.search_chunks_hybrid,
+    ) as search:
+        await client.search("python", limit=3)
+        await client.search("python", limit=3)
+        assert search.call_count == 1
+
+        await other.create_document(content="Python has dynamic typing.")
+        results = await client.search("python", limit=3)
+        assert search.call_count == 2
+        assert len(results) == 2
+
+    await other.close()
+    await client.close()
@@ -1,6 +1,7 @@
 import pytest
 from datasets import Dataset
 
+from haiku.rag.chunker import chunker
 from haiku.rag.store.engine import Store
 from haiku.rag.store.models.document import Document
 from haiku.rag.store.repositories.document import DocumentRepository
@@ -125,3 +126,126 @@ async def test_document_repository_crud(qa_corpus: Dataset):
     assert retrieved_document is None
 
     store.close()
+
+
+@pytest.mark.asyncio
+async def test_delete_many_documents():
+    """Test deleting several documents with their chunks at once."""
+    store = Store(":memory:")
+    doc_repo = DocumentRepository(store)
+    chunk_repo = doc_repo.chunk_repository
+
+    documents = [
+        await doc_repo.create(Document(content=f"Document number {i} " * 200))
+        for i in range(3)
+    ]
+    document_ids = [doc.id for doc in documents if doc.id is not None]
+    kept_chunks = await chunk_repo.get_by_document_id(document_ids[2])
+    assert len(kept_chunks) > 1
+
+    deleted = await doc_repo.delete_many([document_ids[0], document_ids[1], 999])
+    assert deleted == 2
+
+    assert await doc_repo.get_by_id(document_ids[0]) is None
+    assert await doc_repo.get_by_id(document_ids[1]) is None
+    assert await doc_repo.get_by_id(document_ids[2]) is not None
+
+    # Only the chunks, embeddings and full-text entries of the kept document remain
+    assert store._connection is not None
+    cursor = store._connection.cursor()
+    for table in ["chunks", "chunk_embeddings", "chunks_fts"]:
+        cursor.execute(f"SELECT COUNT(*) FROM {table}")
+        assert cursor.fetchone()[0] == len(kept_chunks)
+    cursor.execute("INSERT INTO chunks_fts(chunks_fts) VALUES ('integrity-check')")
+    store._connection.commit()
+    results = await chunk_repo.search_chunks_fts("number", limit=10)
+    assert {chunk.document_id for chunk, _ in results} == {document_ids[2]}
+
+    assert await chunk_repo.delete_by_document_ids([]) == 0
+    assert await doc_repo.delete_many([]) == 0
+
+    store.close()
+
+
+@pytest.mark.asyncio
+async def test_update_document_reuses_unchanged_chunks(qa_corpus: Dataset):
+    """Updates only embed and insert the chunks whose content changed."""
+    store = Store(":memory:")
+    doc_repo = DocumentRepository(store)
+    chunk_repo = doc_repo.chunk_repository
+
+    content = qa_corpus[0]["document_extracted"]
+    document = await doc_repo.create(Document(content=content))
+    assert document.id is not None
+    chunks = await chunk_repo.get_by_document_id(document.id)
+    assert len(chunks) > 2
+
+    embedded: list[str] = []
+    embed = chunk_repo.embedding_cache.embed
+
+    async def tracking_embed(texts):
+        embedded.extend(texts)
+        return await embed(texts)
+
+    chunk_repo.embedding_cache.embed = tracking_embed  # type: ignore
+
+    # Appending a paragraph only changes the last chunk
+    document.content = content + "\n\nA new closing paragraph."
+    await doc_repo.update(document)
+    updated = await chunk_repo.get_by_document_id(document.id)
+
+    assert [chunk.content for chunk in updated] == await chunker.chunk(document.content)
+    assert [chunk.metadata["order"] for chunk in updated] == list(range(len(updated)))
+    kept = {chunk.id for chunk in chunks} & {chunk.id for chunk in updated}
+    assert len(kept) == len(updated) - len(embedded)
+    assert 0 < len(embedded) < len(updated)
+
+    # Unchanged content embeds nothing and keeps every row
+    embedded.clear()
+    await doc_repo.update(document)
+    assert embedded == []
+    assert await chunk_repo.get_by_document_id(document.id) == updated
+
+    # Reordered chunks keep their rows and get their new order
+    assert store._connection is not None
+    texts = [chunk.content for chunk in reversed(updated)]
+    reordered = chunk_repo._replace_chunks(
+        store._connection, document.id, texts, [None] * len(texts)
+    )
+    assert [chunk.id for chunk in reordered] == [
+        chunk.id for chunk in reversed(updated)
+    ]
+    assert [chunk.metadata["order"] for chunk in reordered] == list(range(len(texts)))
+    assert await chunk_repo.get_by_document_id(document.id) == reordered
+
+    # Stale chunks are gone from the vector and full-text indexes
+    for table, column in [("chunk_embeddings", "chunk_id"), ("chunks_fts", "rowid")]:
+        count = store._connection.execute(f"SELECT COUNT(*) FROM {table}").fetchone()
+        assert count[0] == len(updated), column
+
+    store.close()
+
+
+@pytest.mark.asyncio
+async def test_save_document_with_changed_chunks():
+    """Chunks expected to be reused are embedded if they were replaced meanwhile."""
+    store = Store(":memory:")
+    doc_repo = DocumentRepository(store)
+    chunk_repo = doc_repo.chunk_repository
+
+    document = await doc_repo.create(Document(content="Original content"))
+    assert document.id is not None
+    chunk_texts, embeddings = await chunk_repo.prepare_chunks(
+        "Original content", document.id
+    )
+    assert embeddings == [None]
+
+    await doc_repo.update(Document(id=document.id, content="Concurrent edit"))
+    await doc_repo.save(document, chunk_texts, embeddings)
+
+    [chunk] = await chunk_repo.get_by_document_id(document.id)
+    assert chunk.content == "Original content"
+    results = await chunk_repo.search_chunks("Original content", limit=1)
+    assert results[0][0].id == chunk.id
+
+    store.close()
@@ -1,7 +1,9 @@
 import numpy as np
 import pytest
 
+from haiku.rag.chunker import Chunker
 from haiku.rag.embeddings import get_embedder
+from haiku.rag.embeddings.base import EmbedderBase
 
 
 @pytest.mark.asyncio
@@ -11,6 +13,52 @@ async def test_embedder():
     assert len(embedding) == embedder._vector_dim
 
 
+@pytest.mark.asyncio
+async def test_embed_batch():
+    embedder = get_embedder()
+    texts = ["hello world", "goodbye world", "hello again"]
+    embeddings = await embedder.embed_batch(texts)
+    assert len(embeddings) == len(texts)
+    assert all(len(embedding) == embedder._vector_dim for embedding in embeddings)
+
+    # Batched embeddings match the single-text ones
+    single = await embedder.embed(texts[1])
+    assert np.allclose(embeddings[1], single, atol=1e-4)
+
+
+@pytest.mark.asyncio
+async def test_embed_batch_limits():
+    """Batches are split on both the batch size and the token budget."""
+
+    class RecordingEmbedder(EmbedderBase):
+        def __init__(self, *args, **kwargs):
+            super().__init__(*args, **kwargs)
+            self.batches: list[list[str]] = []
+
+        async def _embed_batch(self, texts: list[str]) -> list[list[float]]:
+            self.batches.append(texts)
+            return [[float(len(text))] for text in texts]
+
+    texts = [f"text number {i}" for i in range(10)]
+
+    embedder = RecordingEmbedder("test", 1, max_batch_size=4, max_batch_tokens=0)
+    embeddings = await embedder.embed_batch(texts)
+    assert [len(batch) for batch in embedder.batches] == [4, 4, 2]
+    assert embeddings == [[float(len(text))] for text in texts]
+
+    # A budget just above two texts worth of tokens fits two texts per request
+    tokens = len(Chunker.encoder.encode(texts[0]))
+    embedder = RecordingEmbedder(
+        "test", 1, max_batch_size=100, max_batch_tokens=2 * tokens + 1
+    )
+    await embedder.embed_batch(texts)
+    assert [len(batch) for batch in embedder.batches] == [2, 2, 2, 2, 2]
+
+    embedder = RecordingEmbedder("test", 1)
+    assert await embedder.embed_batch([]) == []
+    assert embedder.batches == []
+
+
 @pytest.mark.asyncio
 async def test_similarity():
     embedder = get_embedder()
@@ -56,8 +104,6 @@ async def test_openai_embedder(monkeypatch):
     try:
         from haiku.rag.embeddings.openai import Embedder as OpenAIEmbedder
 
-        embedder = OpenAIEmbedder("text-embedding-3-small", 1536)
-
         # Mock the OpenAI client
         class MockEmbeddingData:
             def __init__(self, embedding):
@@ -75,18 +121,56 @@ async def test_openai_embedder(monkeypatch):
             def __init__(self):
                 self.embeddings = self.MockEmbeddings()
 
-        # Patch the AsyncOpenAI import
-        import haiku.rag.embeddings.openai
+        # Inject the mocked client
+        embedder = OpenAIEmbedder(
+            "text-embedding-3-small", 1536, client=MockAsyncOpenAI()
+        )
 
-        original_client = haiku.rag.embeddings.openai.AsyncOpenAI
-        haiku.rag.embeddings.openai.AsyncOpenAI = MockAsyncOpenAI
+        embedding = await embedder.embed("test text")
+        assert len(embedding) == 1536
+        assert all(isinstance(x, float) for x in embedding)
 
-        try:
-            embedding = await embedder.embed("test text")
-            assert len(embedding) == 1536
-            assert all(isinstance(x, float) for x in embedding)
-        finally:
-            haiku.rag.embeddings.openai.AsyncOpenAI = original_client
+    except ImportError:
+        pytest.skip("OpenAI package not installed")
+
+
+@pytest.mark.asyncio
+async def test_openai_embed_batch():
+    try:
+        from haiku.rag.embeddings.openai import Embedder as OpenAIEmbedder
+
+        requests = []
+
+        class MockEmbeddingData:
+            def __init__(self, embedding, index):
+                self.embedding = embedding
+                self.index = index
+
+        class MockResponse:
+            def __init__(self, inputs):
+                # Return the data out of order to check we sort on index
+                self.data = [
+                    MockEmbeddingData([float(i)] * 1536, i)
+                    for i in reversed(range(len(inputs)))
+                ]
+
+        class MockAsyncOpenAI:
+            class MockEmbeddings:
+                async def create(self, model, input):
+                    requests.append(input)
+                    return MockResponse(input)
+
+            def __init__(self):
+                self.embeddings = self.MockEmbeddings()
+
+        embedder = OpenAIEmbedder(
+            "text-embedding-3-small", 1536, max_batch_size=2, client=MockAsyncOpenAI()
+        )
+
+        embeddings = await embedder.embed_batch(["a", "b", "c"])
+        assert requests == [["a", "b"], ["c"]]
+        assert [embedding[0] for embedding in embeddings] == [0.0, 1.0, 0.0]
+        assert all(len(embedding) == 1536 for embedding in embeddings)
 
     except ImportError:
         pytest.skip("OpenAI package not installed")
@@ -126,3 +210,78 @@ async def test_voyageai_embedder(monkeypatch):
 
     except ImportError:
         pytest.skip("VoyageAI package not installed")
+
+
+@pytest.mark.asyncio
+async def test_voyageai_embed_batch():
+    try:
+        from haiku.rag.embeddings.voyageai import Embedder as VoyageAIEmbedder
+
+        embedder = VoyageAIEmbedder("voyage-3.5", 1024)
+        requests = []
+
+        class MockEmbeddings:
+            def __init__(self, embeddings):
+                self.embeddings = embeddings
+
+        class MockClient:
+            def embed(self, texts, model, output_dtype):
+                requests.append(texts)
+                return MockEmbeddings([[0.1] * 1024 for _ in texts])
+
+        import haiku.rag.embeddings.voyageai
+
+        original_client = haiku.rag.embeddings.voyageai.Client
+        haiku.rag.embeddings.voyageai.Client = MockClient
+
+        try:
+            embeddings = await embedder.embed_batch(["a", "b", "c"])
+            assert requests == [["a", "b", "c"]]
+            assert len(embeddings) == 3
+            assert all(len(embedding) == 1024 for embedding in embeddings)
+        finally:
+            haiku.rag.embeddings.voyageai.Client = original_client
+
+    except ImportError:
+        pytest.skip("VoyageAI package not installed")
+
+
+@pytest.mark.asyncio
+async def test_embedder_reuses_client():
+    """The provider client is created once, reused and closed with the embedder."""
+    created = []
+
+    class MockClient:
+        closed = False
+
+        async def embed(self, model, input):
+            return {"embeddings": [[0.1] * 1024 for _ in input]}
+
+        async def close(self):
+            self.closed = True
+
+    class Embedder(EmbedderBase):
+        def _create_client(self):
+            client = MockClient()
+            created.append(client)
+            return client
+
+        async def _embed_batch(self, texts: list[str]) -> list[list[float]]:
+            res = await self.client.embed(model=self._model, input=texts)
+            return res["embeddings"]
+
+    embedder = Embedder("test", 1024)
+    await embedder.embed_batch(["a"])
+    await embedder.embed_batch(["b"])
+    assert len(created) == 1
+
+    await embedder.close()
+    assert created[0].closed
+
+    # Injected clients belong to the caller and are left open
+    injected = MockClient()
+    embedder = Embedder("test", 1024, client=injected)
+    await embedder.embed_batch(["a"])
+    await embedder.close()
+    assert created == [created[0]]
+    assert not injected.closed
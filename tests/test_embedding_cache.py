@@ -0,0 +1,269 @@
+import asyncio
+
+import pytest
+
+from haiku.rag.client import HaikuRAG
+from haiku.rag.store.engine import Store
+from haiku.rag.store.repositories.chunk import ChunkRepository
+from haiku.rag.store.repositories.embedding_cache import (
+    EmbeddingCacheRepository,
+    QueryEmbeddingCache,
+)
+
+
+def record_embeddings(embedder, monkeypatch) -> list[str]:
+    """Record the texts the embedder is asked to embed."""
+    embedded: list[str] = []
+    embed_batch = embedder.embed_batch
+
+    async def recording_embed_batch(texts: list[str]) -> list[list[float]]:
+        embedded.extend(texts)
+        return await embed_batch(texts)
+
+    monkeypatch.setattr(embedder, "embed_batch", recording_embed_batch)
+    return embedded
+
+
+def record_queries(embedder, monkeypatch) -> list[str]:
+    """Record the single texts the embedder is asked to embed."""
+    embedded: list[str] = []
+    embed = embedder.embed
+
+    async def recording_embed(text: str) -> list[float]:
+        embedded.append(text)
+        return await embed(text)
+
+    monkeypatch.setattr(embedder, "embed", recording_embed)
+    return embedded
+
+
+def record_writes(store: Store, monkeypatch) -> list:
+    """Record the functions run on the store's writer."""
+    written: list = []
+    write = store.write
+
+    async def recording_write(fn, *args):
+        written.append(fn)
+        return await write(fn, *args)
+
+    monkeypatch.setattr(store, "write", recording_write)
+    return written
+
+
+@pytest.mark.asyncio
+async def test_embedding_cache_hits(monkeypatch):
+    """Identical texts are only embedded once."""
+    store = Store(":memory:")
+    chunk_repo = ChunkRepository(store)
+    cache = chunk_repo.embedding_cache
+    embedded = record_embeddings(chunk_repo.embedder, monkeypatch)
+
+    first = await cache.embed(["alpha", "beta", "alpha"])
+    assert embedded == ["alpha", "beta"]
+    assert first[0] == first[2]
+    assert len(first[1]) == chunk_repo.embedder._vector_dim
+
+    second = await cache.embed(["beta", "gamma"])
+    assert embedded == ["alpha", "beta", "gamma"]
+    assert second[0] == pytest.approx(first[1])
+    assert await cache.count() == 3
+
+    store.close()
+
+
+@pytest.mark.asyncio
+async def test_embedding_cache_keyed_by_model():
+    """Entries of one embedder model are not used for another."""
+    store = Store(":memory:")
+    chunk_repo = ChunkRepository(store)
+    await chunk_repo.embedding_cache.embed(["alpha"])
+
+    other_embedder = chunk_repo.embedder.__class__(
+        "other-model", chunk_repo.embedder._vector_dim
+    )
+    other_cache = EmbeddingCacheRepository(store, other_embedder)
+    assert await other_cache.get([other_cache.hash_text("alpha")]) == {}
+
+    store.close()
+
+
+@pytest.mark.asyncio
+async def test_embedding_cache_eviction():
+    """The cache is bounded and evicts the least recently used entries."""
+    store = Store(":memory:")
+    chunk_repo = ChunkRepository(store)
+    cache = EmbeddingCacheRepository(store, chunk_repo.embedder, max_entries=2)
+
+    await cache.embed(["alpha"])
+    await cache.embed(["beta"])
+    await cache.embed(["gamma"])
+    assert await cache.count() == 2
+    assert await cache.get([cache.hash_text("alpha")]) == {}
+
+    evicted = await cache.prune(0)
+    assert evicted == 2
+    assert await cache.count() == 0
+
+    store.close()
+
+
+@pytest.mark.asyncio
+async def test_embedding_cache_tracks_count():
+    """Writes only scan the cache to count its entries once."""
+    store = Store(":memory:")
+    chunk_repo = ChunkRepository(store)
+    cache = EmbeddingCacheRepository(store, chunk_repo.embedder, max_entries=3)
+    statements: list[str] = []
+    await store.write(
+        lambda connection: connection.set_trace_callback(statements.append)
+    )
+
+    await cache.embed(["alpha", "beta"])
+    await cache.embed(["beta", "gamma"])
+    await cache.embed(["delta", "epsilon"])
+    assert await cache.count() == 3
+    assert await cache.get([cache.hash_text("alpha")]) == {}
+    counted = [s for s in statements if "COUNT(*)" in s]
+    # The first write and the final check
+    assert len(counted) == 2
+
+    store.close()
+
+
+@pytest.mark.asyncio
+async def test_embedding_cache_keeps_caller_transaction():
+    """Cache lookups and writes do not commit a transaction left open by the caller."""
+    store = Store(":memory:")
+    chunk_repo = ChunkRepository(store)
+    cache = chunk_repo.embedding_cache
+
+    await store.write(
+        lambda connection: connection.execute(
+            "INSERT INTO documents (content) VALUES ('uncommitted')"
+        )
+    )
+    await cache.embed(["alpha"])
+    await cache.embed(["alpha"])
+    assert await store.write(lambda connection: connection.in_transaction)
+
+    await store.write(lambda connection: connection.rollback())
+    assert (
+        await store.read(
+            lambda connection: connection.execute(
+                "SELECT COUNT(*) FROM documents"
+            ).fetchone()[0]
+        )
+        == 0
+    )
+
+    store.close()
+
+
+@pytest.mark.asyncio
+async def test_rebuild_uses_embedding_cache(monkeypatch):
+    """Rebuilding does not re-embed chunks whose text was embedded before."""
+    client = HaikuRAG(":memory:")
+    await client.create_document(content="Cached content for the rebuild test")
+
+    embedded = record_embeddings(client.chunk_repository.embedder, monkeypatch)
+
+    async for _ in client.rebuild_database():
+        pass
+    assert embedded == []
+
+    chunks = await client.chunk_repository.list_all()
+    assert len(chunks) == 1
+
+    await client.close()
+
+
+@pytest.mark.asyncio
+async def test_query_cache(monkeypatch):
+    """Repeated and trivially different queries are only embedded once."""
+    store = Store(":memory:")
+    chunk_repo = ChunkRepository(store)
+    embedded = record_queries(chunk_repo.embedder, monkeypatch)
+    cache = QueryEmbeddingCache(chunk_repo.embedder, max_entries=2, ttl=0)
+
+    first = await cache.embed("what is  haiku.rag?")
+    assert await cache.embed(" what is haiku.rag?\n") == first
+    assert embedded == ["what is haiku.rag?"]
+
+    # The least recently used query is evicted
+    await cache.embed("beta")
+    await cache.embed("gamma")
+    await cache.embed("what is haiku.rag?")
+    assert embedded == ["what is haiku.rag?", "beta", "gamma", "what is haiku.rag?"]
+    assert cache.metrics == {
+        "entries": 2,
+        "hits": 1,
+        "persistent_hits": 0,
+        "misses": 4,
+        "evictions": 2,
+        "expirations": 0,
+        "hit_rate": 0.2,
+    }
+
+    # Entries expire after their TTL
+    cache.ttl = 0.01
+    cache.clear()
+    await cache.embed("delta")
+    await asyncio.sleep(0.02)
+    await cache.embed("delta")
+    assert embedded[-2:] == ["delta", "delta"]
+    assert cache.metrics["expirations"] == 1
+
+    store.close()
+
+
+@pytest.mark.asyncio
+async def test_query_cache_persistent(monkeypatch, tmp_path):
+    """Query embeddings are shared through the database embedding cache."""
+    store = Store(tmp_path / "test.sqlite")
+    chunk_repo = ChunkRepository(store)
+    embedded = record_queries(chunk_repo.embedder, monkeypatch)
+
+    # Queries do not wait for their embedding to be stored
+    release = asyncio.Event()
+    write = store.write
+
+    async def blocked_write(fn, *args):
+        await release.wait()
+        return await write(fn, *args)
+
+    monkeypatch.setattr(store, "write", blocked_write)
+    first = QueryEmbeddingCache(chunk_repo.embedder, chunk_repo.embedding_cache)
+    embedding = await asyncio.wait_for(first.embed("alpha"), 1)
+    release.set()
+    await first.close()
+    assert await chunk_repo.embedding_cache.count() == 1
+
+    # A new process starts with an empty in-process cache, and finds the
+    # embedding without going through the writer. The entry is marked as used
+    # afterwards.
+    second = QueryEmbeddingCache(chunk_repo.embedder, chunk_repo.embedding_cache)
+    writes = record_writes(store, monkeypatch)
+    assert await second.embed("alpha") == pytest.approx(embedding)
+    assert writes == []
+    await second.close()
+    assert writes == [chunk_repo.embedding_cache._touch]
+    assert embedded == ["alpha"]
+    assert second.metrics["persistent_hits"] == 1
+    assert second.metrics["hit_rate"] == 1.0
+
+    store.close()
+
+
+@pytest.mark.asyncio
+async def test_search_uses_query_cache(monkeypatch):
+    async with HaikuRAG(":memory:") as client:
+        await client.create_document("Haiku is a short form of poetry.")
+        embedded = record_queries(client.chunk_repository.embedder, monkeypatch)
+        # Repeated searches are otherwise answered from the search cache
+        client.search_cache = None
+
+        first = await client.search("short poetry")
+        second = await client.search("short poetry")
+        assert embedded == ["short poetry"]
+        assert [score for _, score in second] == [score for _, score in first]
+        assert client.chunk_repository.query_cache.metrics["hits"] == 1
@@ -0,0 +1,182 @@
+from datetime import date, datetime, timedelta, timezone
+
+import pytest
+from datasets import Dataset
+
+from haiku.rag.client import HaikuRAG
+from haiku.rag.config import Config
+from haiku.rag.store.engine import Store
+from haiku.rag.store.filters import (
+    Filter,
+    filter_key,
+    get_filtered_chunks_sql,
+    parse_filters,
+)
+from haiku.rag.store.models.document import Document
+from haiku.rag.store.repositories.document import DocumentRepository
+
+DOCUMENTS = [
+    ("file:///docs/a.txt", {"topic": "python"}, datetime(2024, 1, 1)),
+    ("file:///docs/b.txt", {"topic": "rust", "draft": True}, datetime(2024, 6, 1)),
+    ("file:///notes/c.txt", {"topic": "python"}, datetime(2025, 1, 1)),
+    ("https://example.com", {}, datetime(2025, 6, 1)),
+]
+
+
+def test_parse_filters():
+    conditions = parse_filters(
+        {
+            "uri": {"prefix": "file:///docs/"},
+            "metadata.topic": ["python", "rust"],
+            "created_at": {"gte": date(2024, 1, 1), "lt": "2025-01-01T00:00:00"},
+            "metadata.draft": True,
+        }
+    )
+    assert [(f.field, f.op) for f in conditions] == [
+        ("uri", "prefix"),
+        ("metadata.topic", "in"),
+        ("created_at", "gte"),
+        ("created_at", "lt"),
+        ("metadata.draft", "eq"),
+    ]
+    assert parse_filters([Filter(field="uri", value="a")]) == [
+        Filter(field="uri", value="a")
+    ]
+    assert parse_filters(None) == []
+
+    sql, parameters = get_filtered_chunks_sql(conditions)
+    assert parameters["filter_0_end"] == "file:///docs0"
+    assert parameters["filter_1"] == '["python", "rust"]'
+    # Dates are compared as documents store them
+    assert parameters["filter_2"] == "2024-01-01 00:00:00"
+    assert parameters["filter_3"] == "2025-01-01 00:00:00"
+    assert "json_extract(d.metadata, '$.draft') = :filter_4" in sql
+
+    with pytest.raises(ValueError, match="Unsupported filter field"):
+        parse_filters({"content": "alpha"})
+    with pytest.raises(ValueError, match="Unsupported filter field"):
+        parse_filters({"metadata.a') OR 1 = 1 --": "alpha"})
+    with pytest.raises(ValueError, match="Unsupported filter operator"):
+        parse_filters({"uri": {"like": "%alpha%"}})
+    with pytest.raises(ValueError, match="needs a list"):
+        get_filtered_chunks_sql(parse_filters({"uri": {"in": "alpha"}}))
+
+
+def test_filter_values():
+    # Aware times are converted to the local time documents are stored in,
+    # here from an offset two hours ahead of it
+    local = datetime(2024, 1, 1).astimezone().utcoffset()
+    assert local is not None
+    offset = timezone(local + timedelta(hours=2))
+    [condition] = parse_filters(
+        {"created_at": {"gte": datetime(2024, 1, 1, tzinfo=offset).isoformat()}}
+    )
+    _, parameters = get_filtered_chunks_sql([condition])
+    assert parameters["filter_0"] == "2023-12-31 22:00:00"
+
+    # Values of different types on the same field have a key
+    mixed = [
+        Filter(field="metadata.x", value=1),
+        Filter(field="metadata.x", value="a"),
+    ]
+    assert filter_key(mixed) == filter_key(mixed[::-1])
+
+
+def test_filters_use_indexes(monkeypatch):
+    monkeypatch.setattr(Config, "DB_INDEXED_METADATA", ["topic"])
+    store = Store(":memory:")
+    connection = store._connection
+    assert connection is not None
+    for filters, index in [
+        ({"uri": {"prefix": "file:///docs/"}}, "idx_documents_uri"),
+        ({"created_at": {"gte": "2025-01-01"}}, "idx_documents_created_at"),
+        ({"metadata.topic": "python"}, "idx_documents_metadata_topic"),
+    ]:
+        sql, parameters = get_filtered_chunks_sql(parse_filters(filters))
+        plan = connection.execute(f"EXPLAIN QUERY PLAN {sql}", parameters).fetchall()
+        assert index in " ".join(row[-1] for row in plan)
+    store.close()
+
+
+async def create_documents(store: Store, qa_corpus: Dataset) -> list[Document]:
+    documents = DocumentRepository(store)
+    return [
+        await documents.create(
+            Document(
+                content=qa_corpus[i]["document_extracted"],
+                uri=uri,
+                metadata=metadata,
+                created_at=created_at,
+            )
+        )
+        for i, (uri, metadata, created_at) in enumerate(DOCUMENTS)
+    ]
+
+
+@pytest.mark.asyncio
+@pytest.mark.parametrize(
+    "store_options",
+    [
+        {},
+        {"quantization": "int8"},
+        {"vector_engine": "numpy"},
+        {"vector_engine": "ivf"},
+    ],
+)
+async def test_filtered_search(qa_corpus: Dataset, store_options: dict):
+    store = Store(":memory:", **store_options)
+    documents = await create_documents(store, qa_corpus)
+    chunks = DocumentRepository(store).chunk_repository
+    query = qa_corpus[0]["question"]
+    (count,) = store._connection.execute("SELECT COUNT(*) FROM chunks").fetchone()  # type: ignore[union-attr]
+
+    for filters, eligible in [
+        ({"uri": {"prefix": "file:///docs/"}}, {0, 1}),
+        ({"metadata.topic": "python"}, {0, 2}),
+        ({"metadata.topic": ["rust", "go"]}, {1}),
+        ({"metadata.draft": True}, {1}),
+        ({"created_at": {"gt": date(2024, 1, 1), "lte": "2025-01-01"}}, {1, 2}),
+        ({"uri": "https://example.com", "metadata.topic": "python"}, set()),
+    ]:
+        eligible_ids = {documents[i].id for i in eligible}
+        results = await chunks.search_chunks(query, limit=5, filters=filters)
+        assert {chunk.document_id for chunk, _ in results} <= eligible_ids
+        if store_options.get("quantization") is None:
+            # The nearest eligible chunks are found, not only those among the
+            # nearest chunks overall
+            everything = await chunks.search_chunks(query, limit=count)
+            expected = [
+                score
+                for chunk, score in everything
+                if chunk.document_id in eligible_ids
+            ][:5]
+            assert [score for _, score in results] == pytest.approx(expected)
+        else:
+            assert len(results) == (5 if eligible else 0)
+
+        fts_results = await chunks.search_chunks_fts(query, limit=5, filters=filters)
+        assert {chunk.document_id for chunk, _ in fts_results} <= eligible_ids
+
+        hybrid_results = await chunks.search_chunks_hybrid(
+            query, limit=5, filters=filters
+        )
+        assert {chunk.document_id for chunk, _ in hybrid_results} <= eligible_ids
+        assert len(hybrid_results) == (5 if eligible else 0)
+
+    store.close()
+
+
+@pytest.mark.asyncio
+async def test_client_search_filters(qa_corpus: Dataset):
+    async with HaikuRAG(":memory:") as client:
+        documents = await create_documents(client.store, qa_corpus)
+        query = qa_corpus[0]["question"]
+
+        python = await client.search(query, filters={"metadata.topic": "python"})
+        assert {chunk.document_id for chunk, _ in python} <= {
+            documents[0].id,
+            documents[2].id,
+        }
+        # Filters are part of the cache key
+        rust = await client.search(query, filters={"metadata.topic": "rust"})
+        assert {chunk.document_id for chunk, _ in rust} == {documents[1].id}
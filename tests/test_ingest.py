@@ -0,0 +1,128 @@
+import asyncio
+import tempfile
+from pathlib import Path
+
+import pytest
+
+from haiku.rag.client import HaikuRAG
+from haiku.rag.ingest import IngestPipeline
+from haiku.rag.store.models.document import Document
+
+
+@pytest.mark.asyncio
+async def test_ingest_many_files():
+    """Files are created, skipped when unchanged and updated when modified."""
+    with tempfile.TemporaryDirectory() as temp_dir:
+        paths = []
+        for i in range(5):
+            path = Path(temp_dir) / f"file{i}.txt"
+            path.write_text(f"Content of file number {i}")
+            paths.append(path)
+        unsupported = Path(temp_dir) / "file.unsupported"
+        unsupported.write_text("Not ingested")
+
+        client = HaikuRAG(":memory:")
+        stored = []
+        result = await client.ingest_many(
+            [*paths, str(paths[0]), unsupported],
+            metadata={"source": "share"},
+            load_concurrency=2,
+            embed_concurrency=2,
+            queue_size=1,
+            on_document=stored.append,
+        )
+
+        assert result.created == 5
+        assert result.updated == result.unchanged == 0
+        assert sorted(result.document_ids) == sorted(doc.id for doc in stored)
+        assert list(result.errors) == [str(unsupported)]
+        assert "Unsupported file extension" in result.errors[str(unsupported)]
+        assert result.stages["load"].processed == 5
+        assert result.stages["load"].failed == 1
+        assert result.stages["embed"].processed == 5
+        assert result.stages["write"].processed == 5
+        assert all(stage.throughput > 0 for stage in result.stages.values())
+
+        documents = await client.list_documents()
+        assert len(documents) == 5
+        assert all(doc.metadata["source"] == "share" for doc in documents)
+        assert all(doc.metadata["md5"] for doc in documents)
+        results = await client.search("file number 3", limit=1)
+        assert results[0][0].document_uri == paths[3].as_uri()
+
+        paths[1].write_text("Modified content")
+        result = await client.ingest_many(paths)
+        assert result.created == 0
+        assert result.updated == 1
+        assert result.unchanged == 4
+        document = await client.get_document_by_uri(paths[1].as_uri())
+        assert document is not None and document.content == "Modified content"
+        assert len(await client.list_documents()) == 5
+
+        await client.close()
+
+
+@pytest.mark.asyncio
+async def test_ingest_many_documents():
+    """Documents with known content are stored directly, keyed by URI."""
+    client = HaikuRAG(":memory:")
+    documents = [Document(content=f"Document {i}", uri=f"doc-{i}") for i in range(3)]
+
+    result = await client.ingest_many(documents)
+    assert result.created == 3
+
+    result = await client.ingest_many(
+        [
+            Document(content="Document 0", uri="doc-0"),
+            Document(content="Changed document 1", uri="doc-1"),
+            Document(content="Document without URI"),
+        ]
+    )
+    assert (result.created, result.updated, result.unchanged) == (1, 1, 1)
+    document = await client.get_document_by_uri("doc-1")
+    assert document is not None and document.content == "Changed document 1"
+
+    await client.close()
+
+
+@pytest.mark.asyncio
+async def test_ingest_cancellation():
+    """Cancelling a run stops all stages and leaves only complete documents."""
+    client = HaikuRAG(":memory:")
+    prepare_chunks = client.chunk_repository.prepare_chunks
+    embedded = asyncio.Event()
+
+    async def slow_prepare_chunks(content, document_id=None):
+        prepared = await prepare_chunks(content, document_id)
+        embedded.set()
+        await asyncio.sleep(10)
+        return prepared
+
+    client.chunk_repository.prepare_chunks = slow_prepare_chunks  # type: ignore
+
+    pipeline = IngestPipeline(client, load_concurrency=1, embed_concurrency=1)
+    task = asyncio.create_task(
+        pipeline.run(Document(content=f"Document {i}") for i in range(100))
+    )
+    await asyncio.wait_for(embedded.wait(), timeout=5)
+    task.cancel()
+    with pytest.raises(asyncio.CancelledError):
+        await task
+
+    assert await client.list_documents() == []
+    assert await client.chunk_repository.list_all() == []
+
+    # The client is still usable after the cancelled run
+    client.chunk_repository.prepare_chunks = prepare_chunks  # type: ignore
+    await client.create_document(content="After cancellation")
+    assert len(await client.list_documents()) == 1
+
+    await client.close()
+
+
+@pytest.mark.asyncio
+async def test_ingest_pipeline_requires_workers():
+    client = HaikuRAG(":memory:")
+    with pytest.raises(ValueError, match="at least one worker"):
+        IngestPipeline(client, load_concurrency=0)
+    await client.close()
@@ -0,0 +1,84 @@
+import asyncio
+from unittest.mock import patch
+
+import pytest
+from fastmcp import Client
+
+from haiku.rag.client import HaikuRAG
+from haiku.rag.mcp import create_mcp_server
+
+
+@pytest.mark.asyncio
+async def test_mcp_tools_share_client():
+    """All tool calls reuse the client given to the server and leave it open."""
+    rag = HaikuRAG(":memory:")
+    server = create_mcp_server(":memory:", client=rag)
+
+    with patch("haiku.rag.mcp.HaikuRAG") as mock_haiku_rag:
+        async with Client(server) as mcp_client:
+            result = await mcp_client.call_tool(
+                "add_document_from_text", {"content": "Shared client document"}
+            )
+            document_id = result.data
+            assert document_id is not None
+
+            results = await asyncio.gather(
+                *(
+                    mcp_client.call_tool("get_document", {"document_id": document_id})
+                    for _ in range(5)
+                )
+            )
+            assert all(r.data.content == "Shared client document" for r in results)
+
+        mock_haiku_rag.assert_not_called()
+
+    # The caller owns the client, so it is still usable
+    assert await rag.get_document_by_id(document_id) is not None
+    await rag.close()
+
+
+@pytest.mark.asyncio
+async def test_mcp_server_owns_client():
+    """Without a client the server opens one on first use and closes it on shutdown."""
+    created = []
+
+    def create_client(db_path):
+        client = HaikuRAG(db_path)
+        created.append(client)
+        return client
+
+    server = create_mcp_server(":memory:")
+    with patch("haiku.rag.mcp.HaikuRAG", side_effect=create_client):
+        async with Client(server) as mcp_client:
+            await mcp_client.call_tool(
+                "add_document_from_text", {"content": "Owned client document"}
+            )
+            await mcp_client.call_tool("list_documents", {})
+            await mcp_client.call_tool("search_documents", {"query": "owned"})
+
+    assert len(created) == 1
+    assert created[0].store._connection is None
+
+
+@pytest.mark.asyncio
+async def test_mcp_search_filters():
+    rag = HaikuRAG(":memory:")
+    server = create_mcp_server(":memory:", client=rag)
+
+    async with Client(server) as mcp_client:
+        document_ids = [
+            (
+                await mcp_client.call_tool(
+                    "add_document_from_text",
+                    {"content": "Filtered search document", "uri": uri},
+                )
+            ).data
+            for uri in ["file:///docs/a.txt", "file:///notes/b.txt"]
+        ]
+        result = await mcp_client.call_tool(
+            "search_documents",
+            {"query": "filtered", "filters": {"uri": {"prefix": "file:///docs/"}}},
+        )
+        assert {r.document_id for r in result.data} == {document_ids[0]}
+
+    await rag.close()
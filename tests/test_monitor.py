@@ -1,99 +1,227 @@
+import asyncio
+import os
 import tempfile
 from pathlib import Path
-from unittest.mock import AsyncMock
+from unittest.mock import patch
 
 import pytest
+from watchfiles import Change
 
 from haiku.rag.client import HaikuRAG
-from haiku.rag.monitor import FileWatcher
-from haiku.rag.store.models.document import Document
+from haiku.rag.monitor import ChangeQueue, FileWatcher
+from haiku.rag.utils import md5_file
 
 
 @pytest.mark.asyncio
-async def test_file_watcher_upsert_document():
-    """Test FileWatcher._upsert_document method."""
-
-    with tempfile.NamedTemporaryFile(mode="w", suffix=".txt", delete=False) as f:
-        f.write("Test content for file watcher")
-        temp_path = Path(f.name)
-
-    try:
-        mock_client = AsyncMock(spec=HaikuRAG)
-        mock_doc = Document(id=1, content="Test content", uri=temp_path.as_uri())
-        mock_client.create_document_from_source.return_value = mock_doc
-        mock_client.get_document_by_uri.return_value = None  # No existing document
-
-        watcher = FileWatcher(paths=[temp_path.parent], client=mock_client)
-
-        result = await watcher._upsert_document(temp_path)
-
-        assert result is not None
-        assert result.id == 1
-        mock_client.get_document_by_uri.assert_called_once_with(temp_path.as_uri())
-        mock_client.create_document_from_source.assert_called_once_with(str(temp_path))
-
-    finally:
-        temp_path.unlink(missing_ok=True)
+async def test_change_queue_coalesces_events():
+    """Events are merged per path, and added then deleted paths are dropped."""
+    queue = ChangeQueue(debounce=0.05)
+    for _ in range(3):
+        await queue.put(Change.modified, Path("edited.txt"))
+    await queue.put(Change.added, Path("temporary.txt"))
+    await queue.put(Change.deleted, Path("temporary.txt"))
+    await queue.put(Change.deleted, Path("replaced.txt"))
+    await queue.put(Change.added, Path("replaced.txt"))
+    assert len(queue) == 2
+
+    batch = await asyncio.wait_for(queue.get_batch(), timeout=5)
+    assert batch == [
+        (Change.modified, Path("edited.txt")),
+        (Change.added, Path("replaced.txt")),
+    ]
+    assert queue.stats.events == 7
+    assert queue.stats.coalesced == 5
+    assert queue.stats.max_queue_depth == 2
+    assert queue.stats.queue_depth == 0
+    assert queue.stats.max_lag_seconds >= 0.05
 
 
 @pytest.mark.asyncio
-async def test_file_watcher_upsert_existing_document():
-    """Test FileWatcher._upsert_document with existing document."""
-
-    with tempfile.NamedTemporaryFile(mode="w", suffix=".txt", delete=False) as f:
-        f.write("Test content for file watcher")
-        temp_path = Path(f.name)
-
-    try:
-        mock_client = AsyncMock(spec=HaikuRAG)
-        existing_doc = Document(id=1, content="Old content", uri=temp_path.as_uri())
-        updated_doc = Document(id=1, content="Updated content", uri=temp_path.as_uri())
-
-        mock_client.get_document_by_uri.return_value = existing_doc
-        mock_client.create_document_from_source.return_value = updated_doc
+async def test_change_queue_batches_and_backlog():
+    """Batches are bounded, and events wait while the backlog is full."""
+    queue = ChangeQueue(debounce=0, batch_size=2, max_backlog=3)
+    for i in range(3):
+        await queue.put(Change.added, Path(f"{i}.txt"))
+    blocked = asyncio.create_task(queue.put(Change.added, Path("3.txt")))
+    await asyncio.sleep(0.01)
+    assert not blocked.done()
 
-        watcher = FileWatcher(paths=[temp_path.parent], client=mock_client)
+    # Events of pending paths are still merged
+    await asyncio.wait_for(queue.put(Change.modified, Path("0.txt")), timeout=1)
 
-        result = await watcher._upsert_document(temp_path)
-
-        assert result is not None
-        assert result.content == "Updated content"
-        mock_client.get_document_by_uri.assert_called_once_with(temp_path.as_uri())
-        mock_client.create_document_from_source.assert_called_once_with(str(temp_path))
-
-    finally:
-        temp_path.unlink(missing_ok=True)
+    assert [path.name for _, path in await queue.get_batch()] == ["0.txt", "1.txt"]
+    await asyncio.wait_for(blocked, timeout=1)
+    assert [path.name for _, path in await queue.get_batch()] == ["2.txt", "3.txt"]
 
 
 @pytest.mark.asyncio
-async def test_file_watcher_delete_document():
-    """Test FileWatcher._delete_document method."""
-    temp_path = Path("/tmp/test_file.txt")
-
-    mock_client = AsyncMock(spec=HaikuRAG)
-    existing_doc = Document(id=1, content="Content to delete", uri=temp_path.as_uri())
-    mock_client.get_document_by_uri.return_value = existing_doc
-    mock_client.delete_document.return_value = True
-
-    watcher = FileWatcher(paths=[temp_path.parent], client=mock_client)
-
-    await watcher._delete_document(temp_path)
-
-    mock_client.get_document_by_uri.assert_called_once_with(temp_path.as_uri())
-    mock_client.delete_document.assert_called_once_with(1)
+async def test_file_watcher_applies_batches():
+    """Settled changes are ingested and deleted in batches."""
+    with tempfile.TemporaryDirectory() as temp_dir:
+        files = [Path(temp_dir) / f"doc{i}.txt" for i in range(3)]
+        for i, file in enumerate(files):
+            file.write_text(f"Document {i}")
+
+        client = HaikuRAG(":memory:")
+        watcher = FileWatcher(
+            paths=[Path(temp_dir)],
+            client=client,
+            queue=ChangeQueue(debounce=0.01, move_window=0.01),
+        )
+        dispatcher = asyncio.create_task(watcher.dispatch())
+
+        async def settled():
+            while watcher.stats.batches < batches:
+                await asyncio.sleep(0.01)
+
+        with patch.object(client, "ingest_many", wraps=client.ingest_many) as ingest:
+            await watcher.handler(
+                {(Change.added, str(file)) for file in files}
+                | {(Change.modified, str(files[0]))}
+            )
+            batches = 1
+            await asyncio.wait_for(settled(), timeout=5)
+            assert ingest.call_count == 1
+            assert sorted(ingest.call_args.args[0]) == files
+
+        assert len(await client.list_documents()) == 3
+        manifest = await client.file_manifest_repository.list_all()
+        assert sorted(manifest) == [file.as_uri() for file in files]
+
+        files[0].unlink()
+        await watcher.handler({(Change.deleted, str(files[0]))})
+        batches = 2
+        await asyncio.wait_for(settled(), timeout=5)
+
+        assert await client.get_document_by_uri(files[0].as_uri()) is None
+        assert files[0].as_uri() not in await client.file_manifest_repository.list_all()
+        assert watcher.stats.upserted == 3
+        assert watcher.stats.deleted == 1
+
+        dispatcher.cancel()
+        await asyncio.gather(dispatcher, return_exceptions=True)
+        await client.close()
 
 
 @pytest.mark.asyncio
-async def test_file_watcher_delete_nonexistent_document():
-    """Test FileWatcher._delete_document with non-existent document."""
-    temp_path = Path("/tmp/nonexistent_file.txt")
-
-    mock_client = AsyncMock(spec=HaikuRAG)
-    mock_client.get_document_by_uri.return_value = None
+async def test_file_watcher_refresh():
+    """Only files whose stat data changed are read, and missing files are deleted."""
+    with tempfile.TemporaryDirectory() as temp_dir:
+        root = Path(temp_dir)
+        files = [root / f"doc{i}.txt" for i in range(3)]
+        for i, file in enumerate(files):
+            file.write_text(f"Document {i}")
+        (root / "image.png").write_bytes(b"Unsupported")
+
+        client = HaikuRAG(":memory:")
+        watcher = FileWatcher(paths=[root], client=client)
+        await watcher.refresh()
+
+        documents = await client.list_documents()
+        assert sorted(doc.uri for doc in documents) == [f.as_uri() for f in files]
+        manifest = await client.file_manifest_repository.list_all()
+        assert sorted(manifest) == [f.as_uri() for f in files]
+        assert all(entry.md5 for entry in manifest.values())
+
+        with (
+            patch("haiku.rag.monitor.md5_file", wraps=md5_file) as hashed,
+            patch("haiku.rag.client.md5_file", wraps=md5_file) as hashed_on_load,
+            patch.object(
+                client, "ingest_many", wraps=client.ingest_many
+            ) as ingest_many,
+        ):
+            # Nothing changed, so no file is read
+            await watcher.refresh()
+            assert hashed.call_count == 0
+            assert list(ingest_many.call_args.args[0]) == []
+
+            # A touched file is hashed but not ingested again
+            stat = files[0].stat()
+            os.utime(files[0], ns=(stat.st_atime_ns, stat.st_mtime_ns + 10**9))
+            # A modified file is ingested, a deleted one removed
+            files[1].write_text("Modified document")
+            files[2].unlink()
+            await watcher.refresh()
+
+            assert sorted(call.args[0] for call in hashed.call_args_list) == files[:2]
+            assert list(ingest_many.call_args.args[0]) == [files[1]]
+            # The modified file is not hashed again when it is loaded
+            assert hashed_on_load.call_count == 0
+
+        document = await client.get_document_by_uri(files[1].as_uri())
+        assert document is not None and document.content == "Modified document"
+        assert await client.get_document_by_uri(files[2].as_uri()) is None
+        manifest = await client.file_manifest_repository.list_all()
+        assert sorted(manifest) == [f.as_uri() for f in files[:2]]
+        assert manifest[files[0].as_uri()].mtime_ns == files[0].stat().st_mtime_ns
+
+    # Documents of a directory that is gone, e.g. unmounted, are kept
+    await watcher.refresh()
+    assert len(await client.list_documents()) == 2
+
+    await client.close()
 
-    watcher = FileWatcher(paths=[temp_path.parent], client=mock_client)
 
-    await watcher._delete_document(temp_path)
-
-    mock_client.get_document_by_uri.assert_called_once_with(temp_path.as_uri())
-    mock_client.delete_document.assert_not_called()
+@pytest.mark.asyncio
+async def test_file_watcher_detects_moves():
+    """A moved file keeps its document, chunks and embeddings."""
+    with tempfile.TemporaryDirectory() as temp_dir:
+        root = Path(temp_dir)
+        original = root / "original.txt"
+        original.write_text("Content that moves around")
+        other = root / "other.txt"
+        other.write_text("Another document")
+
+        client = HaikuRAG(":memory:")
+        watcher = FileWatcher(
+            paths=[root],
+            client=client,
+            queue=ChangeQueue(debounce=0.01, move_window=0.1),
+        )
+        await watcher.refresh()
+        document = await client.get_document_by_uri(original.as_uri())
+        assert document is not None and document.id is not None
+        chunks = await client.chunk_repository.get_by_document_id(document.id)
+
+        dispatcher = asyncio.create_task(watcher.dispatch())
+        moved = root / "folder" / "moved.txt"
+        moved.parent.mkdir()
+        original.rename(moved)
+        with patch.object(client, "ingest_many", wraps=client.ingest_many) as ingest:
+            # The deletion may be reported after the addition
+            await watcher.handler({(Change.added, str(moved))})
+            await watcher.handler({(Change.deleted, str(original))})
+            while watcher.stats.batches < 2:
+                await asyncio.sleep(0.01)
+            assert all(list(call.args[0]) == [] for call in ingest.call_args_list)
+
+        assert watcher.stats.moved == 1
+        assert watcher.stats.deleted == 0
+        assert await client.get_document_by_uri(original.as_uri()) is None
+        moved_document = await client.get_document_by_uri(moved.as_uri())
+        assert moved_document is not None and moved_document.id == document.id
+        assert await client.chunk_repository.get_by_document_id(document.id) == [
+            chunk.model_copy(update={"document_uri": moved.as_uri()})
+            for chunk in chunks
+        ]
+        manifest = await client.file_manifest_repository.list_all()
+        assert original.as_uri() not in manifest
+        assert manifest[moved.as_uri()].md5 == document.metadata["md5"]
+
+        dispatcher.cancel()
+        await asyncio.gather(dispatcher, return_exceptions=True)
+
+        # Moves while the watcher was not running are detected on refresh,
+        # unless the extension changed
+        renamed = root / "renamed.txt"
+        moved.rename(renamed)
+        converted = root / "converted.md"
+        other.rename(converted)
+        await watcher.refresh()
+
+        documents = {doc.uri: doc.id for doc in await client.list_documents()}
+        assert documents[renamed.as_uri()] == document.id
+        assert converted.as_uri() in documents
+        assert sorted(documents) == sorted([renamed.as_uri(), converted.as_uri()])
+
+        await client.close()
@@ -0,0 +1,136 @@
+import tempfile
+from pathlib import Path
+
+import numpy as np
+import pytest
+from datasets import Dataset
+
+from haiku.rag.client import HaikuRAG
+from haiku.rag.config import Config
+from haiku.rag.store.engine import Store
+from haiku.rag.store.models.document import Document
+from haiku.rag.store.quantization import get_embedding_column, quantize
+from haiku.rag.store.repositories.document import DocumentRepository
+
+
+def test_quantize():
+    vectors = np.array([[0.5, -0.25, 0.0, 1.0], [0.0, 0.0, 0.0, 0.0]], np.float32)
+    serialized = [vector.tobytes() for vector in vectors]
+    assert quantize(serialized, "float") == serialized
+
+    int8 = [
+        np.frombuffer(row, np.int8).tolist() for row in quantize(serialized, "int8")
+    ]
+    # Normalized and scaled by 127 / 4 * sqrt(4)
+    assert int8 == [[28, -14, 0, 55], [0, 0, 0, 0]]
+
+    # Bits are packed in the order of sqlite-vec's vec_quantize_binary
+    vector = np.linspace(-1, 1, 16, dtype=np.float32)
+    vector[3] = 1
+    store = Store(":memory:")
+    connection = store._connection
+    assert connection is not None
+    (expected,) = connection.execute(
+        "SELECT vec_quantize_binary(?)", (vector.tobytes(),)
+    ).fetchone()
+    assert quantize([vector.tobytes()], "bit") == [expected]
+    store.close()
+
+    # Prefixes are normalized again
+    [prefix] = quantize([vectors[0].tobytes()], "float", prefix_dim=2)
+    assert np.frombuffer(prefix, np.float32).tolist() == pytest.approx(
+        [2 / np.sqrt(5), -1 / np.sqrt(5)]
+    )
+
+    with pytest.raises(ValueError, match="Unsupported embeddings quantization"):
+        get_embedding_column("float16", 4)
+    with pytest.raises(ValueError, match="multiple of 8"):
+        get_embedding_column("bit", 12)
+    with pytest.raises(ValueError, match="prefix must be shorter"):
+        Store(":memory:", prefix_dim=Config.EMBEDDINGS_VECTOR_DIM)
+
+
+@pytest.mark.asyncio
+@pytest.mark.parametrize(
+    "quantization,prefix_dim", [("int8", 0), ("bit", 0), ("float", 256), ("bit", 256)]
+)
+async def test_quantized_search(qa_corpus: Dataset, quantization: str, prefix_dim: int):
+    """Quantized and prefix stores rescore their candidates with the full float
+    embeddings."""
+    stores = {
+        "float": Store(":memory:"),
+        quantization: Store(
+            ":memory:", quantization=quantization, prefix_dim=prefix_dim
+        ),
+    }
+    repositories = {name: DocumentRepository(store) for name, store in stores.items()}
+    for documents in repositories.values():
+        for i in range(3):
+            await documents.create(Document(content=qa_corpus[i]["document_extracted"]))
+    assert stores[quantization].quantization == quantization
+    assert stores[quantization].prefix_dim == prefix_dim
+
+    chunks = {name: docs.chunk_repository for name, docs in repositories.items()}
+    expected = await chunks["float"].search_chunks("election results", limit=5)
+    results = await chunks[quantization].search_chunks("election results", limit=5)
+    assert [score for _, score in results] == pytest.approx(
+        [score for _, score in expected], abs=1e-4
+    )
+    assert (
+        len(
+            await chunks[quantization].search_chunks_hybrid("election results", limit=5)
+        )
+        == 5
+    )
+
+    # Updated and deleted chunks keep both tables in sync
+    chunk = results[0][0]
+    chunk.content = "Updated content"
+    await chunks[quantization].update(chunk)
+    documents = repositories[quantization]
+    await documents.delete(2)
+    connection = stores[quantization]._connection
+    assert connection is not None
+    (vectors,) = connection.execute("SELECT COUNT(*) FROM chunk_vectors").fetchone()
+    (embeddings,) = connection.execute(
+        "SELECT COUNT(*) FROM chunk_embeddings"
+    ).fetchone()
+    assert vectors == embeddings == len(await chunks[quantization].list_all())
+
+    for store in stores.values():
+        store.close()
+
+
+@pytest.mark.asyncio
+async def test_rebuild_migrates_embeddings(qa_corpus: Dataset):
+    with tempfile.TemporaryDirectory() as temp_dir:
+        db_path = Path(temp_dir) / "test.db"
+        async with HaikuRAG(db_path) as client:
+            await client.create_document(content=qa_corpus[0]["document_extracted"])
+            expected = await client.search("election results")
+
+        store = Store(db_path, quantization="int8", prefix_dim=256)
+        # Existing databases keep their storage until they are migrated
+        assert (store.quantization, store.prefix_dim) == ("float", 0)
+        store.close()
+
+        async with HaikuRAG(db_path) as client:
+            client.store.target_quantization = "int8"
+            client.store.target_prefix_dim = 256
+            async for _ in client.rebuild_database():
+                pass
+            assert (client.store.quantization, client.store.prefix_dim) == ("int8", 256)
+            results = await client.search("election results")
+            assert [score for _, score in results] == pytest.approx(
+                [score for _, score in expected]
+            )
+
+        # In-process indexes load the float embeddings
+        store = Store(db_path, vector_engine="numpy")
+        assert (store.quantization, store.prefix_dim) == ("int8", 256)
+        assert store.vector_index is not None
+        connection = store._connection
+        assert connection is not None
+        (chunks,) = connection.execute("SELECT COUNT(*) FROM chunks").fetchone()
+        assert len(store.vector_index) == chunks > 0
+        store.close()
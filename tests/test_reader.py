@@ -0,0 +1,159 @@
+import asyncio
+import os
+import tempfile
+from pathlib import Path
+
+import pytest
+
+from haiku.rag.reader import FileReader, ParseCache, ParserPool
+
+
+@pytest.fixture
+def text_file():
+    with tempfile.TemporaryDirectory() as temp_dir:
+        path = Path(temp_dir) / "test.txt"
+        path.write_text("Content parsed in a worker process")
+        yield path
+
+
+def test_file_reader_parse_file(text_file: Path):
+    assert FileReader.parse_file(text_file) == "Content parsed in a worker process"
+
+
+@pytest.mark.asyncio
+async def test_parser_pool(text_file: Path):
+    """Files are parsed in worker processes, which are recycled."""
+    pool = ParserPool(workers=1, max_tasks_per_worker=2)
+    try:
+        assert await pool.parse_file(text_file) == "Content parsed in a worker process"
+        executor = pool._executor
+        assert executor is not None
+
+        await pool.parse_file(text_file)
+        assert pool._executor is executor
+
+        # The third file exceeds the tasks allowed per worker
+        await pool.parse_file(text_file)
+        assert pool._executor is not executor
+
+        # Conversion errors are raised from the worker
+        directory = text_file.with_name("directory.txt")
+        directory.mkdir()
+        with pytest.raises(ValueError, match="Failed to parse file"):
+            await pool.parse_file(directory)
+    finally:
+        pool.close()
+    assert pool._executor is None
+
+
+@pytest.mark.asyncio
+async def test_parser_pool_limits(text_file: Path):
+    """Oversized files are rejected and parses that time out kill the pool."""
+    pool = ParserPool(workers=1, max_file_size=10)
+    with pytest.raises(ValueError, match="larger than 10 bytes"):
+        await pool.parse_file(text_file)
+    assert pool._executor is None
+
+    # Starting a worker process alone takes longer than the timeout
+    pool = ParserPool(workers=1, timeout=0.001)
+    with pytest.raises(ValueError, match="Timed out parsing file"):
+        await pool.parse_file(text_file)
+    assert pool._executor is None
+    pool.close()
+
+
+@pytest.mark.asyncio
+async def test_parser_pool_queues_outside_timeout(text_file: Path):
+    """Files wait for a free worker before being submitted and timed."""
+    pool = ParserPool(workers=1)
+    submitted = []
+    submit = pool._submit
+
+    def recording_submit(path: Path):
+        # Every file submitted before has been parsed
+        assert all(future.done() for future in submitted)
+        executor, future = submit(path)
+        submitted.append(future)
+        return executor, future
+
+    pool._submit = recording_submit  # type: ignore[method-assign]
+    try:
+        contents = await asyncio.gather(*(pool.parse_file(text_file) for _ in range(3)))
+        assert contents == ["Content parsed in a worker process"] * 3
+        assert len(submitted) == 3
+    finally:
+        pool.close()
+
+
+@pytest.mark.asyncio
+async def test_parser_pool_without_workers(text_file: Path):
+    pool = ParserPool(workers=0)
+    assert await pool.parse_file(text_file) == "Content parsed in a worker process"
+    assert pool._executor is None
+
+
+@pytest.mark.asyncio
+async def test_parser_pool_cache(text_file: Path, parse_cache: ParseCache):
+    """Files with a known content hash are only parsed once."""
+    pool = ParserPool(workers=0, cache=parse_cache)
+    content_hash = "0123456789abcdef0123456789abcdef"
+    assert await pool.parse_file(text_file, content_hash) == (
+        "Content parsed in a worker process"
+    )
+
+    # The cached markdown is returned even though the file changed
+    text_file.write_text("Changed content")
+    assert await pool.parse_file(text_file, content_hash) == (
+        "Content parsed in a worker process"
+    )
+    assert await pool.parse_file(text_file) == "Changed content"
+
+    # Entries depend on the file type
+    copy = text_file.with_suffix(".md")
+    copy.write_text("Markdown content")
+    assert await pool.parse_file(copy, content_hash) == "Markdown content"
+
+
+def test_parse_cache(tmp_path: Path, monkeypatch: pytest.MonkeyPatch):
+    cache = ParseCache(tmp_path, max_size=2_000)
+    assert cache.get("a" * 32, ".txt") is None
+
+    cache.put("a" * 32, ".txt", "Cached markdown")
+    assert cache.get("a" * 32, ".txt") == "Cached markdown"
+    assert cache.get("a" * 32, ".TXT") == "Cached markdown"
+
+    # Corrupted entries are misses
+    cache._path("a" * 32, ".txt").write_bytes(b"not compressed")
+    assert cache.get("a" * 32, ".txt") is None
+
+    # Upgrading the reader invalidates the cache
+    cache.put("a" * 32, ".txt", "Cached markdown")
+    monkeypatch.setattr(ParseCache, "version", "markitdown-next")
+    assert cache.get("a" * 32, ".txt") is None
+    monkeypatch.undo()
+
+    cache.clear()
+    assert cache.get("a" * 32, ".txt") is None
+
+
+def test_parse_cache_eviction(tmp_path: Path):
+    """The least recently used entries are evicted when the cache is full."""
+    cache = ParseCache(tmp_path, max_size=2_000)
+    # Random hex compresses to about 560 bytes per entry
+    contents = {f"{i:032x}": os.urandom(500).hex() for i in range(4)}
+    for i, (content_hash, content) in enumerate(contents.items()):
+        cache.put(content_hash, ".txt", content)
+        # Order the entries without relying on the file system's time resolution
+        os.utime(cache._path(content_hash, ".txt"), (i, i))
+
+    # The fourth entry evicted the oldest one, down to 90% of the limit
+    first, second, third, fourth = contents
+    assert cache.get(first, ".txt") is None
+    assert cache.get(second, ".txt") == contents[second]
+    assert cache.get(third, ".txt") == contents[third]
+    assert cache.get(fourth, ".txt") == contents[fourth]
+    assert cache._size is not None and cache._size <= 2_000
+
+    # Entries larger than the cache are not stored
+    cache.put("f" * 32, ".txt", os.urandom(2_000).hex())
+    assert cache.get("f" * 32, ".txt") is None
@@ -49,4 +49,4 @@ async def test_rebuild_database(qa_corpus: Dataset):
 
     assert len(chunks_after) > 0
 
-    client.close()
+    await client.close()
@@ -1,10 +1,16 @@
+import asyncio
+import threading
+
 import pytest
 from datasets import Dataset
 
 from haiku.rag.store.engine import Store
+from haiku.rag.store.fusion import fuse
+from haiku.rag.store.models.chunk import Chunk, SearchResults
 from haiku.rag.store.models.document import Document
 from haiku.rag.store.repositories.chunk import ChunkRepository
 from haiku.rag.store.repositories.document import DocumentRepository
+from haiku.rag.store.search_cache import RESULT_OVERHEAD, SearchCache
 
 
 @pytest.mark.asyncio
@@ -86,3 +92,125 @@ async def test_chunks_include_document_info():
     assert chunk.document_id == created_document.id
 
     store.close()
+
+
+def test_fuse():
+    vector = [(1, -0.5), (2, -1.0), (3, -2.0)]
+    fts = [(2, 8.0), (4, 2.0)]
+
+    # Reciprocal ranks, ids found by both retrievals first
+    assert fuse([vector, fts], 3, "rrf", k=60) == [
+        (2, pytest.approx(1 / 62 + 1 / 61)),
+        (1, pytest.approx(1 / 61)),
+        (4, pytest.approx(1 / 62)),
+    ]
+
+    # Scores normalized to [0, 1], missing ids get the lowest score
+    assert fuse([vector, fts], 4, "minmax") == [
+        (2, pytest.approx(2 / 3 + 1)),
+        (1, pytest.approx(1.0)),
+        (3, pytest.approx(0.0)),
+        (4, pytest.approx(0.0)),
+    ]
+    assert fuse([vector, fts], 2, "minmax", weights=[0.1, 1.0])[1][0] == 1
+
+    # Standard scores, ties keep the order of retrieval
+    zscores = fuse([vector, fts], 4, "zscore")
+    assert [id for id, _ in zscores] == [2, 1, 3, 4]
+    assert zscores[2][1] == pytest.approx(zscores[3][1])
+    assert fuse([vector, []], 4, "zscore")[0][0] == 1
+
+    with pytest.raises(ValueError, match="Unsupported fusion"):
+        fuse([vector, fts], 3, "borda")
+
+
+@pytest.mark.asyncio
+@pytest.mark.parametrize("fusion", ["rrf", "minmax", "zscore"])
+async def test_hybrid_search_fusion(qa_corpus: Dataset, fusion: str):
+    store = Store(":memory:")
+    doc_repo = DocumentRepository(store)
+    chunk_repo = ChunkRepository(store)
+    for i in range(5):
+        await doc_repo.create(Document(content=qa_corpus[i]["document_extracted"]))
+
+    question = qa_corpus[0]["question"]
+    results = await chunk_repo.search_chunks_hybrid(question, limit=5, fusion=fusion)
+    assert len(results) == 5
+    scores = [score for _, score in results]
+    assert scores == sorted(scores, reverse=True)
+
+    # Chunks found by both retrievals are hydrated with their document
+    vector_ids = {chunk.id for chunk, _ in await chunk_repo.search_chunks(question, 15)}
+    fts_ids = {
+        chunk.id for chunk, _ in await chunk_repo.search_chunks_fts(question, 15)
+    }
+    assert {chunk.id for chunk, _ in results} <= vector_ids | fts_ids
+    assert all(chunk.content and chunk.document_id for chunk, _ in results)
+
+    store.close()
+
+
+@pytest.mark.asyncio
+async def test_hybrid_search_runs_fts_during_embedding(qa_corpus: Dataset):
+    store = Store(":memory:")
+    doc_repo = DocumentRepository(store)
+    chunk_repo = ChunkRepository(store)
+    await doc_repo.create(Document(content=qa_corpus[0]["document_extracted"]))
+
+    fts_done = threading.Event()
+    find_matches = chunk_repo._find_matches
+    embed = chunk_repo.embedder.embed
+
+    def tracked_find_matches(*args):
+        try:
+            return find_matches(*args)
+        finally:
+            fts_done.set()
+
+    async def slow_embed(text):
+        # The full-text search completes while the embedding is requested
+        for _ in range(100):
+            if fts_done.is_set():
+                break
+            await asyncio.sleep(0.01)
+        assert fts_done.is_set()
+        return await embed(text)
+
+    chunk_repo._find_matches = tracked_find_matches
+    chunk_repo.embedder.embed = slow_embed
+    results = await chunk_repo.search_chunks_hybrid(qa_corpus[0]["question"])
+    assert len(results) > 0
+    assert set(results.timings) == {"embed", "fts", "vector", "fusion", "load", "total"}
+    assert results.timings["total"] >= results.timings["embed"]
+
+    store.close()
+
+
+def test_search_cache():
+    def results(content: str) -> SearchResults:
+        return SearchResults([(Chunk(id=1, document_id=1, content=content), 1.0)])
+
+    entry_size = SearchCache._estimate_size(results("a"))
+    assert entry_size > RESULT_OVERHEAD
+    cache = SearchCache(max_size=2 * entry_size)
+
+    cache.put("a", 0, results("a"))
+    cache.put("b", 0, results("b"))
+    assert cache.get("a", 0) == results("a")
+    # Callers get copies of the cached chunks
+    cached = cache.get("a", 0)
+    assert cached is not None
+    cached[0][0].metadata["changed"] = True
+    assert cache.get("a", 0) == results("a")
+    # The least recently used results are evicted beyond the size limit
+    cache.put("c", 0, results("c"))
+    assert cache.get("b", 0) is None
+    assert cache.size == 2 * entry_size
+
+    # A newer version drops every result, and searches that started before it
+    # are not cached
+    assert cache.get("a", 1) is None
+    cache.put("d", 0, results("d"))
+    assert cache.get("d", 1) is None
+    assert cache.size == 0
+    assert (cache.hits, cache.misses) == (3, 3)
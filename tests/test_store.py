@@ -0,0 +1,117 @@
+import asyncio
+import sqlite3
+import tempfile
+import threading
+from pathlib import Path
+
+import pytest
+
+from haiku.rag.store.engine import ConnectionProfile, Store
+
+
+def test_default_profile_pragmas():
+    """File databases are opened in WAL mode with the default profile applied."""
+    with tempfile.TemporaryDirectory() as temp_dir:
+        store = Store(Path(temp_dir) / "test.db")
+        assert store._connection is not None
+
+        def pragma(name):
+            return store._connection.execute(f"PRAGMA {name}").fetchone()[0]
+
+        assert pragma("journal_mode") == "wal"
+        assert pragma("synchronous") == 1  # NORMAL
+        assert pragma("cache_size") == -64_000
+        assert pragma("temp_store") == 2  # MEMORY
+        assert pragma("busy_timeout") == 5_000
+        store.close()
+
+
+def test_custom_profile():
+    """A custom profile overrides the defaults."""
+    with tempfile.TemporaryDirectory() as temp_dir:
+        profile = ConnectionProfile(journal_mode="DELETE", synchronous="FULL")
+        store = Store(Path(temp_dir) / "test.db", profile=profile)
+        assert store._connection is not None
+        assert (
+            store._connection.execute("PRAGMA journal_mode").fetchone()[0] == "delete"
+        )
+        assert store._connection.execute("PRAGMA synchronous").fetchone()[0] == 2
+        store.close()
+
+
+def test_read_only_profile():
+    """The read-only profile can query an existing database but not write to it."""
+    with tempfile.TemporaryDirectory() as temp_dir:
+        db_path = Path(temp_dir) / "test.db"
+        writer = Store(db_path)
+        assert writer._connection is not None
+        writer._connection.execute(
+            "INSERT INTO documents (content) VALUES ('read only')"
+        )
+        writer._connection.commit()
+
+        reader = Store(db_path, profile="read_only")
+        assert reader._connection is not None
+        assert reader._connection.execute(
+            "SELECT content FROM documents"
+        ).fetchall() == [("read only",)]
+        with pytest.raises(sqlite3.OperationalError):
+            reader._connection.execute(
+                "INSERT INTO documents (content) VALUES ('write')"
+            )
+
+        reader.close()
+        writer.close()
+
+
+def test_read_only_profile_requires_file():
+    with pytest.raises(ValueError, match="requires a database file"):
+        Store(":memory:", profile="read_only")
+
+
+def test_unknown_profile():
+    with pytest.raises(ValueError, match="Unsupported connection profile"):
+        Store(":memory:", profile="fast")
+
+
+@pytest.mark.asyncio
+async def test_reader_connections():
+    """Reads run concurrently on reader connections and see committed writes."""
+    with tempfile.TemporaryDirectory() as temp_dir:
+        store = Store(Path(temp_dir) / "test.db", readers=3)
+        barrier = threading.Barrier(3, timeout=5)
+
+        def insert(connection, content):
+            connection.execute(
+                "INSERT INTO documents (content) VALUES (:content)",
+                {"content": content},
+            )
+            connection.commit()
+
+        def count(connection):
+            # Only returns once all three reads are running at the same time
+            barrier.wait()
+            return connection.execute("SELECT COUNT(*) FROM documents").fetchone()[0]
+
+        await store.write(insert, "committed")
+        assert await asyncio.gather(*(store.read(count) for _ in range(3))) == [1] * 3
+
+        with pytest.raises(sqlite3.OperationalError):
+            await store.read(insert, "from reader")
+
+        store.close()
+        with pytest.raises(ValueError, match="Store connection is not available"):
+            await store.read(count)
+
+
+@pytest.mark.asyncio
+async def test_in_memory_reads_use_writer():
+    """An in-memory database is private to its connection, so reads use the writer."""
+    store = Store(":memory:", readers=3)
+    assert store._reader_executor is None
+
+    def connection_of(connection):
+        return connection
+
+    assert await store.read(connection_of) is store._connection
+    store.close()
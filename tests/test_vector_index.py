@@ -0,0 +1,240 @@
+import tempfile
+from pathlib import Path
+
+import numpy as np
+import pytest
+from datasets import Dataset
+
+from haiku.rag.store.engine import Store
+from haiku.rag.store.models.document import Document
+from haiku.rag.store.repositories.document import DocumentRepository
+from haiku.rag.store.vector_index import (
+    IvfFlatIndex,
+    NumpyVectorIndex,
+    get_vector_index,
+)
+
+
+def serialize(vectors: np.ndarray) -> list[bytes]:
+    return [vector.astype(np.float32).tobytes() for vector in vectors]
+
+
+def test_numpy_vector_index():
+    """Searches are exact and only see committed changes."""
+    rng = np.random.default_rng(0)
+    vectors = rng.random((50, 8), dtype=np.float32)
+    index = NumpyVectorIndex(dim=8)
+    index.add(range(50), serialize(vectors))
+    assert len(index) == 0
+    index.commit()
+    assert len(index) == 50
+
+    queries = rng.random((3, 8), dtype=np.float32)
+    distances = np.linalg.norm(vectors[None, :, :] - queries[:, None, :], axis=2)
+    results = index.search_batch(queries.tolist(), limit=5)
+    for query_results, query_distances in zip(results, distances):
+        expected = np.argsort(query_distances)[:5]
+        assert [chunk_id for chunk_id, _ in query_results] == expected.tolist()
+        assert [distance for _, distance in query_results] == pytest.approx(
+            query_distances[expected].tolist(), abs=1e-4
+        )
+
+    # Removed and replaced vectors, with rolled back changes ignored
+    nearest = [chunk_id for chunk_id, _ in index.search(queries[0].tolist(), 2)]
+    index.remove([nearest[0]])
+    index.add([nearest[1]], serialize(queries[:1]))
+    index.commit()
+    index.remove([nearest[1]])
+    index.rollback()
+    assert len(index) == 49
+    assert index.search(queries[0].tolist(), 1) == [
+        (nearest[1], pytest.approx(0, abs=1e-3))
+    ]
+    assert len(index.search(queries[0].tolist(), 100)) == 49
+
+    index.clear()
+    index.commit()
+    assert index.search(queries[0].tolist(), 5) == []
+
+
+def clustered_vectors(count: int, dim: int, seed: int = 0) -> np.ndarray:
+    rng = np.random.default_rng(seed)
+    centers = rng.normal(size=(20, dim)).astype(np.float32)
+    noise = rng.normal(scale=0.1, size=(count, dim)).astype(np.float32)
+    return centers[rng.integers(20, size=count)] + noise
+
+
+def test_ivf_flat_index():
+    """The IVF index is exact until trained, then scans the probed lists only."""
+    vectors = clustered_vectors(2000, 8)
+    index = IvfFlatIndex(dim=8, min_train_size=1000)
+    index.add(range(999), serialize(vectors[:999]))
+    index.commit()
+    assert not index.trained
+
+    index.add(range(999, 2000), serialize(vectors[999:]))
+    index.commit()
+    assert index.trained
+    assert len(index._centroids) == 44
+
+    exact = NumpyVectorIndex(dim=8)
+    exact.add(range(2000), serialize(vectors))
+    exact.commit()
+    queries = clustered_vectors(20, 8, seed=1)
+    expected = exact.search_batch(queries.tolist(), 10)
+    # Probing all lists is exhaustive
+    assert [
+        [chunk_id for chunk_id, _ in results]
+        for results in index.search_batch(queries.tolist(), 10, nprobe=44)
+    ] == [[chunk_id for chunk_id, _ in results] for results in expected]
+
+    found = 0
+    for results, expected_results in zip(
+        index.search_batch(queries.tolist(), 10, nprobe=4), expected
+    ):
+        found += len(
+            {chunk_id for chunk_id, _ in results}
+            & {chunk_id for chunk_id, _ in expected_results}
+        )
+    assert found / 200 > 0.9
+
+    # New vectors are assigned to their nearest list, removed ones dropped
+    index.remove(range(1000))
+    index.add([5000], serialize(queries[:1]))
+    index.commit()
+    assert len(index) == 1001
+    assert index.search(queries[0].tolist(), 1, nprobe=1)[0][0] == 5000
+    assert all(
+        chunk_id >= 1000
+        for chunk_id, _ in index.search(queries[1].tolist(), 10, nprobe=44)
+    )
+
+    # Added and updated vectors are searched in the unsorted tail
+    index.add([6000, 1500], serialize(queries[1:3]))
+    index.commit()
+    assert index._offsets[-1] < index._size
+    assert len(index) == 1002
+    assert index.search(queries[1].tolist(), 1, nprobe=1)[0][0] == 6000
+    assert index.search(queries[2].tolist(), 1, nprobe=1)[0][0] == 1500
+
+
+def test_ivf_flat_index_persistence():
+    """Saved centroids and lists are reused and reconciled with the database."""
+    with tempfile.TemporaryDirectory() as temp_dir:
+        path = Path(temp_dir) / "test.db.ivf"
+        vectors = clustered_vectors(1500, 8)
+        store = Store(":memory:")
+        connection = store._connection
+        assert connection is not None
+        connection.execute("DROP TABLE chunk_embeddings")
+        connection.execute(
+            "CREATE VIRTUAL TABLE chunk_embeddings USING vec0("
+            "chunk_id INTEGER PRIMARY KEY, embedding FLOAT[8])"
+        )
+        connection.executemany(
+            "INSERT INTO chunk_embeddings (chunk_id, embedding) VALUES (?, ?)",
+            enumerate(serialize(vectors[:1000])),
+        )
+
+        index = IvfFlatIndex(dim=8, path=path, min_train_size=1000)
+        index.load(connection)
+        assert index.trained
+        assert path.exists()
+        centroids = index._centroids.copy()
+
+        # Written by another process while the index was not loaded
+        connection.execute("DELETE FROM chunk_embeddings WHERE chunk_id < 10")
+        connection.executemany(
+            "INSERT INTO chunk_embeddings (chunk_id, embedding) VALUES (?, ?)",
+            [(1000 + i, blob) for i, blob in enumerate(serialize(vectors[1000:]))],
+        )
+        read_only = IvfFlatIndex(dim=8, path=path, read_only=True)
+        read_only.load(connection)
+        assert read_only.trained
+        assert np.array_equal(read_only._centroids, centroids)
+        assert len(read_only) == 1490
+        query = vectors[1200].tolist()
+        assert read_only.search(query, 1, nprobe=1)[0][0] == 1200
+        read_only.save()
+        with np.load(path) as saved:
+            assert len(saved["ids"]) == 1000
+
+        # Trained again once it outgrew the saved lists fourfold
+        connection.executemany(
+            "INSERT INTO chunk_embeddings (chunk_id, embedding) VALUES (?, ?)",
+            [
+                (2000 + i, blob)
+                for i, blob in enumerate(serialize(clustered_vectors(2600, 8, 2)))
+            ],
+        )
+        index = IvfFlatIndex(dim=8, path=path, min_train_size=1000)
+        index.load(connection)
+        assert len(index._centroids) == 63
+        with np.load(path) as saved:
+            assert len(saved["ids"]) == 4090
+        store.close()
+
+
+def test_get_vector_index():
+    assert get_vector_index("vec0", 8) is None
+    assert isinstance(get_vector_index("numpy", 8), NumpyVectorIndex)
+    assert isinstance(get_vector_index("ivf", 8), IvfFlatIndex)
+    with pytest.raises(ValueError, match="Unsupported vector engine"):
+        get_vector_index("faiss", 8)
+
+
+@pytest.mark.asyncio
+async def test_numpy_engine_matches_vec0(qa_corpus: Dataset):
+    """The numpy engine finds the same chunks as sqlite-vec and follows writes."""
+    with tempfile.TemporaryDirectory() as temp_dir:
+        db_path = Path(temp_dir) / "test.db"
+        store = Store(db_path)
+        documents = DocumentRepository(store)
+        for i in range(3):
+            await documents.create(Document(content=qa_corpus[i]["document_extracted"]))
+        store.close()
+
+        vec0 = Store(db_path)
+        numpy = Store(db_path, vector_engine="numpy")
+        assert numpy.vector_index is not None
+        vec0_chunks = DocumentRepository(vec0).chunk_repository
+        numpy_documents = DocumentRepository(numpy)
+        numpy_chunks = numpy_documents.chunk_repository
+        assert len(numpy.vector_index) == len(await vec0_chunks.list_all())
+
+        async def compare(query: str):
+            # Chunks at the same distance may be returned in any order
+            expected = await vec0_chunks.search_chunks(query, limit=5)
+            results = await numpy_chunks.search_chunks(query, limit=5)
+            assert [score for _, score in results] == pytest.approx(
+                [score for _, score in expected], abs=1e-4
+            )
+            assert len(await numpy_chunks.search_chunks_hybrid(query, limit=5)) == len(
+                await vec0_chunks.search_chunks_hybrid(query, limit=5)
+            )
+
+        await compare("election results")
+
+        # Writes through the numpy store keep its index in sync
+        document = await numpy_documents.create(
+            Document(content=qa_corpus[3]["document_extracted"])
+        )
+        assert document.id is not None
+        await numpy_documents.delete(1)
+        await compare("election results")
+        assert len(numpy.vector_index) == len(await numpy_chunks.list_all())
+
+        # Index changes of a rolled back write are dropped
+        def fail(connection):
+            numpy_chunks._delete_all(connection, commit=False)
+            connection.rollback()
+            raise RuntimeError("Write failed")
+
+        count = len(numpy.vector_index)
+        with pytest.raises(RuntimeError):
+            await numpy.write(fail)
+        assert len(numpy.vector_index) == count
+        assert len(await numpy_chunks.search_chunks("election results")) == 5
+
+        vec0.close()
+        numpy.close()